@@ -30,4 +30,17 @@ CREATE TABLE `csvindexes` (
   KEY `fk_index_to_column_idx` (`column_name`),
   CONSTRAINT `fk_index_to_column` FOREIGN KEY (`column_name`) REFERENCES `csvcolumns` (`column_name`),
   CONSTRAINT `fk_index_to_table` FOREIGN KEY (`t_name`) REFERENCES `csvtables` (`t_name`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+
+# csvstatistics
+CREATE TABLE `csvstatistics` (
+  `t_name` varchar(64) NOT NULL,
+  `stat_kind` varchar(16) NOT NULL,
+  `stat_name` varchar(64) NOT NULL,
+  `row_count` int(11) DEFAULT NULL,
+  `distinct_count` int(11) DEFAULT NULL,
+  `null_fraction` double DEFAULT NULL,
+  `histogram` text,
+  PRIMARY KEY (`t_name`,`stat_kind`,`stat_name`),
+  CONSTRAINT `fk_statistics_to_table` FOREIGN KEY (`t_name`) REFERENCES `csvtables` (`t_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
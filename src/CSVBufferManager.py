@@ -0,0 +1,183 @@
+import collections
+import os
+import threading
+
+import CSVCatalog
+import CSVTable
+
+# Default number of bytes the loaded tables of a TableManager may hold.
+default_memory_budget = 512 * 1024 * 1024
+
+
+class TableEntry:
+    """
+    A table held by a TableManager, with what is needed to tell when it must be reloaded.
+    """
+
+    def __init__(self, table, size, file_signature, definition_version):
+        """
+        :param table: Loaded CSVTable.
+        :param size: Estimated number of bytes held by the table, see CSVTable.memory_size().
+        :param file_signature: (size, modification time) of the CSV file when the table was loaded.
+        :param definition_version: CSVCatalog.definition_versions entry of the table when it was loaded.
+        """
+        self.table = table
+        self.size = size
+        self.file_signature = file_signature
+        self.definition_version = definition_version
+
+
+class TableManager:
+    """
+    Hands out shared, loaded CSVTables by name, so a long running process does not parse a CSV file and build its
+    indexes on every request. Tables are kept in least recently used order together with an estimate of the
+    memory they hold. When the loaded tables hold more than the memory budget, the least recently used ones are
+    dropped, and loaded again on their next use. A table is also loaded again when its CSV file has changed, or
+    when its catalog definition has been changed by this process, see CSVCatalog.definition_versions.
+
+    Tables handed out are shared between all callers and must be treated as read only. A caller that still holds
+    a table that has been dropped can keep using it; the memory is freed when the last reference goes away.
+    """
+
+    def __init__(self, memory_budget=default_memory_budget, storage="row", snapshot=True, load_workers=1,
+                 result_cache=None):
+        """
+        :param memory_budget: Number of bytes the loaded tables may hold. The most recently used table is
+            always kept, even if it alone exceeds the budget.
+        :param storage: Storage mode the tables are loaded with, see CSVTable.storage_modes.
+        :param snapshot: Passed to CSVTable. Loading from a snapshot makes reloading a dropped table cheap.
+        :param load_workers: Passed to CSVTable.
+        :param result_cache: Passed to CSVTable, see CSVResultCache. Shared by all tables of the manager.
+        """
+        if storage not in CSVTable.storage_modes:
+            raise ValueError("Invalid storage mode.")
+        if memory_budget < 0:
+            raise ValueError("Invalid memory budget.")
+        self.memory_budget = memory_budget
+        self.storage = storage
+        self.snapshot = snapshot
+        self.load_workers = load_workers
+        self.result_cache = result_cache
+
+        self.__entries__ = collections.OrderedDict()
+        self.__memory_used__ = 0
+        # Loads happen under the lock, so two threads asking for the same table load it once.
+        self.__lock__ = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __file_signature__(self, file_name):
+        try:
+            st = os.stat(file_name)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def __key__(self, t_name, columns):
+        return t_name, (None if columns is None else frozenset(columns))
+
+    def __find_entry__(self, t_name, columns):
+        """
+        :return: Key of a held table that has the requested columns, or None. A table holding all columns
+            serves requests for any subset of them.
+        """
+        for key in (self.__key__(t_name, columns), self.__key__(t_name, None)):
+            entry = self.__entries__.get(key)
+            if entry is None:
+                continue
+            if entry.file_signature != self.__file_signature__(entry.table.__get_file_name__()):
+                # The CSV file has changed since the table was loaded.
+                self.__remove__(key)
+                continue
+            if entry.definition_version != CSVCatalog.definition_versions.get(t_name, 0):
+                # The table was dropped, created again or given other columns or indexes since it was loaded.
+                self.__remove__(key)
+                continue
+            return key
+        return None
+
+    def __remove__(self, key):
+        entry = self.__entries__.pop(key)
+        self.__memory_used__ -= entry.size
+
+    def __evict__(self, keep):
+        """
+        Drops least recently used tables until the loaded tables fit into the memory budget.
+        :param keep: Key of a table that must not be dropped.
+        :return: None
+        """
+        for key in list(self.__entries__.keys()):
+            if self.__memory_used__ <= self.memory_budget:
+                break
+            if key != keep:
+                self.__remove__(key)
+                self.evictions += 1
+
+    def get_table(self, t_name, columns=None):
+        """
+        :param t_name: Table name.
+        :param columns: Columns the caller needs, see the columns parameter of CSVTable. All columns if None.
+        :return: Shared CSVTable, loaded if it is not held.
+        """
+        with self.__lock__:
+            key = self.__find_entry__(t_name, columns)
+            if key is not None:
+                self.hits += 1
+                self.__entries__.move_to_end(key)
+                return self.__entries__[key].table
+
+            self.misses += 1
+            key = self.__key__(t_name, columns)
+            definition_version = CSVCatalog.definition_versions.get(t_name, 0)
+            table = CSVTable.CSVTable(t_name, storage=self.storage, snapshot=self.snapshot,
+                                      load_workers=self.load_workers, columns=columns,
+                                      result_cache=self.result_cache)
+            # Take the signature after loading, so a file that changes while it is parsed is loaded again on the
+            # next use.
+            entry = TableEntry(table, table.memory_size(), self.__file_signature__(table.__get_file_name__()),
+                               definition_version)
+            self.__entries__[key] = entry
+            self.__memory_used__ += entry.size
+            self.__evict__(key)
+            return table
+
+    def invalidate(self, t_name=None):
+        """
+        Drops the held tables with the given name, e.g. after another process changed its definition in the catalog.
+        :param t_name: Table name. All tables if None.
+        :return: None
+        """
+        with self.__lock__:
+            for key in list(self.__entries__.keys()):
+                if t_name is None or key[0] == t_name:
+                    self.__remove__(key)
+
+    def memory_used(self):
+        """
+        :return: Estimated number of bytes held by the loaded tables.
+        """
+        return self.__memory_used__
+
+    def table_names(self):
+        """
+        :return: Names of the held tables, from least to most recently used.
+        """
+        with self.__lock__:
+            return [key[0] for key in self.__entries__.keys()]
+
+
+__default_manager__ = None
+__default_manager_lock__ = threading.Lock()
+
+
+def get_table_manager():
+    """
+    :return: The TableManager shared by the whole process, created with the default settings on first use.
+    """
+    global __default_manager__
+    with __default_manager_lock__:
+        if __default_manager__ is None:
+            __default_manager__ = TableManager()
+        return __default_manager__
@@ -3,6 +3,15 @@ import csv
 import logging
 import json 
 from DataTableExceptions import DataTableException
+import CSVStatistics
+
+# Number of changes this process made to each table definition, by table name. Caches of data derived from a
+# definition, e.g. CSVResultCache, compare it to tell when the definition has changed.
+definition_versions = {}
+
+
+def definition_changed(table_name):
+    definition_versions[table_name] = definition_versions.get(table_name, 0) + 1
 
 
 def templateToInsertClause(resource, t):
@@ -76,19 +85,29 @@ class IndexDefinition:
     """
     Represents the definition of an index.
     """
-    index_types = ("PRIMARY", "UNIQUE", "INDEX")
+    # ORDERED indexes also answer range predicates (<, <=, >, >=, between) on their first column. BITMAP indexes
+    # are for single columns with few distinct values.
+    index_types = ("PRIMARY", "UNIQUE", "INDEX", "ORDERED", "BITMAP")
 
-    def __init__(self, index_name, index_type, columns):
+    def __init__(self, index_name, index_type, columns, include=None):
         """
         :param index_name: Name for index. Must be unique name for table.
         :param index_type: Valid index type.
         :param column: column name 
+        :param include: Columns the index carries besides its key columns, so queries that only read them are
+            answered from the index without reading the rows.
         """
         if index_type not in self.index_types:
             raise ValueError('Invalid index type.')
+        if index_type == "BITMAP" and len(columns) != 1:
+            raise ValueError('Bitmap index must have a single column.')
+        include = list(include) if include is not None else []
+        if any([c in columns for c in include]) or len(set(include)) != len(include):
+            raise ValueError('Included columns must be distinct and not index columns.')
         self.index_name = index_name
         self.index_type = index_type
         self.columns = columns
+        self.include = include
 
     def to_json(self):
         """
@@ -98,6 +117,8 @@ class IndexDefinition:
         idx["index_name"] = self.index_name
         idx["columns"] = self.columns
         idx["kind"] = self.index_type
+        if self.include:
+            idx["include"] = self.include
         return idx 
 
 class TableDefinition:
@@ -105,7 +126,8 @@ class TableDefinition:
     Represents the definition of a table in the CSVCatalog.
     """
 
-    def __init__(self, t_name=None, csv_f=None, column_definitions=None, index_definitions=None, cnx=None, load=False):
+    def __init__(self, t_name=None, csv_f=None, column_definitions=None, index_definitions=None, cnx=None, load=False,
+                 definition_info=None):
         """
         :param t_name: Name of the table.
         :param csv_f: Full path to a CSV file holding the data.
@@ -113,10 +135,16 @@ class TableDefinition:
             May be just a subset of the columns.
         :param index_definitions: List of index definitions. Column names must be valid.
         :param cnx: Database connection to use. If None, create a default connection.
+        :param definition_info: (table_info, column_info, index_info) rows already read from the catalog tables.
+            If None and load is True, they are read with load_table_definition.
         """
         if load: 
-            table_info, column_info, index_info = self.load_table_definition(cnx, t_name)
+            if definition_info is None:
+                definition_info = self.load_table_definition(cnx, t_name)
+            table_info, column_info, index_info = definition_info
             self.cnx = cnx
+            if csv_f is None and len(table_info) > 0:
+                csv_f = table_info[0]["csv_f"]
             self.csv_f = csv_f
             self.t_name = t_name
             self.column_definitions = []
@@ -147,10 +175,11 @@ class TableDefinition:
 
             # build index definitions
             for idx_name in list(indexes.keys()):
-                # sort columns by ordinal position
-                indexes[idx_name]["columns"].sort(key=lambda x: x[1])
-                cols = [c[0] for c in indexes[idx_name]["columns"]]
-                new_index = IndexDefinition(idx_name, indexes[idx_name]["index_type"], cols)
+                # sort columns by ordinal position. Included columns have negative positions -1, -2, ...
+                positions = [(c, int(pos)) for c, pos in indexes[idx_name]["columns"]]
+                cols = [c for c, pos in sorted(positions, key=lambda x: x[1]) if pos > 0]
+                include = [c for c, pos in sorted(positions, key=lambda x: -x[1]) if pos < 0]
+                new_index = IndexDefinition(idx_name, indexes[idx_name]["index_type"], cols, include)
                 self.index_definitions.append(new_index)
                 self.index_names.append(idx_name)
 
@@ -177,7 +206,7 @@ class TableDefinition:
             self.index_names = []
             if index_definitions is not None:
                 for idx in self.index_definitions and self.cnx is not None: 
-                    self.define_index(idx.index_name, idx.index_type, idx.columns, new=False)
+                    self.define_index(idx.index_name, idx.index_type, idx.columns, new=False, include=idx.include)
                 self.index_names = [idx.index_name for idx in self.index_definitions]
             
     def __str__(self):
@@ -229,6 +258,7 @@ class TableDefinition:
         cursor = self.cnx.cursor()
         cursor.execute(q)
         self.cnx.commit() 
+        definition_changed(self.t_name)
         if new:
             self.column_definitions.append(c)
             self.column_names.append(c.column_name)
@@ -255,6 +285,7 @@ class TableDefinition:
                 self.cnx.commit()
                 self.column_definitions.remove(col)
                 self.column_names.remove(col.column_name)
+                definition_changed(self.t_name)
                 break 
 
     def to_json(self):
@@ -291,29 +322,33 @@ class TableDefinition:
 
         self.define_index("PRIMARY", "PRIMARY", columns)
 
-    def define_index(self, index_name, kind, columns, new=True):
+    def define_index(self, index_name, kind, columns, new=True, include=None):
         """
         Define or replace an index definition.
         :param index_name: Index name, must be unique within a table.
         :param column: Valid column.
         :param kind: One of the valid index types.
         :param new: if new index is being added after creation of table
+        :param include: Valid columns the index carries besides its key columns, see IndexDefinition.
         :return:
         """
         if index_name in self.index_names: 
             raise ValueError("Duplicate index name.")
-        if any([c not in self.column_names for c in columns]):
+        if any([c not in self.column_names for c in list(columns) + list(include or [])]):
             raise ValueError("Attempted to create index on invalid column.")
-        new_idx = IndexDefinition(index_name, index_type=kind, columns=columns)
+        new_idx = IndexDefinition(index_name, index_type=kind, columns=columns, include=include)
 
-        # add to db
+        # add to db. Included columns are stored with negative ordinal positions.
         cursor = self.cnx.cursor()
-        for i,c in enumerate(columns):
+        positions = [(c, i + 1) for i, c in enumerate(columns)]
+        positions += [(c, -(i + 1)) for i, c in enumerate(new_idx.include)]
+        for c, pos in positions:
             template = {"index_name":index_name, "index_type":kind,
-                        "column_name":c, "t_name":self.t_name, "ordinal_pos":str(i+1)}
+                        "column_name":c, "t_name":self.t_name, "ordinal_pos":str(pos)}
             q = templateToInsertClause("csvindexes", template)
             cursor.execute(q)
         self.cnx.commit() 
+        definition_changed(self.t_name)
         
         if new:
             self.index_definitions.append(new_idx)
@@ -328,7 +363,7 @@ class TableDefinition:
         for idx in self.index_definitions:
             if idx.index_name == index_name:
                 cursor = self.cnx.cursor()
-                for i_name in idx.columns:
+                for i_name in list(idx.columns) + idx.include:
                     # drop from sql
                     template = {"index_name":index_name, "column_name":i_name, "t_name":self.t_name}
                     w = templateToWhereClause(template)
@@ -337,6 +372,7 @@ class TableDefinition:
                 self.cnx.commit()
                 self.index_definitions.remove(idx)
                 self.index_names.remove(index_name)
+                definition_changed(self.t_name)
                 break
 
     def describe_table(self):
@@ -346,39 +382,141 @@ class TableDefinition:
         """
         return self.to_json()
 
+    def save_statistics(self, statistics):
+        """
+        Replace the statistics stored for this table.
+        :param statistics: CSVStatistics.TableStatistics computed by ANALYZE.
+        :return: None
+        """
+        cursor = self.cnx.cursor()
+        w = templateToWhereClause({"t_name": self.t_name})
+        cursor.execute("delete from csvstatistics " + w + ";")
+        # Histograms may hold any text from the data, so the values are passed as query parameters.
+        q = "insert into csvstatistics (t_name, stat_kind, stat_name, row_count, distinct_count, " + \
+            "null_fraction, histogram) values (%s, %s, %s, %s, %s, %s, %s);"
+        cursor.executemany(q, [(r["t_name"], r["stat_kind"], r["stat_name"], r["row_count"], r["distinct_count"],
+                                r["null_fraction"], r["histogram"]) for r in statistics.to_catalog_rows(self.t_name)])
+        self.cnx.commit()
+        self.statistics = statistics
+
+    def load_statistics(self):
+        """
+        Statistics are read from the catalog the first time they are needed.
+        :return: CSVStatistics.TableStatistics, or None if the table has not been analyzed.
+        """
+        if not hasattr(self, "statistics"):
+            cursor = self.cnx.cursor()
+            cursor.execute("select * from csvstatistics " + templateToWhereClause({"t_name": self.t_name}) + ";")
+            rows = cursor.fetchall()
+            self.cnx.commit()
+            self.statistics = CSVStatistics.TableStatistics.from_catalog_rows(rows)
+        return self.statistics
+
+
+# Reads csvtables, csvcolumns and csvindexes in one round trip. Each row is tagged with the table it came from.
+bulk_definition_query = \
+    "select 'table' as kind, t_name, csv_f, null as column_name, null as column_type, null as not_null, " + \
+    "null as index_name, null as index_type, null as ordinal_pos from csvtables " + \
+    "union all select 'column', t_name, null, column_name, column_type, not_null, null, null, null " + \
+    "from csvcolumns " + \
+    "union all select 'index', t_name, null, column_name, null, null, index_name, index_type, ordinal_pos " + \
+    "from csvindexes " + \
+    "order by t_name, kind, column_name;"
+
 
 class CSVCatalog:
 
     def __init__(self, dbhost="localhost", dbport=3306, 
                  dbname="CSVCatalog", dbuser="dbuser", dbpw="dbuser", debug_mode=None):
-        self.cnx = pymysql.connect(host=dbhost,
-                              user=dbuser,
-                              password=dbpw,
-                              db=dbname,
-                              port=dbport,
-                              charset='utf8mb4',
-                              cursorclass=pymysql.cursors.DictCursor)
-        table_query = "select * from csvtables;"
-        cursor = self.cnx.cursor()
-        cursor.execute(table_query)
-        table_dicts = cursor.fetchall()
-        self.cnx.commit()
+        # Nothing is read from the database here. The connection is opened on first use, and a table definition
+        # is loaded the first time get_table asks for it (or all at once with load_all_tables).
+        self.connect_info = {"host": dbhost, "user": dbuser, "password": dbpw, "db": dbname, "port": dbport}
+        self.__cnx__ = None
 
+        # Table definitions loaded so far, and the definition_versions entry of each when it was loaded.
         self.tables = []
-        for tdict in table_dicts:
-            self.tables.append(TableDefinition(t_name=tdict["t_name"], csv_f=tdict["csv_f"],
-                cnx=self.cnx, load=True))
+        self.__table_versions__ = {}
 
     def __str__(self):
         pass
 
+    @property
+    def cnx(self):
+        """
+        :return: The connection to the catalog database, opened on first use.
+        """
+        if self.__cnx__ is None:
+            self.__cnx__ = pymysql.connect(**self.connect_info,
+                                           charset='utf8mb4',
+                                           cursorclass=pymysql.cursors.DictCursor)
+        return self.__cnx__
+
+    def __get_loaded_table__(self, table_name):
+        for table in self.tables:
+            if table.t_name == table_name:
+                return table
+        return None
+
+    def __cache_table__(self, table):
+        self.tables.append(table)
+        self.__table_versions__[table.t_name] = definition_versions.get(table.t_name, 0)
+
+    def __evict_table__(self, table_name):
+        for t in self.tables:
+            if t.t_name == table_name:
+                self.tables.remove(t)
+                break
+        self.__table_versions__.pop(table_name, None)
+
+    def __table_exists__(self, table_name):
+        cursor = self.cnx.cursor()
+        q = "select * from csvtables " + templateToWhereClause({"t_name": table_name}) + ";"
+        cursor.execute(q)
+        result = cursor.fetchall()
+        self.cnx.commit()
+        return len(result) > 0
+
+    def load_all_tables(self):
+        """
+        Loads every table definition in the catalog with a single query, for callers that want all of them
+        up front instead of one at a time from get_table.
+        :return: List of table definitions.
+        """
+        cursor = self.cnx.cursor()
+        cursor.execute(bulk_definition_query)
+        rows = cursor.fetchall()
+        self.cnx.commit()
+
+        # group the rows by table
+        definition_info = {}
+        for r in rows:
+            if r["t_name"] not in definition_info:
+                definition_info[r["t_name"]] = ([], [], [])
+            table_info, column_info, index_info = definition_info[r["t_name"]]
+            if r["kind"] == "table":
+                table_info.append({"t_name": r["t_name"], "csv_f": r["csv_f"]})
+            elif r["kind"] == "column":
+                column_info.append({"column_name": r["column_name"], "column_type": r["column_type"],
+                                    "not_null": r["not_null"], "t_name": r["t_name"]})
+            else:
+                index_info.append({"index_name": r["index_name"], "index_type": r["index_type"],
+                                   "column_name": r["column_name"], "t_name": r["t_name"],
+                                   "ordinal_pos": r["ordinal_pos"]})
+
+        self.tables = []
+        self.__table_versions__ = {}
+        for t_name, info in definition_info.items():
+            if len(info[0]) == 0:
+                continue
+            self.__cache_table__(TableDefinition(t_name=t_name, cnx=self.cnx, load=True, definition_info=info))
+        return self.tables
+
     def create_table(self, table_name, file_name, column_definitions=None, primary_key_columns=None):
         idx_definitions = None
         if primary_key_columns is not None:
             idx_definitions = IndexDefinition("PRIMARY", "PRIMARY", primary_key_columns)
         
-        table_names = [table.t_name for table in self.tables]
-        if table_name in table_names:
+        if self.__get_loaded_table__(table_name) is not None or self.__table_exists__(table_name):
             raise ValueError("Table with name \'{}\' already exists in catalog.".format(table_name))
 
         # add table to db
@@ -387,12 +525,13 @@ class CSVCatalog:
         q = templateToInsertClause("csvtables", template)
         cursor.execute(q)
         self.cnx.commit()
+        definition_changed(table_name)
 
         table = TableDefinition(t_name=table_name, csv_f=file_name,
             column_definitions=column_definitions, index_definitions=idx_definitions, 
             cnx=self.cnx, load=False)
 
-        self.tables.append(table)
+        self.__cache_table__(table)
         return table 
 
     def drop_table(self, table_name, force_drop=False):
@@ -408,27 +547,35 @@ class CSVCatalog:
         q_columns = "delete from csvcolumns " + w + ";"
         q_indexes = "delete from csvindexes " + w + ";"
         q_table = "delete from csvtables " + w + ";"
+        q_statistics = "delete from csvstatistics " + w + ";"
         if force_drop: cursor.execute("set FOREIGN_KEY_CHECKS=0;");
+        cursor.execute(q_statistics)
         cursor.execute(q_indexes)
         cursor.execute(q_columns)
         cursor.execute(q_table)
         if force_drop: cursor.execute("set FOREIGN_KEY_CHECKS=1;");
         self.cnx.commit()
-        for t in self.tables:
-            if t.t_name == table_name:
-                self.tables.remove(t)
-                break 
+        definition_changed(table_name)
+        self.__evict_table__(table_name)
 
     def get_table(self, table_name):
         """
-        Returns a previously created table.
+        Returns a previously created table. A cached definition is reloaded if the table was dropped, recreated
+        or altered since it was loaded through another catalog instance in this process, see definition_versions.
+        Changes made by another process, or directly in the database, are not seen.
         :param table_name: Name of the table. (load = True)
         :return:
         """
-        #table_names = [table.t_name for table in self.tables]
-        if table_name not in [t.t_name for t in self.tables]:
+        table = self.__get_loaded_table__(table_name)
+        if table is not None:
+            if self.__table_versions__.get(table_name) == definition_versions.get(table_name, 0):
+                return table
+            self.__evict_table__(table_name)
+
+        # First request for this table, load its definition.
+        definition_info = TableDefinition.load_table_definition(self.cnx, table_name)
+        if len(definition_info[0]) == 0:
             raise ValueError("Requested table does not exist.")
-
-        for table in self.tables:
-            if table.t_name == table_name:
-                return table  
+        table = TableDefinition(t_name=table_name, cnx=self.cnx, load=True, definition_info=definition_info)
+        self.__cache_table__(table)
+        return table
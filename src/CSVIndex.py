@@ -0,0 +1,530 @@
+import array
+import bisect
+import sys
+
+from CSVPredicate import to_number
+from CSVStorage import sampled_size
+
+# Positions of the set bits of every byte value, to turn bitmaps into row ids a byte at a time.
+byte_bits = [[k for k in range(8) if b >> k & 1] for b in range(256)]
+
+
+def ids_to_bitmap(ids):
+    """
+    :param ids: Row ids.
+    :return: Bitmap of the row ids, i.e. an int whose bit i is set if i is one of the ids.
+    """
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+def bitmap_to_ids(bitmap):
+    """
+    :param bitmap: Bitmap of row ids, see ids_to_bitmap.
+    :return: List of the row ids, in row id order.
+    """
+    n_words = (bitmap.bit_length() + 63) // 64
+    data = bitmap.to_bytes(n_words * 8, "little")
+    ids = []
+    # Skip empty 64 bit words, so sparse bitmaps cost one step per word, not per byte.
+    for j, word in enumerate(memoryview(data).cast("Q")):
+        if word:
+            for k in range(j << 3, (j + 1) << 3):
+                b = data[k]
+                if b:
+                    base = k << 3
+                    ids += [base + bit for bit in byte_bits[b]]
+    return ids
+
+
+def sort_key(key):
+    """
+    :param key: Key of a composite index, or a prefix of one.
+    :return: Key the keys of composite indexes are sorted on. Empty numbers (None) cannot be compared with
+        numbers, so they sort after every other value of their column.
+    """
+    return tuple([(v is None, v) for v in key])
+
+
+def sort_keys(keys):
+    """
+    :param keys: List of keys of a composite index.
+    :return: None. Sorts keys in place, in sort_key order.
+    """
+    try:
+        # Comparing the keys themselves is faster, and gives the same order whenever no empty number is compared
+        # with a number.
+        keys.sort()
+    except TypeError:
+        keys.sort(key=sort_key)
+
+
+def bisect_keys(keys, key):
+    """
+    bisect.bisect_left for a list sorted by sort_key. bisect only takes a key function from python 3.10 on, and a
+    list of the sort keys of every key would double the memory of the index.
+    :param keys: List of keys of a composite index, in sort_key order.
+    :param key: Key, or prefix of a key, to find.
+    :return: Position of the first key in keys that does not sort before key.
+    """
+    target = sort_key(key)
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if sort_key(keys[middle]) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class HashIndex(dict):
+    """
+    Index kinds "INDEX", "UNIQUE" and "PRIMARY". A dictionary from index key to the matching row ids, in row id
+    order. The key of a single column index is the column value and the key of a composite index is the tuple of
+    its column values, so keys are never built by concatenating strings and two different value combinations
+    always have different keys. A key that matches a single row maps to the row id itself rather than to a list,
+    which saves a list per row in unique indexes. Use find() to look keys up.
+
+    A composite index also keeps its keys sorted, see sort_key, so a lookup on a leftmost prefix of its columns, e.g. on
+    playerID alone for an index on (playerID, yearID), costs a bisect plus the size of the output.
+
+    An index with included columns also holds covered, a CSVStorage.ColumnStore with the index and included
+    columns of every row in row id order, so queries that only read these columns never read the table's rows.
+    """
+
+    def __init__(self, n_columns=1):
+        """
+        :param n_columns: Number of index columns.
+        """
+        super().__init__()
+        self.n_columns = n_columns
+        self.sorted_keys = []
+        # prefix_counts[k] is the number of distinct values of the first k columns.
+        self.prefix_counts = []
+        self.covered = None
+
+    def make_key(self, values):
+        """
+        :param values: Values of the index columns, in index column order.
+        :return: The index key for the values.
+        """
+        if self.n_columns == 1:
+            return values[0]
+        return tuple(values)
+
+    def build(self, keys):
+        """
+        :param keys: Iterator over the index keys of the rows in row id order. Column values for a single column
+            index, tuples of column values otherwise.
+        :return: None
+        """
+        self.__add_keys__(keys, 0)
+        self.build_prefixes()
+
+    def extend(self, keys, start):
+        """
+        Adds rows appended to the table, see CSVTable.refresh.
+        :param keys: List of the index keys of the new rows in row id order, like in build.
+        :param start: Row id of the first new row. Greater than every row id in the index.
+        :return: None
+        """
+        new_keys = self.__add_keys__(keys, start)
+        if new_keys:
+            if self.n_columns > 1:
+                # The sorted keys followed by the sorted new keys are two runs, which sort merges in one pass.
+                sort_keys(new_keys)
+                self.sorted_keys += new_keys
+                sort_keys(self.sorted_keys)
+            self.__count_prefixes__()
+
+    def add(self, key, i):
+        """
+        Adds a row, see CSVTable.insert and CSVTable.update. The number of distinct keys is kept exact, the
+        number of distinct values of shorter prefixes of a composite index is not updated until the index is
+        built again.
+        :param key: Index key of the row.
+        :param i: Row id.
+        :return: None
+        """
+        ids = self.get(key)
+        if ids is None:
+            self[key] = i
+            if self.n_columns > 1:
+                self.sorted_keys.insert(bisect_keys(self.sorted_keys, key), key)
+            self.__count_keys__()
+        elif type(ids) is int:
+            self[key] = [ids, i] if ids < i else [i, ids]
+        else:
+            bisect.insort(ids, i)
+
+    def remove(self, key, i):
+        """
+        Removes a row, see CSVTable.delete and CSVTable.update.
+        :param key: Index key the row was added with.
+        :param i: Row id.
+        :return: None
+        """
+        ids = self[key]
+        if type(ids) is int:
+            del self[key]
+            if self.n_columns > 1:
+                del self.sorted_keys[bisect_keys(self.sorted_keys, key)]
+            self.__count_keys__()
+        else:
+            ids.remove(i)
+            if len(ids) == 1:
+                self[key] = ids[0]
+
+    def __count_keys__(self):
+        self.prefix_counts[0] = min(len(self), 1)
+        self.prefix_counts[-1] = len(self)
+
+    def __add_keys__(self, keys, start):
+        """
+        :return: The keys that were not in the index before.
+        """
+        new_keys = []
+        for i, key in enumerate(keys, start):
+            ids = self.get(key)
+            if ids is None:
+                self[key] = i
+                new_keys.append(key)
+            elif type(ids) is int:
+                self[key] = [ids, i]
+            else:
+                ids.append(i)
+        return new_keys
+
+    def build_groups(self, values, groups):
+        """
+        Builds a single column index from the rows already grouped by value, e.g. by the codes of a dictionary
+        encoded column, so no key is hashed per row.
+        :param values: The distinct column values.
+        :param groups: For each value, the list of the row ids holding it, in row id order.
+        :return: None
+        """
+        for v, ids in zip(values, groups):
+            if len(ids) == 1:
+                self[v] = ids[0]
+            elif ids:
+                self[v] = ids
+        self.build_prefixes()
+
+    def build_prefixes(self):
+        """
+        Sorts the keys of a composite index and counts the distinct values of each prefix of its columns.
+        :return: None
+        """
+        self.sorted_keys = list(self.keys()) if self.n_columns > 1 else []
+        sort_keys(self.sorted_keys)
+        self.__count_prefixes__()
+
+    def __count_prefixes__(self):
+        self.prefix_counts = [min(len(self), 1)] + [0] * (self.n_columns - 1) + [len(self)]
+        if self.n_columns == 1:
+            return
+        # Two neighbouring keys that first differ in column d start a new prefix of every length > d.
+        first_differences = [0] * self.n_columns
+        for previous, key in zip(self.sorted_keys, self.sorted_keys[1:]):
+            d = 0
+            while previous[d] == key[d]:
+                d += 1
+            first_differences[d] += 1
+        new_prefixes = 0
+        for k in range(1, self.n_columns):
+            new_prefixes += first_differences[k - 1]
+            self.prefix_counts[k] = 1 + new_prefixes
+
+    def find(self, values):
+        """
+        :param values: Values of the first k index columns, in index column order.
+        :return: Row ids, in row id order, of the rows with these values.
+        """
+        if len(values) == self.n_columns:
+            ids = self.get(self.make_key(values), [])
+            return [ids] if type(ids) is int else ids
+        ids = []
+        for key in self.__prefix_keys__(tuple(values)):
+            key_ids = self[key]
+            if type(key_ids) is int:
+                ids.append(key_ids)
+            else:
+                ids += key_ids
+        ids.sort()
+        return ids
+
+    def __prefix_keys__(self, prefix):
+        """
+        :param prefix: Tuple of the values of the first k < n_columns index columns.
+        :return: Iterator over the keys starting with prefix.
+        """
+        k = len(prefix)
+        start = bisect_keys(self.sorted_keys, prefix)
+        for j in range(start, len(self.sorted_keys)):
+            key = self.sorted_keys[j]
+            if key[:k] != prefix:
+                break
+            yield key
+
+    def count(self, values):
+        """
+        :param values: Values of the first k index columns, in index column order.
+        :return: Number of rows with these values, without building the list of their row ids.
+        """
+        if len(values) == self.n_columns:
+            ids = self.get(self.make_key(values), [])
+            return 1 if type(ids) is int else len(ids)
+        keys = self.__prefix_keys__(tuple(values))
+        return sum([1 if type(self[key]) is int else len(self[key]) for key in keys])
+
+    def distinct_keys(self, values=()):
+        """
+        :param values: Values of the first k index columns, in index column order.
+        :return: List of the keys of the rows with these values. Keys of composite indexes are tuples.
+        """
+        if not values:
+            return list(self.keys())
+        if len(values) == self.n_columns:
+            key = self.make_key(values)
+            return [key] if key in self else []
+        return list(self.__prefix_keys__(tuple(values)))
+
+    def rows_per_key(self, n_rows, k=None):
+        """
+        :param n_rows: Number of rows in the table.
+        :param k: Number of leading index columns a lookup provides. All of them if None.
+        :return: Expected number of row ids a lookup returns.
+        """
+        if k is None:
+            k = self.n_columns
+        return n_rows / max(self.prefix_counts[k] if self.prefix_counts else len(self), 1)
+
+    def memory_size(self):
+        """
+        :return: Estimated number of bytes held by the index, from a sample of its entries. Keys are counted even
+            though a single column key is often the same string object as the value held by the row.
+        """
+        def entry_size(item):
+            key, ids = item
+            return sys.getsizeof(key) + (0 if type(ids) is int else sys.getsizeof(ids))
+
+        size = sys.getsizeof(self) + sys.getsizeof(self.sorted_keys) + sampled_size(self.items(), len(self),
+                                                                                    entry_size)
+        if self.covered is not None:
+            size += self.covered.memory_size()
+        return size
+
+
+class OrderedIndex(HashIndex):
+    """
+    Index kind "ORDERED". Answers equality and leftmost-prefix lookups like HashIndex, and also keeps the row ids
+    sorted on the value of the first index column. A range predicate on that column costs a bisect plus the size
+    of the output instead of a scan.
+    """
+
+    def __init__(self, n_columns=1, numeric=False):
+        """
+        :param n_columns: Number of index columns.
+        :param numeric: True if the first index column is a "number" column. Its values are then ordered as
+            numbers, and values that are empty or not numbers are left out of the ordering.
+        """
+        super().__init__(n_columns)
+        self.numeric = numeric
+        self.sorted_values = []
+        self.sorted_ids = array.array("q")
+
+    def build_order(self, values):
+        """
+        :param values: Iterator over the values of the first index column in row id order.
+        :return: None
+        """
+        pairs = []
+        for i, v in enumerate(values):
+            x = to_number(v) if self.numeric else v
+            if x is not None:
+                pairs.append((x, i))
+        pairs.sort()
+        self.sorted_values = [p[0] for p in pairs]
+        self.sorted_ids = array.array("q", [p[1] for p in pairs])
+
+    def extend(self, keys, start):
+        super().extend(keys, start)
+        values = keys if self.n_columns == 1 else [key[0] for key in keys]
+        pairs = []
+        for i, v in enumerate(values, start):
+            x = to_number(v) if self.numeric else v
+            if x is not None:
+                pairs.append((x, i))
+        pairs.sort()
+        # Merge the new values into the sorted ones. New row ids are greater, so they go after equal values.
+        sorted_values, sorted_ids = [], array.array("q")
+        previous = 0
+        for x, i in pairs:
+            position = bisect.bisect_right(self.sorted_values, x, previous)
+            sorted_values += self.sorted_values[previous:position]
+            sorted_ids += self.sorted_ids[previous:position]
+            sorted_values.append(x)
+            sorted_ids.append(i)
+            previous = position
+        sorted_values += self.sorted_values[previous:]
+        sorted_ids += self.sorted_ids[previous:]
+        self.sorted_values = sorted_values
+        self.sorted_ids = sorted_ids
+
+    def __order_value__(self, key):
+        v = key if self.n_columns == 1 else key[0]
+        return to_number(v) if self.numeric else v
+
+    def add(self, key, i):
+        super().add(key, i)
+        x = self.__order_value__(key)
+        if x is not None:
+            # Row ids with equal values are kept in row id order.
+            start = bisect.bisect_left(self.sorted_values, x)
+            end = bisect.bisect_right(self.sorted_values, x, start)
+            position = start + bisect.bisect_left(self.sorted_ids[start:end], i)
+            self.sorted_values.insert(position, x)
+            self.sorted_ids.insert(position, i)
+
+    def remove(self, key, i):
+        super().remove(key, i)
+        x = self.__order_value__(key)
+        if x is not None:
+            start = bisect.bisect_left(self.sorted_values, x)
+            end = bisect.bisect_right(self.sorted_values, x, start)
+            position = start + bisect.bisect_left(self.sorted_ids[start:end], i)
+            del self.sorted_values[position]
+            del self.sorted_ids[position]
+
+    def find_range(self, low=None, low_inclusive=True, high=None, high_inclusive=True):
+        """
+        :return: Row ids, in row id order, of the rows whose first index column lies between low and high.
+        """
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect.bisect_left(self.sorted_values, low)
+        else:
+            start = bisect.bisect_right(self.sorted_values, low)
+        if high is None:
+            end = len(self.sorted_values)
+        elif high_inclusive:
+            end = bisect.bisect_right(self.sorted_values, high)
+        else:
+            end = bisect.bisect_left(self.sorted_values, high)
+        if start >= end:
+            return []
+        return sorted(self.sorted_ids[start:end])
+
+    def find_values(self, values):
+        """
+        :param values: Values of the first index column.
+        :return: Row ids, in row id order, of the rows whose first index column equals one of the values.
+        """
+        ids = []
+        for v in set(values):
+            start = bisect.bisect_left(self.sorted_values, v)
+            end = bisect.bisect_right(self.sorted_values, v)
+            ids += self.sorted_ids[start:end]
+        return sorted(ids)
+
+    def memory_size(self):
+        result = super().memory_size() + sys.getsizeof(self.sorted_values) + sys.getsizeof(self.sorted_ids)
+        if self.numeric:
+            # Numbers are converted from the column values, strings are shared with the rows.
+            result += sampled_size(self.sorted_values, len(self.sorted_values))
+        return result
+
+
+class BitmapIndex(HashIndex):
+    """
+    Index kind "BITMAP", for a single column with few distinct values. Maps each value to a bitmap of the rows
+    holding it, see ids_to_bitmap. The bitmaps of several values, or of several indexes, are combined with | and &
+    a machine word at a time, so an "in" predicate is one union and a template with conditions on several indexed
+    columns is answered by intersecting bitmaps before any row is read, see CSVTable.__intersection_candidates__.
+    A lookup costs a pass over the bitmap, i.e. about one operation per 8 rows of the table.
+    """
+
+    def __init__(self, n_columns=1):
+        if n_columns != 1:
+            raise ValueError("Bitmap indexes have a single column.")
+        super().__init__(n_columns)
+
+    def build(self, keys):
+        groups = {}
+        for i, key in enumerate(keys):
+            ids = groups.get(key)
+            if ids is None:
+                groups[key] = [i]
+            else:
+                ids.append(i)
+        self.build_groups(list(groups.keys()), list(groups.values()))
+
+    def build_groups(self, values, groups):
+        for v, ids in zip(values, groups):
+            if ids:
+                self[v] = ids_to_bitmap(ids)
+        self.build_prefixes()
+
+    def extend(self, keys, start):
+        groups = {}
+        for i, key in enumerate(keys, start):
+            ids = groups.get(key)
+            if ids is None:
+                groups[key] = [i]
+            else:
+                ids.append(i)
+        n_keys = len(self)
+        for key, ids in groups.items():
+            self[key] = self.get(key, 0) | ids_to_bitmap(ids)
+        if len(self) != n_keys:
+            self.build_prefixes()
+
+    def add(self, key, i):
+        bitmap = self.get(key, 0)
+        self[key] = bitmap | (1 << i)
+        if not bitmap:
+            self.__count_keys__()
+
+    def remove(self, key, i):
+        bitmap = self[key] & ~(1 << i)
+        if bitmap:
+            self[key] = bitmap
+        else:
+            del self[key]
+            self.__count_keys__()
+
+    def bitmap(self, values):
+        """
+        :param values: Column values.
+        :return: Bitmap of the rows holding one of the values.
+        """
+        result = 0
+        for v in set(values):
+            result |= self.get(v, 0)
+        return result
+
+    def find(self, values):
+        return bitmap_to_ids(self.get(values[0], 0))
+
+    def count(self, values):
+        return bin(self.get(values[0], 0)).count("1")
+
+    def find_values(self, values):
+        """
+        :param values: Column values.
+        :return: Row ids, in row id order, of the rows holding one of the values.
+        """
+        return bitmap_to_ids(self.bitmap(values))
+
+    def memory_size(self):
+        size = sys.getsizeof(self) + sampled_size(self.items(), len(self),
+                                                  lambda item: sys.getsizeof(item[0]) + sys.getsizeof(item[1]))
+        if self.covered is not None:
+            size += self.covered.memory_size()
+        return size
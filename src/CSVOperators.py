@@ -0,0 +1,914 @@
+import itertools
+import math
+import operator
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+import DataTableExceptions
+
+# Row ids are checked against a template this many at a time. Operators hold at most one batch of rows. Scans
+# start with batches of first_batch_size rows and double them up to batch_size, so a consumer that stops after a
+# few rows, e.g. Limit, does not make them read a full batch.
+batch_size = 1024
+first_batch_size = 16
+
+# GraceHashJoin writes at most this many partitions of an input at once, and partitions a partition again at
+# most this many times. Estimated bytes of a hash table entry besides its key: a dictionary slot and a row id list.
+max_spill_partitions = 64
+max_spill_depth = 3
+hash_entry_overhead = 120
+
+# Aggregate functions of HashAggregate. Functions other than count need a "number" column.
+aggregate_functions = ("count", "sum", "min", "max", "avg")
+
+
+def id_batches(ids):
+    """
+    :param ids: Row ids.
+    :return: Iterator over consecutive slices of ids, of first_batch_size ids at first, doubling up to batch_size.
+    """
+    start, size = 0, first_batch_size
+    while start < len(ids):
+        yield ids[start:start + size]
+        start += size
+        size = min(size * 2, batch_size)
+
+
+def aggregate_name(function, column):
+    """
+    :param function: One of aggregate_functions.
+    :param column: Column name, or None for count(*).
+    :return: Name of the aggregate's column in the output rows, e.g. "sum(H)" or "count(*)".
+    """
+    return "{}({})".format(function, "*" if column is None else column)
+
+
+def pair_reader(left_table, right_table, fields):
+    """
+    :param left_table: CSVTable the left row ids belong to.
+    :param right_table: CSVTable the right row ids belong to.
+    :param fields: A list of column names.
+    :return: Function from a (left row id, right row id) pair to the list of the values of fields in the joined
+        row, which is never built. Like {**left row, **right row}, a column of both tables takes its value from
+        the right table.
+    """
+    left_columns = left_table.__get_row_columns__()
+    right_columns = right_table.__get_row_columns__()
+    spec = []
+    for f in fields:
+        if f in right_columns:
+            spec.append((f, True))
+        elif f in left_columns:
+            spec.append((f, False))
+        else:
+            raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
+    left_fetch = left_table.__get_row_fetcher__([f for f, right in spec if not right])
+    right_fetch = right_table.__get_row_fetcher__([f for f, right in spec if right])
+
+    def read(pair):
+        l, r = left_fetch(pair[0]), right_fetch(pair[1])
+        return [(r[f] if right else l[f]) for f, right in spec]
+
+    return read
+
+
+def tuple_reader(tables, sources):
+    """
+    Reads values from the rows of a tuple of row ids, as produced by the steps of a multi-way join, see
+    TupleHashJoin and TupleIndexJoin.
+    :param tables: CSVTables the row ids of a tuple belong to, by position in the tuple.
+    :param sources: List of (position in the tuple, column name).
+    :return: Function from a tuple of row ids to the tuple of the values of the columns of sources. The rows are
+        never built.
+    """
+    by_position = {}
+    for p, c in sources:
+        by_position.setdefault(p, []).append(c)
+    fetchers = [(p, tables[p].__get_row_fetcher__(columns)) for p, columns in by_position.items()]
+
+    if len(fetchers) == 1:
+        position, fetch = fetchers[0]
+        columns = [c for _, c in sources]
+
+        def read_one(t):
+            r = fetch(t[position])
+            return tuple([r[c] for c in columns])
+
+        return read_one
+
+    def read(t):
+        rows = {p: fetch(t[p]) for p, fetch in fetchers}
+        return tuple([rows[p][c] for p, c in sources])
+
+    return read
+
+
+class Operator:
+    """
+    A query operator. Operators are iterables of rows (dictionaries) that pull rows from their inputs one at a
+    time, so a pipeline of operators only holds the rows that are in flight, plus whatever an operator must keep
+    by nature, e.g. the build side of a hash join. Inputs may be other operators or any iterable of rows.
+    """
+
+    def __iter__(self):
+        raise NotImplementedError()
+
+    def rows(self):
+        """
+        Drains the pipeline.
+        :return: List of all rows.
+        """
+        return list(self)
+
+
+class TableScan(Operator):
+    """
+    Yields the rows of a CSVTable that satisfy a list of predicates, in row id order. Candidate rows are checked
+    a batch at a time with CSVTable.__scan_ids__, so columnar tables evaluate the predicates on their columns,
+    and only matching rows are materialized. Batches grow from first_batch_size rows, see id_batches.
+    """
+
+    def __init__(self, table, predicates=None, fields=None, ids=None):
+        """
+        :param table: CSVTable.
+        :param predicates: List of CSVPredicate.Predicate. All rows match if None.
+        :param fields: Columns of the rows to yield. All columns if None.
+        :param ids: Candidate row ids. All rows if None.
+        """
+        self.table = table
+        self.predicates = predicates if predicates is not None else []
+        self.fields = fields
+        self.ids = ids
+
+    def __candidates__(self):
+        """
+        :return: Candidate row ids, in the order rows are yielded, and the predicates they must be checked on.
+        """
+        if self.ids is not None:
+            return self.ids, self.predicates
+        return self.table.__live_ids__(), self.predicates
+
+    def __iter__(self):
+        ids, predicates = self.__candidates__()
+        for batch in id_batches(ids):
+            if predicates:
+                batch = self.table.__scan_ids__(predicates, batch)
+            yield from self.table.__get_rows_by_id__(batch, self.fields)
+
+
+class IndexLookup(TableScan):
+    """
+    Yields the rows of a CSVTable that satisfy a list of predicates, using an index for the predicates it can
+    answer: equalities on a leftmost prefix of its columns, or a range or "in" predicate on its first column,
+    or several indexes whose row ids are intersected. The remaining predicates are checked like in TableScan.
+    Rows are yielded in row id order.
+    """
+
+    def __init__(self, table, predicates, index, range_predicate=None, fields=None):
+        """
+        :param table: CSVTable.
+        :param predicates: List of CSVPredicate.Predicate.
+        :param index: Index name, or list of (index name, column) pairs for an intersection, as chosen by
+            CSVTable.__get_template_access_path__.
+        :param range_predicate: The range or "in" predicate the index answers, or None for an equality lookup.
+        :param fields: Columns of the rows to yield. All columns if None.
+        """
+        super().__init__(table, predicates, fields)
+        self.index = index
+        self.range_predicate = range_predicate
+
+    def __candidates__(self):
+        if self.range_predicate is None:
+            return self.table.__index_candidates__(self.predicates, self.index)
+        return self.table.__range_candidates__(self.predicates, self.index, self.range_predicate)
+
+
+class IndexOnlyLookup(IndexLookup):
+    """
+    Like IndexLookup, but never reads the rows of the table. The remaining predicates are checked on, and the
+    rows built from, the columns the index covers, plus the values of the columns the index lookup fixes with
+    an equality. See CSVTable.__index_lookup__.
+    """
+
+    def __init__(self, table, predicates, index, range_predicate, fields, store, constants):
+        """
+        :param table: CSVTable.
+        :param predicates: List of CSVPredicate.Predicate.
+        :param index: Index name or list of (index name, column) pairs, see IndexLookup.
+        :param range_predicate: See IndexLookup.
+        :param fields: Columns of the rows to yield.
+        :param store: CSVStorage.ColumnStore holding the covered columns in row id order.
+        :param constants: Dictionary mapping columns fixed by the index lookup to their value.
+        """
+        super().__init__(table, predicates, index, range_predicate, fields)
+        self.store = store
+        self.constants = constants
+
+    def __iter__(self):
+        ids, predicates = self.__candidates__()
+        store = self.store
+        constants = self.constants
+        fields = self.fields
+        stored = [f for f in fields if f not in constants]
+        if len(stored) == len(fields):
+            constants = None
+        for batch in id_batches(ids):
+            for p in predicates:
+                batch = store.filter_ids(p, batch)
+            rows = store.get_rows(batch, stored) if stored else [{} for _ in batch]
+            if constants:
+                rows = [{f: constants[f] if f in constants else r[f] for f in fields} for r in rows]
+            yield from rows
+
+
+class Select(Operator):
+    """
+    Yields the input rows that satisfy a list of predicates.
+    """
+
+    def __init__(self, child, predicates):
+        """
+        :param child: Input rows.
+        :param predicates: List of CSVPredicate.Predicate.
+        """
+        self.child = child
+        self.predicates = predicates
+
+    def __iter__(self):
+        predicates = self.predicates
+        if not predicates:
+            yield from self.child
+            return
+        for r in self.child:
+            if all([p.matches(r[p.column]) for p in predicates]):
+                yield r
+
+
+class Project(Operator):
+    """
+    Yields each input row with only the requested columns.
+    """
+
+    def __init__(self, child, fields):
+        """
+        :param child: Input rows.
+        :param fields: A list of column names. Rows are passed through unchanged if None.
+        """
+        self.child = child
+        self.fields = fields
+
+    def __iter__(self):
+        fields = self.fields
+        if fields is None:
+            yield from self.child
+            return
+        try:
+            for r in self.child:
+                yield {f: r[f] for f in fields}
+        except KeyError as ke:
+            # happens if the requested field not in rows.
+            raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
+
+
+class Limit(Operator):
+    """
+    Skips the first offset input rows and yields at most limit rows. Stops pulling from its input as soon as
+    the limit is reached.
+    """
+
+    def __init__(self, child, start=0, stop=None):
+        """
+        :param child: Input rows.
+        :param start: Position of the first row to yield, i.e. the offset.
+        :param stop: Position just past the last row to yield, i.e. offset + limit, or None for no limit.
+        """
+        self.child = child
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        if self.stop is not None and self.stop <= self.start:
+            return
+        yield from itertools.islice(self.child, self.start, self.stop)
+
+
+class PairSelect(Operator):
+    """
+    Yields the (left row id, right row id) pairs of a join whose joined row satisfies a list of predicates. Values
+    are read from the input tables, so the joined row is never built. Like {**left row, **right row}, a column of
+    both tables takes its value from the right table.
+    """
+
+    def __init__(self, child, left_table, right_table, predicates):
+        """
+        :param child: Input pairs of row ids.
+        :param left_table: CSVTable the left row ids belong to.
+        :param right_table: CSVTable the right row ids belong to.
+        :param predicates: List of CSVPredicate.Predicate.
+        """
+        self.child = child
+        self.left_table = left_table
+        self.right_table = right_table
+        self.predicates = predicates
+
+    def __iter__(self):
+        if not self.predicates:
+            yield from self.child
+            return
+        right_columns = set(self.right_table.__get_row_columns__())
+        checks = [(p, p.column in right_columns) for p in self.predicates]
+        left_fetch = self.left_table.__get_row_fetcher__([p.column for p, right in checks if not right])
+        right_fetch = self.right_table.__get_row_fetcher__([p.column for p, right in checks if right])
+        for pair in self.child:
+            l, r = left_fetch(pair[0]), right_fetch(pair[1])
+            if all([p.matches(r[p.column] if right else l[p.column]) for p, right in checks]):
+                yield pair
+
+
+class PairProject(Operator):
+    """
+    Late materialization of a join. Builds an output row holding only the requested columns for each
+    (left row id, right row id) pair. Like {**left row, **right row}, a column of both tables takes its value
+    from the right table.
+    """
+
+    def __init__(self, child, left_table, right_table, fields=None):
+        """
+        :param child: Input pairs of row ids.
+        :param left_table: CSVTable the left row ids belong to.
+        :param right_table: CSVTable the right row ids belong to.
+        :param fields: A list of column names. All columns of both tables if None.
+        """
+        self.child = child
+        self.left_table = left_table
+        self.right_table = right_table
+        self.fields = fields
+
+    def __iter__(self):
+        fields = self.fields
+        if fields is None:
+            left_columns = self.left_table.__get_row_columns__()
+            right_columns = self.right_table.__get_row_columns__()
+            fields = left_columns + [c for c in right_columns if c not in left_columns]
+        read = pair_reader(self.left_table, self.right_table, fields)
+        for pair in self.child:
+            yield dict(zip(fields, read(pair)))
+
+
+class NestedLoopJoin(Operator):
+    """
+    Equi-join that compares every outer row with every inner row. Yields (outer row id, inner row id) pairs.
+    Like every join operator, it does not match rows with an empty number (None) in a join column.
+    """
+
+    def __init__(self, outer_table, outer_ids, inner_table, inner_ids, on_fields):
+        """
+        :param outer_table: Outer CSVTable.
+        :param outer_ids: Outer row ids.
+        :param inner_table: Inner CSVTable.
+        :param inner_ids: Inner row ids. They are traversed once per outer row.
+        :param on_fields: A list of common fields used for the equi-join.
+        """
+        self.outer_table = outer_table
+        self.outer_ids = outer_ids
+        self.inner_table = inner_table
+        self.inner_ids = inner_ids
+        self.on_fields = on_fields
+
+    def __iter__(self):
+        on_fields = self.on_fields
+        outer_fetch = self.outer_table.__get_row_fetcher__(on_fields)
+        inner_fetch = self.inner_table.__get_row_fetcher__(on_fields)
+        inner = []
+        for j in self.inner_ids:
+            ir = inner_fetch(j)
+            inner_key = tuple([ir[f] for f in on_fields])
+            if None not in inner_key:
+                inner.append((j, inner_key))
+        for i in self.outer_ids:
+            outer_row = outer_fetch(i)
+            key = tuple([outer_row[f] for f in on_fields])
+            if None in key:
+                continue
+            for j, inner_key in inner:
+                if inner_key == key:
+                    yield i, j
+
+
+class IndexJoin(Operator):
+    """
+    Index nested loop join. Probes the inner CSVTable once per outer row, through an index on the join columns
+    if there is one, and checks the inner predicates on the row ids the probe returns. Yields
+    (outer row id, inner row id) pairs.
+    """
+
+    def __init__(self, outer_table, outer_ids, inner_table, on_fields, inner_predicates=None):
+        """
+        :param outer_table: Outer CSVTable.
+        :param outer_ids: Outer row ids.
+        :param inner_table: CSVTable to probe.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param inner_predicates: List of CSVPredicate.Predicate that inner rows must satisfy.
+        """
+        self.outer_table = outer_table
+        self.outer_ids = outer_ids
+        self.inner_table = inner_table
+        self.on_fields = on_fields
+        self.inner_predicates = inner_predicates if inner_predicates is not None else []
+
+    def __iter__(self):
+        inner = self.inner_table
+        outer_fetch = self.outer_table.__get_row_fetcher__(self.on_fields)
+        # look the index up once, rather than planning every probe
+        probe_index, _ = inner.__get_access_path__(self.on_fields)
+        for i in self.outer_ids:
+            outer_row = outer_fetch(i)
+            on_template = {f: outer_row[f] for f in self.on_fields}
+            if None in on_template.values():
+                continue
+            if probe_index is not None:
+                ids = inner.__lookup_ids__(probe_index, on_template)
+            else:
+                ids = inner.__find_ids_by_template__(on_template)
+            if self.inner_predicates and ids:
+                ids = inner.__scan_ids__(self.inner_predicates, ids)
+            for j in ids:
+                yield i, j
+
+
+class HashJoin(Operator):
+    """
+    Build/probe hash join. Builds a hash table from join keys to row ids of the build input when iteration
+    starts, then streams the probe input. Yields (left row id, right row id) pairs.
+    """
+
+    def __init__(self, build_table, build_ids, probe_table, probe_ids, on_fields, build_left=True):
+        """
+        :param build_table: CSVTable of the build input.
+        :param build_ids: Row ids of the build input.
+        :param probe_table: CSVTable of the probe input.
+        :param probe_ids: Row ids of the probe input.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param build_left: True if the build input is the left input of the join.
+        """
+        self.build_table = build_table
+        self.build_ids = build_ids
+        self.probe_table = probe_table
+        self.probe_ids = probe_ids
+        self.on_fields = on_fields
+        self.build_left = build_left
+
+    def __iter__(self):
+        on_fields = self.on_fields
+        build_fetch = self.build_table.__get_row_fetcher__(on_fields)
+        probe_fetch = self.probe_table.__get_row_fetcher__(on_fields)
+
+        # build phase
+        hash_table = {}
+        for b in self.build_ids:
+            br = build_fetch(b)
+            key = tuple([br[f] for f in on_fields])
+            if None in key:
+                continue
+            if key in hash_table: hash_table[key].append(b);
+            else: hash_table[key] = [b];
+
+        # probe phase
+        for pr in self.probe_ids:
+            probe_row = probe_fetch(pr)
+            matching_ids = hash_table.get(tuple([probe_row[f] for f in on_fields]))
+            if matching_ids is None:
+                continue
+            for b in matching_ids:
+                yield (b, pr) if self.build_left else (pr, b)
+
+
+class GraceHashJoin(Operator):
+    """
+    Hash join whose hash table holds at most about memory_budget bytes. If the hash table of the build input
+    would be larger, both inputs are hash partitioned on the join key into spill files of (join key, row id)
+    entries, so rows with equal keys land in partitions with the same number, and each pair of partitions is then
+    joined in memory. A partition that is still too large is partitioned again with another hash, at most
+    max_spill_depth times. Pairs stream out one partition at a time, and the spill files are deleted when
+    iteration ends or the operator is dropped. A build input that fits is joined like HashJoin, without spilling.
+    Yields (left row id, right row id) pairs.
+
+    The budget bounds the memory of the join itself, i.e. its hash tables and partition buffers. The rows stay in
+    their CSVTables, which hold them in memory anyway, so only join keys and row ids are spilled, and the output
+    is only bounded if the caller streams it, e.g. with CSVTable.join_iter rather than join().
+    """
+
+    def __init__(self, build_table, build_ids, probe_table, probe_ids, on_fields, build_left=True,
+                 memory_budget=64 * 1024 * 1024, spill_dir=None):
+        """
+        :param build_table: CSVTable of the build input.
+        :param build_ids: Row ids of the build input.
+        :param probe_table: CSVTable of the probe input.
+        :param probe_ids: Row ids of the probe input.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param build_left: True if the build input is the left input of the join.
+        :param memory_budget: Number of bytes a hash table may hold.
+        :param spill_dir: Directory the spill files are created in. The system's temporary directory if None.
+        """
+        self.build_table = build_table
+        self.build_ids = build_ids
+        self.probe_table = probe_table
+        self.probe_ids = probe_ids
+        self.on_fields = on_fields
+        self.build_left = build_left
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        # number of (key, row id) entries written to spill files by the last iteration
+        self.spilled_entries = 0
+
+    def __key_chunks__(self, table, ids):
+        """
+        :return: Iterator over (keys, row ids) chunks of at most batch_size rows. Rows with an empty value in a
+            join column are left out, since they match no row.
+        """
+        on_fields = self.on_fields
+        fetch = table.__get_row_fetcher__(on_fields)
+        for start in range(0, len(ids), batch_size):
+            keys, chunk_ids = [], []
+            for i in ids[start:start + batch_size]:
+                r = fetch(i)
+                key = tuple([r[f] for f in on_fields])
+                if None not in key:
+                    keys.append(key)
+                    chunk_ids.append(i)
+            yield keys, chunk_ids
+
+    def __join_in_memory__(self, build_chunks, probe_chunks):
+        hash_table = {}
+        for keys, ids in build_chunks:
+            for key, b in zip(keys, ids):
+                matching_ids = hash_table.get(key)
+                if matching_ids is None:
+                    hash_table[key] = [b]
+                else:
+                    matching_ids.append(b)
+        for keys, ids in probe_chunks:
+            for key, pr in zip(keys, ids):
+                matching_ids = hash_table.get(key)
+                if matching_ids is None:
+                    continue
+                for b in matching_ids:
+                    yield (b, pr) if self.build_left else (pr, b)
+
+    def __partition__(self, chunks, n_partitions, level, directory, names):
+        """
+        Writes (keys, row ids) chunks to one spill file per partition.
+        :param names: Counter used to name the files.
+        :return: The file names and the number of entries in each partition.
+        """
+        file_names = [os.path.join(directory, "{}.spill".format(next(names))) for _ in range(n_partitions)]
+        counts = [0] * n_partitions
+        buffers = [([], []) for _ in range(n_partitions)]
+        files = [open(f, "wb") for f in file_names]
+        try:
+            for keys, ids in chunks:
+                for key, i in zip(keys, ids):
+                    # Every level hashes with another salt, so a partition that is partitioned again splits.
+                    p = hash((level, key)) % n_partitions
+                    buffer_keys, buffer_ids = buffers[p]
+                    buffer_keys.append(key)
+                    buffer_ids.append(i)
+                    if len(buffer_ids) >= batch_size:
+                        pickle.dump(buffers[p], files[p], pickle.HIGHEST_PROTOCOL)
+                        counts[p] += len(buffer_ids)
+                        buffers[p] = ([], [])
+            for p, buffer in enumerate(buffers):
+                if buffer[1]:
+                    pickle.dump(buffer, files[p], pickle.HIGHEST_PROTOCOL)
+                    counts[p] += len(buffer[1])
+        finally:
+            for f in files:
+                f.close()
+        self.spilled_entries += sum(counts)
+        return file_names, counts
+
+    def __read_chunks__(self, file_name):
+        with open(file_name, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+    def __join__(self, build_chunks, probe_chunks, n_build, entry_size, level, directory, names):
+        n_partitions = math.ceil(n_build * entry_size / max(self.memory_budget, 1))
+        if n_partitions <= 1 or level > max_spill_depth:
+            yield from self.__join_in_memory__(build_chunks, probe_chunks)
+            return
+        n_partitions = min(n_partitions, max_spill_partitions)
+        build_files, build_counts = self.__partition__(build_chunks, n_partitions, level, directory, names)
+        probe_files, probe_counts = self.__partition__(probe_chunks, n_partitions, level, directory, names)
+        for build_file, n, probe_file, n_probe in zip(build_files, build_counts, probe_files, probe_counts):
+            if n and n_probe:
+                yield from self.__join__(self.__read_chunks__(build_file), self.__read_chunks__(probe_file), n,
+                                         entry_size, level + 1, directory, names)
+            os.remove(build_file)
+            os.remove(probe_file)
+
+    def __iter__(self):
+        self.spilled_entries = 0
+        build_chunks = self.__key_chunks__(self.build_table, self.build_ids)
+        probe_chunks = self.__key_chunks__(self.probe_table, self.probe_ids)
+        first = next(build_chunks, ([], []))
+        build_chunks = itertools.chain([first], build_chunks)
+        # bytes per hash table entry, from the keys of the first chunk
+        sample = first[0][:100]
+        entry_size = hash_entry_overhead + (sum(map(sys.getsizeof, sample)) / len(sample) if sample else 0)
+        if len(self.build_ids) * entry_size <= self.memory_budget:
+            yield from self.__join_in_memory__(build_chunks, probe_chunks)
+            return
+
+        directory = tempfile.mkdtemp(prefix="join-", dir=self.spill_dir)
+        try:
+            yield from self.__join__(build_chunks, probe_chunks, len(self.build_ids), entry_size, 0, directory,
+                                     itertools.count())
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class MergeJoin(Operator):
+    """
+    Merge phase of a sort-merge join. Takes the row ids of both inputs ordered on the join columns, with their
+    join keys, and yields a (left row id, right row id) pair for each pair of rows with equal keys.
+    """
+
+    def __init__(self, left_ids, left_keys, right_ids, right_keys):
+        """
+        :param left_ids: Left row ids, ordered on the join columns.
+        :param left_keys: Join keys of the left row ids.
+        :param right_ids: Right row ids, ordered on the join columns.
+        :param right_keys: Join keys of the right row ids.
+        """
+        self.left_ids = left_ids
+        self.left_keys = left_keys
+        self.right_ids = right_ids
+        self.right_keys = right_keys
+
+    def __iter__(self):
+        left_ids, left_keys = self.left_ids, self.left_keys
+        right_ids, right_keys = self.right_ids, self.right_keys
+
+        # Each run of equal keys on the left is matched with the run of equal keys on the right.
+        i, j = 0, 0
+        n_left, n_right = len(left_ids), len(right_ids)
+        while i < n_left and j < n_right:
+            if left_keys[i] < right_keys[j]:
+                i += 1
+            elif left_keys[i] > right_keys[j]:
+                j += 1
+            else:
+                key = left_keys[i]
+                i_end = i
+                while i_end < n_left and left_keys[i_end] == key:
+                    i_end += 1
+                j_end = j
+                while j_end < n_right and right_keys[j_end] == key:
+                    j_end += 1
+                right_group = right_ids[j:j_end]
+                for a in range(i, i_end):
+                    left_id = left_ids[a]
+                    for right_id in right_group:
+                        yield left_id, right_id
+                i, j = i_end, j_end
+
+
+class TupleProject(Operator):
+    """
+    Late materialization of a multi-way join. Builds an output row holding only the requested columns for each
+    tuple of row ids.
+    """
+
+    def __init__(self, child, tables, columns):
+        """
+        :param child: Input tuples of row ids.
+        :param tables: CSVTables the row ids of a tuple belong to, by position in the tuple.
+        :param columns: List of (column name, position in the tuple of the row the value is taken from).
+        """
+        self.child = child
+        self.tables = tables
+        self.columns = columns
+
+    def __iter__(self):
+        fields = [c for c, _ in self.columns]
+        read = tuple_reader(self.tables, [(p, c) for c, p in self.columns])
+        for t in self.child:
+            yield dict(zip(fields, read(t)))
+
+
+class TupleHashJoin(Operator):
+    """
+    Hash join step of a multi-way join. Joins tuples of row ids, one per table joined so far, with the rows of
+    another table whose join columns equal columns of the rows of the tuple. Builds a hash table from join keys to
+    row ids of the table when iteration starts, then streams the tuples. Yields each tuple extended with the row
+    id of every matching row.
+    """
+
+    def __init__(self, child, tables, table, ids, sources):
+        """
+        :param child: Input tuples of row ids.
+        :param tables: CSVTables the row ids of a tuple belong to, by position in the tuple.
+        :param table: CSVTable to join.
+        :param ids: Row ids of table.
+        :param sources: List of (position in the tuple, column name). The column of table must equal the column
+            of the row at that position.
+        """
+        self.child = child
+        self.tables = tables
+        self.table = table
+        self.ids = ids
+        self.sources = sources
+
+    def __iter__(self):
+        columns = [c for _, c in self.sources]
+        fetch = self.table.__get_row_fetcher__(columns)
+
+        # build phase
+        hash_table = {}
+        for b in self.ids:
+            r = fetch(b)
+            key = tuple([r[c] for c in columns])
+            if None in key:
+                continue
+            if key in hash_table:
+                hash_table[key].append(b)
+            else:
+                hash_table[key] = [b]
+
+        # probe phase
+        read = tuple_reader(self.tables, self.sources)
+        for t in self.child:
+            matching_ids = hash_table.get(read(t))
+            if matching_ids is None:
+                continue
+            for b in matching_ids:
+                yield t + (b,)
+
+
+class TupleIndexJoin(Operator):
+    """
+    Index nested loop join step of a multi-way join. Probes the table once per input tuple of row ids, through an
+    index on the join columns if there is one, and checks the predicates on the row ids the probe returns. Yields
+    each tuple extended with the row id of every matching row.
+    """
+
+    def __init__(self, child, tables, table, sources, predicates=None):
+        """
+        :param child: Input tuples of row ids.
+        :param tables: CSVTables the row ids of a tuple belong to, by position in the tuple.
+        :param table: CSVTable to probe.
+        :param sources: List of (position in the tuple, column name), see TupleHashJoin.
+        :param predicates: List of CSVPredicate.Predicate that rows of table must satisfy.
+        """
+        self.child = child
+        self.tables = tables
+        self.table = table
+        self.sources = sources
+        self.predicates = predicates if predicates is not None else []
+
+    def __iter__(self):
+        inner = self.table
+        columns = [c for _, c in self.sources]
+        read = tuple_reader(self.tables, self.sources)
+        # look the index up once, rather than planning every probe
+        probe_index, _ = inner.__get_access_path__(columns)
+        # An index on a prefix of the join columns, or a column equal to columns of several rows of the tuple,
+        # leaves join columns to check on the rows the probe returns.
+        check = len(columns) > len(set(columns))
+        if probe_index is not None:
+            idx_cols = inner.get_description()["indexes"][probe_index]["columns"]
+            check = check or inner.__get_prefix_length__(idx_cols, columns) < len(columns)
+        check_fetch = inner.__get_row_fetcher__(columns)
+
+        for t in self.child:
+            key = read(t)
+            if None in key:
+                continue
+            on_template = dict(zip(columns, key))
+            if probe_index is not None:
+                ids = inner.__lookup_ids__(probe_index, on_template)
+            else:
+                ids = inner.__find_ids_by_template__(on_template)
+            if check and ids:
+                ids = [j for j, r in zip(ids, map(check_fetch, ids)) if tuple([r[c] for c in columns]) == key]
+            if self.predicates and ids:
+                ids = inner.__scan_ids__(self.predicates, ids)
+            for j in ids:
+                yield t + (j,)
+
+
+class HashAggregate(Operator):
+    """
+    GROUP BY with aggregates. Pulls its input once and keeps a hash table from the values of the grouping columns
+    to the running state of every aggregate, so it holds one entry per group plus one batch of input, never the
+    whole input. Yields one row per group once the input is exhausted, holding the grouping columns and one column
+    per aggregate, see aggregate_name. Like in SQL, aggregates of a column skip empty (None) values, sum, min, max
+    and avg of no values are None, and without grouping columns there is exactly one output row.
+    """
+
+    def __init__(self, child, group_fields, aggregates, read=None):
+        """
+        :param child: Input rows, or items read turns into values, e.g. pairs of row ids from a join.
+        :param group_fields: List of grouping column names.
+        :param aggregates: List of (function, column) pairs. function is one of aggregate_functions and column
+            is None for count(*).
+        :param read: Function from an input item to the list of the values of the columns returned by
+            columns(), in that order. If None, the items are rows and the values are read from them.
+        """
+        for function, column in aggregates:
+            if function not in aggregate_functions or (column is None and function != "count"):
+                raise ValueError("Invalid aggregate.")
+        self.child = child
+        self.group_fields = list(group_fields)
+        self.aggregates = list(aggregates)
+        self.read = read
+
+    def columns(self):
+        """
+        :return: Columns the operator reads from each input item: the grouping columns, then the columns of the
+            aggregates.
+        """
+        return self.group_fields + [column for _, column in self.aggregates if column is not None]
+
+    def __iter__(self):
+        n_groups = len(self.group_fields)
+        # Rows are addressed by column name, the values read from other items by position.
+        if self.read is None:
+            read = None
+            group_keys = self.group_fields
+            specs = [(function, column) for function, column in self.aggregates]
+        else:
+            read = self.read
+            group_keys = list(range(n_groups))
+            specs = []
+            position = n_groups
+            for function, column in self.aggregates:
+                specs.append((function, None if column is None else position))
+                if column is not None:
+                    position += 1
+        # Keys are tuples of the group values, except with a single grouping column, where they are the value.
+        key_of = operator.itemgetter(*group_keys) if group_keys else lambda values: ()
+        # The state of count is the count, of avg a [sum, count] pair, and of the others the value so far.
+        initial = [0 if function == "count" else ([0, 0] if function == "avg" else None) for function, _ in specs]
+
+        # The input is split into groups a batch at a time, and each aggregate then folds the values of a group
+        # in the batch with one call to len, sum, min or max instead of a step per value.
+        groups = {}
+        items = iter(self.child)
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                break
+            if read is not None:
+                batch = list(map(read, batch))
+            batch_groups = {}
+            try:
+                for values, key in zip(batch, map(key_of, batch)):
+                    group = batch_groups.get(key)
+                    if group is None:
+                        batch_groups[key] = [values]
+                    else:
+                        group.append(values)
+                for key, group in batch_groups.items():
+                    state = groups.get(key)
+                    if state is None:
+                        state = [list(s) if type(s) is list else s for s in initial]
+                        groups[key] = state
+                    for j, (function, pos) in enumerate(specs):
+                        if pos is None:
+                            state[j] += len(group)
+                            continue
+                        vs = [v for v in map(operator.itemgetter(pos), group) if v is not None]
+                        if not vs:
+                            continue
+                        if function == "count":
+                            state[j] += len(vs)
+                        elif function == "sum":
+                            state[j] = sum(vs) if state[j] is None else state[j] + sum(vs)
+                        elif function == "min":
+                            state[j] = min(vs) if state[j] is None else min(state[j], min(vs))
+                        elif function == "max":
+                            state[j] = max(vs) if state[j] is None else max(state[j], max(vs))
+                        else:
+                            state[j][0] += sum(vs)
+                            state[j][1] += len(vs)
+            except KeyError:
+                raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
+
+        if not groups and n_groups == 0:
+            groups[()] = [list(s) if type(s) is list else s for s in initial]
+        names = [aggregate_name(function, column) for function, column in self.aggregates]
+        for key, state in groups.items():
+            r = dict(zip(self.group_fields, (key,) if n_groups == 1 else key))
+            for name, (function, _), s in zip(names, specs, state):
+                if function == "avg":
+                    s = s[0] / s[1] if s[1] else None
+                r[name] = s
+            yield r
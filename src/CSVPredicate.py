@@ -0,0 +1,195 @@
+from DataTableExceptions import DataTableException
+
+# Operators that may be used in a template entry of the form {"column": {operator: operand, ...}}.
+# "between" takes a pair [low, high] (both inclusive), "in" takes a list of values. A plain template
+# value {"column": value} is the same as {"column": {"=": value}}.
+operators = ("=", "<", "<=", ">", ">=", "between", "in")
+range_operators = ("<", "<=", ">", ">=", "between")
+
+
+def to_number(v):
+    """
+    :param v: A value read from a CSV file or given in a template.
+    :return: v as an int or float, or None if v is empty or not a number.
+    """
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+
+
+def parse_number(v):
+    """
+    Converts a value of a "number" column, as read from a CSV file or given in a template, to the value the
+    table holds.
+    :param v: A string, a number or None.
+    :return: v as an int or float, or None if v is empty.
+    :raise ValueError: If v is not a number.
+    """
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        if v is None or v == "":
+            return None
+        return float(v)
+
+
+def invalid_template(message):
+    return DataTableException(code=DataTableException.invalid_template, message=message)
+
+
+class Predicate:
+    """
+    A condition on a single column, compiled from one entry of a template.
+
+    Values of "number" columns are held as numbers, see parse_number, so operands on them are converted to
+    numbers too and an empty operand stands for an empty value. Equality on any other column compares strings.
+    The other operators compare numbers if the predicate is numeric, which is the case for "number" columns and
+    for operands given as Python numbers. Values that are empty or not numbers never satisfy a numeric
+    comparison.
+    """
+
+    def __init__(self, column, condition, numeric=False):
+        """
+        :param column: Column name.
+        :param condition: A plain value, or a dictionary mapping operators to operands.
+        :param numeric: True if the column holds numbers.
+        """
+        self.column = column
+        if isinstance(condition, dict):
+            terms = list(condition.items())
+        else:
+            terms = [("=", condition)]
+
+        operands = []
+        for op, operand in terms:
+            if op not in operators:
+                raise invalid_template("Invalid operator '{}' for column {}".format(op, column))
+            if op == "between":
+                if not isinstance(operand, (list, tuple)) or len(operand) != 2:
+                    raise invalid_template("between needs a [low, high] pair for column " + column)
+                operands += list(operand)
+            elif op == "in":
+                if not isinstance(operand, (list, tuple, set)):
+                    raise invalid_template("in needs a list of values for column " + column)
+                operands += list(operand)
+            elif op != "=":
+                operands.append(operand)
+
+        self.numeric = numeric or any([isinstance(o, (int, float)) and not isinstance(o, bool) for o in operands])
+
+        # Coerce the operands once, so matching a row only has to coerce the row value.
+        self.terms = []
+        for op, operand in terms:
+            if op == "=":
+                operand = self.__coerce_equality_operand__(operand, numeric)
+            elif self.numeric:
+                if op in ("between", "in"):
+                    operand = [self.__coerce_operand__(o) for o in operand]
+                else:
+                    operand = self.__coerce_operand__(operand)
+            if op == "between":
+                operand = tuple(operand)
+            elif op == "in":
+                operand = set(operand)
+            self.terms.append((op, operand))
+
+    def __coerce_operand__(self, o):
+        n = to_number(o)
+        if n is None:
+            raise invalid_template("Invalid number '{}' for column {}".format(o, self.column))
+        return n
+
+    def __coerce_equality_operand__(self, o, numeric):
+        if numeric:
+            try:
+                return parse_number(o)
+            except (TypeError, ValueError):
+                raise invalid_template("Invalid number '{}' for column {}".format(o, self.column))
+        if isinstance(o, (int, float)) and not isinstance(o, bool):
+            return str(o)
+        return o
+
+    def __repr__(self):
+        return "Predicate({}, {})".format(self.column, self.terms)
+
+    def is_equality(self):
+        """
+        :return: True if this is a plain equality, i.e. it can be answered by a hash index lookup.
+        """
+        return len(self.terms) == 1 and self.terms[0][0] == "="
+
+    def equality_value(self):
+        return self.terms[0][1]
+
+    def is_range(self):
+        """
+        :return: True if every term is a range operator, i.e. it can be answered by an ordered index.
+        """
+        return all([op in range_operators for op, _ in self.terms])
+
+    def is_in(self):
+        return len(self.terms) == 1 and self.terms[0][0] == "in"
+
+    def in_values(self):
+        return self.terms[0][1]
+
+    def bounds(self):
+        """
+        Intersects the range terms.
+        :return: (low, low_inclusive, high, high_inclusive). low or high is None if unbounded.
+        """
+        low, low_inclusive, high, high_inclusive = None, True, None, True
+        for op, operand in self.terms:
+            if op == "between":
+                new_low, new_high = [(operand[0], True)], [(operand[1], True)]
+            elif op in (">", ">="):
+                new_low, new_high = [(operand, op == ">=")], []
+            elif op in ("<", "<="):
+                new_low, new_high = [], [(operand, op == "<=")]
+            else:
+                continue
+            for v, inclusive in new_low:
+                if low is None or v > low or (v == low and not inclusive):
+                    low, low_inclusive = v, inclusive
+            for v, inclusive in new_high:
+                if high is None or v < high or (v == high and not inclusive):
+                    high, high_inclusive = v, inclusive
+        return low, low_inclusive, high, high_inclusive
+
+    def matches(self, v):
+        """
+        :param v: Value of the column in a row.
+        :return: True if the value satisfies every term.
+        """
+        x = None
+        for op, operand in self.terms:
+            if op == "=":
+                if v != operand:
+                    return False
+                continue
+
+            if x is None:
+                x = to_number(v) if self.numeric else v
+                if x is None:
+                    return False
+            if op == "<":
+                if not x < operand: return False
+            elif op == "<=":
+                if not x <= operand: return False
+            elif op == ">":
+                if not x > operand: return False
+            elif op == ">=":
+                if not x >= operand: return False
+            elif op == "between":
+                if not operand[0] <= x <= operand[1]: return False
+            elif op == "in":
+                if x not in operand: return False
+        return True
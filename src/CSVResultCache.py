@@ -0,0 +1,111 @@
+import collections
+import json
+import threading
+
+# Default bounds of a ResultCache.
+default_max_entries = 1024
+default_max_rows = 100000
+
+
+def normalize_template(t):
+    """
+    :param t: Select template, see CSVPredicate.
+    :return: A string that is the same for templates that ask the same question, whatever the order of their
+        entries, or None if the template cannot be turned into a cache key.
+    """
+    if t is None:
+        return None
+    try:
+        return json.dumps(t, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultCache:
+    """
+    Opt-in cache of the results of CSVTable.find_by_template() and CSVTable.join(). Pass it to the CSVTable
+    constructor as result_cache. Results are kept in least recently used order and dropped when the cache holds
+    more than max_entries results or max_rows rows.
+
+    Each result is stored with the signatures of the tables it was computed from, see
+    CSVTable.__result_signature__. A signature changes when a table is loaded from a changed CSV file or with a
+    changed catalog definition, and when rows are written, so results are never served for data they were not
+    computed from. invalidate() drops results explicitly.
+    """
+
+    def __init__(self, max_entries=default_max_entries, max_rows=default_max_rows):
+        """
+        :param max_entries: Max number of results held.
+        :param max_rows: Max number of rows held by all results. Larger results are not cached.
+        """
+        if max_entries < 0 or max_rows < 0:
+            raise ValueError("Invalid cache size.")
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+
+        # Maps a query key to (table names, signature, rows).
+        self.__entries__ = collections.OrderedDict()
+        self.__row_count__ = 0
+        self.__lock__ = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries__)
+
+    def __remove__(self, key):
+        _, _, rows = self.__entries__.pop(key)
+        self.__row_count__ -= len(rows)
+
+    def get(self, key, signature):
+        """
+        :param key: Query key. Must be hashable.
+        :param signature: Signature of the tables the query reads.
+        :return: Copy of the cached list of rows, or None if the result is not cached for this signature.
+        """
+        with self.__lock__:
+            entry = self.__entries__.get(key)
+            if entry is None or entry[1] != signature:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries__.move_to_end(key)
+            return list(entry[2])
+
+    def put(self, key, t_names, signature, rows):
+        """
+        :param key: Query key. Must be hashable.
+        :param t_names: Names of the tables the query reads.
+        :param signature: Signature of the tables the query reads.
+        :param rows: List of result rows.
+        :return: None
+        """
+        if len(rows) > self.max_rows or self.max_entries == 0:
+            return
+        with self.__lock__:
+            if key in self.__entries__:
+                self.__remove__(key)
+            self.__entries__[key] = (tuple(t_names), signature, list(rows))
+            self.__row_count__ += len(rows)
+            while len(self.__entries__) > self.max_entries or self.__row_count__ > self.max_rows:
+                self.__remove__(next(iter(self.__entries__)))
+                self.evictions += 1
+
+    def invalidate(self, t_name=None):
+        """
+        Drops the results that read a table.
+        :param t_name: Table name. All results if None.
+        :return: None
+        """
+        with self.__lock__:
+            for key, (t_names, _, _) in list(self.__entries__.items()):
+                if t_name is None or t_name in t_names:
+                    self.__remove__(key)
+
+    def row_count(self):
+        """
+        :return: Number of rows held by the cached results.
+        """
+        return self.__row_count__
@@ -0,0 +1,175 @@
+import bisect
+import json
+
+from CSVPredicate import to_number
+
+# Number of buckets in the equi-depth histograms built by ANALYZE.
+histogram_buckets = 10
+
+# Selectivities used for columns that have not been analyzed.
+default_equality_selectivity = 0.1
+default_range_selectivity = 1.0 / 3.0
+
+
+class ColumnStatistics:
+    """
+    Statistics for one column: number of distinct values, fraction of empty values and an equi-depth histogram
+    of the non-empty values. The histogram is a list of bucket bounds. Each bucket holds about the same number
+    of rows.
+    """
+
+    def __init__(self, column_name, distinct_count=0, null_fraction=0.0, histogram=None, numeric=False):
+        self.column_name = column_name
+        self.distinct_count = distinct_count
+        self.null_fraction = null_fraction
+        self.histogram = histogram if histogram is not None else []
+        self.numeric = numeric
+
+    @classmethod
+    def compute(cls, column_name, values, row_count, numeric=False):
+        """
+        :param column_name: Column name.
+        :param values: Iterator over the values of the column.
+        :param row_count: Number of rows in the table.
+        :param numeric: True for "number" columns. Their histogram is built on numbers.
+        :return: ColumnStatistics.
+        """
+        non_null = []
+        for v in values:
+            if v is None or v == "":
+                continue
+            if numeric:
+                v = to_number(v)
+                if v is None:
+                    continue
+            non_null.append(v)
+        non_null.sort()
+
+        histogram = []
+        if non_null:
+            n = len(non_null)
+            buckets = min(histogram_buckets, n)
+            histogram = [non_null[(n - 1) * k // buckets] for k in range(buckets + 1)]
+
+        null_fraction = 1.0 - len(non_null) / row_count if row_count > 0 else 0.0
+        return cls(column_name, len(set(non_null)), null_fraction, histogram, numeric)
+
+    def __fraction_below__(self, v, inclusive):
+        """
+        :return: Estimated fraction of the non-empty values that are below v (or equal, if inclusive).
+        """
+        h = self.histogram
+        buckets = len(h) - 1
+        if buckets < 1:
+            return 0.5
+        pos = bisect.bisect_right(h, v) if inclusive else bisect.bisect_left(h, v)
+        if pos == 0:
+            return 0.0
+        if pos > buckets:
+            return 1.0
+        # v falls into bucket pos - 1. Interpolate inside the bucket for numbers, take half a bucket otherwise.
+        low, high = h[pos - 1], h[pos]
+        inside = 0.5
+        if self.numeric and high > low:
+            inside = min(max((v - low) / (high - low), 0.0), 1.0)
+        return (pos - 1 + inside) / buckets
+
+    def selectivity(self, p):
+        """
+        :param p: A CSVPredicate.Predicate on this column.
+        :return: Estimated fraction of rows that satisfy the predicate.
+        """
+        not_null = 1.0 - self.null_fraction
+        if p.is_equality():
+            if self.distinct_count == 0:
+                return 0.0
+            return not_null / self.distinct_count
+        if p.is_in():
+            if self.distinct_count == 0:
+                return 0.0
+            return min(1.0, not_null * len(p.in_values()) / self.distinct_count)
+        if p.is_range() and p.numeric == self.numeric and self.histogram:
+            low, low_inclusive, high, high_inclusive = p.bounds()
+            try:
+                below_high = self.__fraction_below__(high, high_inclusive) if high is not None else 1.0
+                below_low = self.__fraction_below__(low, not low_inclusive) if low is not None else 0.0
+            except TypeError:
+                return default_range_selectivity
+            return not_null * max(below_high - below_low, 0.0)
+        return default_range_selectivity
+
+
+class TableStatistics:
+    """
+    Statistics for a table, collected by CSVTable.analyze() and stored in the csvstatistics catalog table.
+    """
+
+    def __init__(self, row_count=0, columns=None, indexes=None):
+        """
+        :param row_count: Number of rows.
+        :param columns: Dictionary mapping column names to ColumnStatistics.
+        :param indexes: Dictionary mapping index names to their number of distinct keys.
+        """
+        self.row_count = row_count
+        self.columns = columns if columns is not None else {}
+        self.indexes = indexes if indexes is not None else {}
+
+    def selectivity(self, p):
+        """
+        :param p: A CSVPredicate.Predicate.
+        :return: Estimated fraction of rows that satisfy the predicate.
+        """
+        if p.column in self.columns:
+            return self.columns[p.column].selectivity(p)
+        if p.is_equality():
+            return default_equality_selectivity
+        return default_range_selectivity
+
+    def estimate_rows(self, predicates):
+        """
+        Estimates the number of rows satisfying all predicates, assuming the columns are independent.
+        :param predicates: List of CSVPredicate.Predicate.
+        :return: Estimated row count.
+        """
+        result = float(self.row_count)
+        for p in predicates:
+            result *= self.selectivity(p)
+        return result
+
+    def to_catalog_rows(self, t_name):
+        """
+        :param t_name: Table name.
+        :return: List of dictionaries, one per row of the csvstatistics table.
+        """
+        rows = [{"t_name": t_name, "stat_kind": "table", "stat_name": "", "row_count": self.row_count,
+                 "distinct_count": None, "null_fraction": None, "histogram": None}]
+        for c in self.columns.values():
+            rows.append({"t_name": t_name, "stat_kind": "column", "stat_name": c.column_name,
+                         "row_count": self.row_count, "distinct_count": c.distinct_count,
+                         "null_fraction": c.null_fraction,
+                         "histogram": json.dumps({"numeric": c.numeric, "bounds": c.histogram})})
+        for idx_name, distinct_count in self.indexes.items():
+            rows.append({"t_name": t_name, "stat_kind": "index", "stat_name": idx_name, "row_count": self.row_count,
+                         "distinct_count": distinct_count, "null_fraction": None, "histogram": None})
+        return rows
+
+    @classmethod
+    def from_catalog_rows(cls, rows):
+        """
+        :param rows: Rows read from the csvstatistics table for one table.
+        :return: TableStatistics, or None if the table has not been analyzed.
+        """
+        if not rows:
+            return None
+        result = cls()
+        for r in rows:
+            if r["stat_kind"] == "table":
+                result.row_count = int(r["row_count"])
+            elif r["stat_kind"] == "column":
+                h = json.loads(r["histogram"]) if r["histogram"] else {"numeric": False, "bounds": []}
+                result.columns[r["stat_name"]] = ColumnStatistics(r["stat_name"], int(r["distinct_count"]),
+                                                                  float(r["null_fraction"]), h["bounds"],
+                                                                  h["numeric"])
+            elif r["stat_kind"] == "index":
+                result.indexes[r["stat_name"]] = int(r["distinct_count"])
+        return result
@@ -0,0 +1,473 @@
+import array
+import itertools
+import math
+import sys
+
+# Type code for the arrays holding "number" columns. 'q' is a signed 64 bit integer.
+number_typecode = "q"
+min_number = -(2 ** 63)
+max_number = 2 ** 63 - 1
+
+# A text column is dictionary encoded if at most this fraction of its values are distinct.
+dictionary_max_ratio = 0.5
+
+# Number of objects sampled to estimate the memory held by a container of Python objects.
+size_sample = 1000
+
+
+def sampled_size(objects, n, size=sys.getsizeof):
+    """
+    :param objects: Iterable over n Python objects, e.g. the values of a list column or the rows of a table.
+    :param n: Number of objects.
+    :param size: Function from an object to the number of bytes it holds.
+    :return: Estimated number of bytes held by the objects, from a sample of about size_sample of them.
+    """
+    if n == 0:
+        return 0
+    step = max(n // size_sample, 1)
+    sample = [size(o) for o in itertools.islice(objects, 0, None, step)]
+    if not sample:
+        return 0
+    return n * sum(sample) // len(sample)
+
+
+def code_typecode(n_values):
+    """
+    :param n_values: Number of distinct values of a dictionary encoded column.
+    :return: Type code of the smallest unsigned integer array that holds their codes.
+    """
+    if n_values <= 1 << 8:
+        return "B"
+    if n_values <= 1 << 16:
+        return "H"
+    return "L"
+
+
+def share_row_values(rows, column_names, max_ratio=None):
+    """
+    Makes the rows hold one string object per distinct value of their text columns with few distinct values,
+    instead of one per row. The row storage counterpart of dictionary encoding.
+    :param rows: List of row dictionaries.
+    :param column_names: Text columns.
+    :param max_ratio: A column is only shared if at most this fraction of its values are distinct.
+        dictionary_max_ratio if None.
+    :return: Dictionary mapping the names of the shared columns to their distinct values.
+    """
+    if max_ratio is None:
+        max_ratio = dictionary_max_ratio
+    result = {}
+    limit = max_ratio * len(rows)
+    for c in column_names:
+        shared = {}
+        for r in rows:
+            v = r[c]
+            r[c] = shared.setdefault(v, v)
+            if len(shared) > limit:
+                break
+        else:
+            result[c] = list(shared)
+    return result
+
+
+def extend_shared_values(rows, shared_values):
+    """
+    Makes rows appended to a table share the string objects of the rows already shared by share_row_values.
+    :param rows: List of the new row dictionaries.
+    :param shared_values: Dictionary returned by share_row_values. New values are added to it.
+    :return: None
+    """
+    for c, values in shared_values.items():
+        shared = dict(zip(values, values))
+        for r in rows:
+            v = r[c]
+            s = shared.setdefault(v, v)
+            if s is v and len(shared) > len(values):
+                values.append(v)
+            r[c] = s
+
+
+class ColumnStore:
+    """
+    Columnar storage for the rows of a CSVTable. Holds one contiguous array per column instead of one
+    dictionary per row. Columns whose catalog column_type is "number" are held in an array.array of
+    integers (with a separate null mask for empty values), all other columns in a list of strings. Values
+    are stored as the table holds them, i.e. "number" values are ints, floats or None.
+
+    Text columns with few distinct values can be dictionary encoded, see encode_dictionaries. They hold an
+    array of small integer codes and one list of the distinct values, so equality is decided by comparing codes
+    and a predicate is evaluated once per distinct value instead of once per row.
+
+    Rows are only turned into dictionaries at the API boundary, i.e. when they are indexed or iterated over,
+    so the store can stand in for the list of dictionaries used by the row storage.
+    """
+
+    def __init__(self, column_definitions):
+        """
+        :param column_definitions: List of column JSON objects, as in the "columns" entry of a table description.
+        """
+        self.column_names = [c["column_name"] for c in column_definitions]
+        self.text_columns = [c["column_name"] for c in column_definitions if c["column_type"] != "number"]
+        self.columns = {}
+        self.nulls = {}
+        # For dictionary encoded columns, the distinct values in code order and the code of each value.
+        self.dictionaries = {}
+        self.dictionary_codes = {}
+        # (predicate, dictionary size, codes of the values that satisfy it) of the last filter_ids on an encoded
+        # column, see filter_ids.
+        self.__matching_codes__ = None
+        self.n_rows = 0
+        for c in column_definitions:
+            if c["column_type"] == "number":
+                self.columns[c["column_name"]] = array.array(number_typecode)
+                self.nulls[c["column_name"]] = bytearray()
+            else:
+                self.columns[c["column_name"]] = []
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getstate__(self):
+        # The predicate of the last filter is not saved with the rows.
+        state = self.__dict__.copy()
+        state["__matching_codes__"] = None
+        return state
+
+    def __iter__(self):
+        for i in range(self.n_rows):
+            yield self.get_row(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.get_row(j) for j in range(*i.indices(self.n_rows))]
+        if i < 0:
+            i += self.n_rows
+        if i < 0 or i >= self.n_rows:
+            raise IndexError("Row index out of range.")
+        return self.get_row(i)
+
+    def is_array_column(self, c):
+        return c in self.nulls
+
+    def __demote__(self, c):
+        """
+        Converts an array column to a list of numbers. Happens when a "number" column holds a value that
+        cannot be stored in the array, e.g. 3.55 or an integer that does not fit into 64 bits.
+        :param c: Column name.
+        :return: None
+        """
+        self.columns[c] = list(self.values(c))
+        del self.nulls[c]
+
+    def __append_value__(self, c, v):
+        if c in self.nulls:
+            if v is None:
+                self.columns[c].append(0)
+                self.nulls[c].append(1)
+                return
+            if type(v) is int and min_number <= v <= max_number:
+                self.columns[c].append(v)
+                self.nulls[c].append(0)
+                return
+            self.__demote__(c)
+        elif c in self.dictionary_codes:
+            code = self.dictionary_codes[c].get(v)
+            if code is None:
+                code = self.__add_dictionary_value__(c, v)
+            self.columns[c].append(code)
+            return
+        self.columns[c].append(v)
+
+    def __add_dictionary_value__(self, c, v):
+        """
+        Adds a value to the dictionary of an encoded column, and widens the codes if they do not fit anymore.
+        :return: The code of the value.
+        """
+        dictionary = self.dictionaries[c]
+        code = len(dictionary)
+        dictionary.append(v)
+        self.dictionary_codes[c][v] = code
+        typecode = code_typecode(len(dictionary))
+        if self.columns[c].typecode != typecode:
+            self.columns[c] = array.array(typecode, self.columns[c])
+        return code
+
+    def encode_dictionaries(self, max_ratio=None):
+        """
+        Dictionary encodes the text columns with few distinct values. Called once the rows are loaded, so the
+        choice is based on the cardinality of the whole column.
+        :param max_ratio: A column is only encoded if at most this fraction of its values are distinct.
+            dictionary_max_ratio if None.
+        :return: Names of the encoded columns.
+        """
+        if max_ratio is None:
+            max_ratio = dictionary_max_ratio
+        result = []
+        limit = max_ratio * self.n_rows
+        for c in self.text_columns:
+            if c in self.dictionary_codes:
+                continue
+            codes = {}
+            for v in self.columns[c]:
+                if v not in codes:
+                    codes[v] = len(codes)
+                    if len(codes) > limit:
+                        break
+            else:
+                self.columns[c] = array.array(code_typecode(len(codes)), map(codes.__getitem__, self.columns[c]))
+                self.dictionaries[c] = list(codes)
+                self.dictionary_codes[c] = codes
+                result.append(c)
+        return result
+
+    def is_dictionary_column(self, c):
+        return c in self.dictionary_codes
+
+    def dictionary_groups(self, c):
+        """
+        :param c: A dictionary encoded column.
+        :return: The distinct values of the column, and for each of them the list of the row ids holding it,
+            in row id order. Found by one pass over the codes, without hashing any value.
+        """
+        groups = [[] for _ in self.dictionaries[c]]
+        for i, code in enumerate(self.columns[c]):
+            groups[code].append(i)
+        return self.dictionaries[c], groups
+
+    def append(self, r):
+        """
+        Adds a row.
+        :param r: A dictionary holding a value for every column in the store.
+        :return: None
+        """
+        for c in self.column_names:
+            self.__append_value__(c, r[c])
+        self.n_rows += 1
+
+    def append_values(self, values):
+        """
+        Adds a row without building a dictionary for it.
+        :param values: List of values in the order of column_names.
+        :return: None
+        """
+        for c, v in zip(self.column_names, values):
+            self.__append_value__(c, v)
+        self.n_rows += 1
+
+    def set_value(self, i, c, v):
+        """
+        Changes a value, see CSVTable.update.
+        :param i: Row id.
+        :param c: Column name.
+        :param v: New value, as the table holds it.
+        :return: None
+        """
+        if c in self.nulls:
+            if v is None:
+                self.columns[c][i] = 0
+                self.nulls[c][i] = 1
+                return
+            if type(v) is int and min_number <= v <= max_number:
+                self.columns[c][i] = v
+                self.nulls[c][i] = 0
+                return
+            self.__demote__(c)
+        elif c in self.dictionary_codes:
+            code = self.dictionary_codes[c].get(v)
+            if code is None:
+                code = self.__add_dictionary_value__(c, v)
+            self.columns[c][i] = code
+            return
+        self.columns[c][i] = v
+
+    def get_value(self, i, c):
+        """
+        :param i: Row id.
+        :param c: Column name.
+        :return: The value of column c in row i.
+        """
+        if c in self.nulls:
+            if self.nulls[c][i]:
+                return None
+            return self.columns[c][i]
+        if c in self.dictionaries:
+            return self.dictionaries[c][self.columns[c][i]]
+        return self.columns[c][i]
+
+    def get_row(self, i, fields=None):
+        """
+        Materializes a single row.
+        :param i: Row id.
+        :param fields: Columns to include. All columns if None.
+        :return: Dictionary representing the row.
+        """
+        if fields is None:
+            fields = self.column_names
+        return {c: self.get_value(i, c) for c in fields}
+
+    def get_rows(self, ids, fields=None):
+        """
+        Materializes rows a column at a time, which costs less than a get_row call per row.
+        :param ids: Row ids.
+        :param fields: Columns to include. All columns if None.
+        :return: List of dictionaries representing the rows.
+        """
+        if fields is None:
+            fields = self.column_names
+        if not fields:
+            return [{} for _ in ids]
+        columns = []
+        for c in fields:
+            col = self.columns[c]
+            if c in self.nulls:
+                nulls = self.nulls[c]
+                columns.append([None if nulls[i] else col[i] for i in ids])
+            elif c in self.dictionaries:
+                columns.append(list(map(self.dictionaries[c].__getitem__, map(col.__getitem__, ids))))
+            else:
+                columns.append(list(map(col.__getitem__, ids)))
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+    def values(self, c):
+        """
+        :param c: Column name.
+        :return: Iterator over the values of the column in row id order.
+        """
+        if c not in self.columns:
+            raise KeyError(c)
+        if c in self.nulls:
+            return (None if n else v for v, n in zip(self.columns[c], self.nulls[c]))
+        if c in self.dictionaries:
+            return map(self.dictionaries[c].__getitem__, self.columns[c])
+        return iter(self.columns[c])
+
+    def __equality_ids__(self, c, v, ids):
+        """
+        :return: The candidate row ids whose value of column c equals v. All rows if ids is None.
+        """
+        col = self.columns[c]
+        if c in self.dictionary_codes:
+            # Compare codes. A value that is not in the dictionary matches nothing.
+            try:
+                v = self.dictionary_codes[c].get(v)
+            except TypeError:
+                return []
+            if v is None:
+                return []
+        if c not in self.nulls:
+            if ids is None:
+                return [i for i, x in enumerate(col) if x == v]
+            return [i for i in ids if col[i] == v]
+        # Compare the numbers in the array. None only matches nulls, and anything else that is not a number
+        # matches nothing.
+        nulls = self.nulls[c]
+        if v is None:
+            if ids is None:
+                return [i for i, n in enumerate(nulls) if n]
+            return [i for i in ids if nulls[i]]
+        if not isinstance(v, (int, float)) or isinstance(v, bool):
+            return []
+        if ids is None:
+            return [i for i, x in enumerate(col) if x == v and not nulls[i]]
+        return [i for i in ids if col[i] == v and not nulls[i]]
+
+    def find_ids(self, t):
+        """
+        Evaluates an equality template one column at a time, without materializing any rows.
+        :param t: Template mapping column names to values, as the table holds them.
+        :return: List of matching row ids, in row id order.
+        """
+        ids = None
+        for c, v in t.items():
+            if c not in self.columns:
+                raise KeyError(c)
+            ids = self.__equality_ids__(c, v, ids)
+            if not ids:
+                break
+
+        if ids is None:
+            ids = list(range(self.n_rows))
+        return ids
+
+    def filter_ids(self, p, ids=None):
+        """
+        Evaluates a predicate on one column, without materializing any rows.
+        :param p: A CSVPredicate.Predicate.
+        :param ids: Candidate row ids. All rows if None.
+        :return: List of the candidate row ids that satisfy the predicate, in the order of the candidates.
+        """
+        c = p.column
+        if c not in self.columns:
+            raise KeyError(c)
+        if p.is_equality():
+            # Same comparisons as find_ids, without a call per row.
+            return self.__equality_ids__(c, p.equality_value(), range(self.n_rows) if ids is None else ids)
+        col = self.columns[c]
+        if ids is None:
+            ids = range(self.n_rows)
+        if c in self.nulls and p.numeric and p.is_range():
+            # Compare the numbers in the array with the bounds directly. Nulls never satisfy a range.
+            nulls = self.nulls[c]
+            low, low_inclusive, high, high_inclusive = p.bounds()
+            low = -math.inf if low is None else low
+            high = math.inf if high is None else high
+            if low_inclusive and high_inclusive:
+                return [i for i in ids if low <= col[i] <= high and not nulls[i]]
+            if low_inclusive:
+                return [i for i in ids if low <= col[i] < high and not nulls[i]]
+            if high_inclusive:
+                return [i for i in ids if low < col[i] <= high and not nulls[i]]
+            return [i for i in ids if low < col[i] < high and not nulls[i]]
+        if c in self.nulls:
+            # Non-null values are numbers already, nulls are None.
+            nulls = self.nulls[c]
+            null_matches = p.matches(None)
+            return [i for i in ids if (null_matches if nulls[i] else p.matches(col[i]))]
+        if c in self.dictionaries:
+            # Evaluate the predicate once per distinct value. A scan filters its row ids in batches with the same
+            # predicate, so the codes that satisfy the last predicate are kept.
+            dictionary = self.dictionaries[c]
+            last = self.__matching_codes__
+            if last is not None and last[0] is p and last[1] == len(dictionary):
+                codes = last[2]
+            else:
+                codes = {code for code, v in enumerate(dictionary) if p.matches(v)}
+                self.__matching_codes__ = (p, len(dictionary), codes)
+            return [i for i in ids if col[i] in codes]
+        return [i for i in ids if p.matches(col[i])]
+
+    def memory_size(self):
+        """
+        :return: Estimated number of bytes held by the columns. Exact for array columns, sampled for list columns
+            and dictionaries.
+        """
+        result = sys.getsizeof(self)
+        for c, col in self.columns.items():
+            result += sys.getsizeof(col)
+            if c in self.nulls:
+                result += sys.getsizeof(self.nulls[c])
+            elif c in self.dictionaries:
+                dictionary = self.dictionaries[c]
+                result += sys.getsizeof(dictionary) + sys.getsizeof(self.dictionary_codes[c]) + \
+                    sampled_size(dictionary, len(dictionary))
+            else:
+                result += sampled_size(col, len(col))
+        return result
+
+    def extend(self, other):
+        """
+        Appends the rows of another store with the same columns, e.g. a chunk parsed by a worker process.
+        :param other: A ColumnStore.
+        :return: None
+        """
+        for c in self.column_names:
+            if c in self.nulls and c in other.nulls:
+                self.columns[c].extend(other.columns[c])
+                self.nulls[c].extend(other.nulls[c])
+            elif c in self.dictionary_codes:
+                for v in other.values(c):
+                    self.__append_value__(c, v)
+            else:
+                if c in self.nulls:
+                    self.__demote__(c)
+                self.columns[c].extend(other.values(c))
+        self.n_rows += other.n_rows
@@ -1,47 +1,412 @@
 import csv  # Python package for reading and writing CSV files.
 import DataTableExceptions
 import CSVCatalog
+import CSVStorage
+import CSVPredicate
+import CSVIndex
+import CSVStatistics
+import CSVOperators
+import CSVResultCache
 
 
 import json
+import itertools
+import operator
+import os
+import pickle
+import io
+import locale
+import concurrent.futures
+import contextlib
+import math
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks, e.g. on Windows, only one table instance of a CSV file may write to it at a time.
+    fcntl = None
 
 max_rows_to_print = 10
 
+# "row" holds every row as its own dictionary. "column" holds one array per column, see CSVStorage.ColumnStore.
+storage_modes = ("row", "column")
+
+# Join methods join() can be told to use. None lets join() choose.
+join_methods = ("nested_loop", "index", "hash", "merge", "grace")
+
+# Bytes the hash table of a join may hold before the join spills its inputs to disk, see
+# CSVOperators.GraceHashJoin, and the directory spill files go to. None is the system's temporary directory. The
+# budget does not cover the tables' rows, which are in memory anyway, nor the list join() returns.
+join_memory_budget = 64 * 1024 * 1024
+spill_dir = None
+
+# refresh() compares this many bytes before the end of the parsed part of a CSV file to tell appended files from
+# rewritten ones.
+refresh_check_size = 256
+
+# insert(), update() and delete() append the operations to a log next to the CSV file with this suffix before
+# applying them, and tables replay the log after loading the CSV file. Once the log holds this many bytes, it is
+# compacted into the CSV file in the background, see compact(). Table instances of the same CSV file take a lock on
+# a file with the lock suffix next to the log before writing to the log or compacting it.
+log_suffix = ".log"
+lock_suffix = ".lock"
+compact_log_size = 1024 * 1024
+
+# Snapshots of loaded rows and built indexes are saved next to the CSV file with this suffix.
+# Bump the version whenever the pickled layout of rows or indexes changes.
+snapshot_suffix = ".snapshot"
+snapshot_version = 5
+
+# Cost model used to choose access paths and join methods. Costs are in units of one row visited by a scan, and
+# reflect this implementation: an index probe goes through a dictionary lookup and a call per row, so it costs
+# as much as scanning a few dozen rows.
+scan_row_cost = 1.0
+index_lookup_cost = 50.0
+index_row_cost = 0.2
+hash_row_cost = 2.0
+sort_row_cost = 0.02
+# A BITMAP index lookup also pays for a pass over a bitmap with one bit per table row.
+bitmap_row_cost = 0.01
+# A hash join that spills writes and reads back every input row, and its hash table takes about this many bytes
+# per build row.
+spill_row_cost = 1.0
+hash_entry_bytes = 200
+
+
+def page_bounds(limit=None, offset=None):
+    """
+    :param limit: Max number of rows to return, or None for all rows.
+    :param offset: Number of matching rows to skip, or None.
+    :return: (start, stop) positions of the requested rows in the full result. stop is None if there is no limit.
+    """
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError("Invalid limit.")
+    if offset is not None and (not isinstance(offset, int) or offset < 0):
+        raise ValueError("Invalid offset.")
+    start = offset if offset is not None else 0
+    stop = start + limit if limit is not None else None
+    return start, stop
+
+
+def query_columns(where_template=None, fields=None, on_fields=None):
+    """
+    Infers the columns a select or join needs, to open its tables with CSVTable(t_name, columns=...).
+    :param where_template: Select template.
+    :param fields: Project fields. None means every column.
+    :param on_fields: Join columns.
+    :return: List of column names, or None if every column is needed.
+    """
+    if fields is None:
+        return None
+    result = list(fields)
+    for c in list(where_template.keys() if where_template is not None else []) + list(on_fields or []):
+        if c not in result:
+            result.append(c)
+    return result
+
+
+def parse_numbers(values, number_columns):
+    """
+    Converts the values of the "number" columns of a line of a CSV file in place, see CSVPredicate.parse_number.
+    :param values: Values of the loaded columns of the line.
+    :param number_columns: List of (position in values, column name, not_null) of the loaded "number" columns.
+    :return: values
+    """
+    for k, c, not_null in number_columns:
+        try:
+            v = CSVPredicate.parse_number(values[k])
+        except ValueError:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_column_definition,
+                message="Value '{}' of number column {} is not a number".format(values[k], c))
+        if v is None and not_null:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_column_definition,
+                message="Empty value in not null column " + c)
+        values[k] = v
+    return values
+
+
+def load_csv_chunk(file_name, start, end, column_names, positions, column_definitions=None, number_columns=None):
+    """
+    Parses the lines of a CSV file between two byte offsets. Runs in a worker process of a parallel load.
+    :param file_name: CSV file.
+    :param start: Offset of the first byte of the chunk. Must be the start of a line.
+    :param end: Offset just past the last byte of the chunk. Must be the start of a line or the end of the file.
+    :param column_names: Names of the columns to keep.
+    :param positions: Position of each of these columns in a line of the file.
+    :param column_definitions: Column JSON objects for "column" storage. If None, rows are returned as dictionaries.
+    :param number_columns: The "number" columns to convert, see parse_numbers.
+    :return: List of row dictionaries, or a CSVStorage.ColumnStore holding the rows of the chunk.
+    """
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return parse_csv_bytes(data, column_names, positions, column_definitions, number_columns)
+
+
+def parse_csv_bytes(data, column_names, positions, column_definitions=None, number_columns=None):
+    """
+    Parses complete lines of a CSV file, see load_csv_chunk for the other parameters.
+    :param data: Bytes read from the file.
+    :return: List of row dictionaries, or a CSVStorage.ColumnStore holding the rows.
+    """
+    # Decode like open() in __load__ does.
+    text = io.StringIO(data.decode(locale.getpreferredencoding(False)), newline="")
+    reader = csv.reader(text, delimiter=",", quotechar='"')
+
+    number_columns = number_columns or []
+    if column_definitions is not None:
+        result = CSVStorage.ColumnStore(column_definitions)
+        for r in reader:
+            if r:
+                result.append_values(parse_numbers([r[p] if p < len(r) else None for p in positions],
+                                                   number_columns))
+    else:
+        result = []
+        for r in reader:
+            if r:
+                values = parse_numbers([r[p] if p < len(r) else None for p in positions], number_columns)
+                result.append(dict(zip(column_names, values)))
+    return result
+
+
+def log_value(o):
+    """
+    Converts values of a write that JSON cannot hold when the write is logged, see json.dumps.
+    :param o: A value of the write, e.g. the set of operands of an "in" predicate.
+    :return: The value as a list.
+    """
+    if isinstance(o, (set, frozenset)):
+        # "in" does not depend on the order of its operands; sorting them keeps the log reproducible.
+        return sorted(o, key=lambda v: (type(v).__name__, v))
+    raise TypeError("Value of type {} cannot be logged".format(type(o).__name__))
+
+
+def parse_log(data):
+    """
+    :param data: Bytes of the log of writes, see CSVTable.insert().
+    :return: List of the logged entries. A line that was not fully written is skipped.
+    """
+    entries = []
+    for line in data.split(b"\n"):
+        try:
+            entries.append(json.loads(line.decode("utf-8")))
+        except ValueError:
+            pass
+    return entries
+
 
 class CSVTable:
-    # Table engine needs to load table definition information.
-    __catalog__ = CSVCatalog.CSVCatalog()
+    # Table engine needs to load table definition information. The catalog is created on first use, so importing
+    # this module does not connect to the catalog database.
+    __catalog__ = None
 
-    def __init__(self, t_name, load=True, rows=None, description=None):
+    @classmethod
+    def __get_catalog__(cls):
+        if cls.__catalog__ is None:
+            cls.__catalog__ = CSVCatalog.CSVCatalog()
+        return cls.__catalog__
+
+    def __init__(self, t_name, load=True, rows=None, description=None, storage="row", snapshot=True,
+                 load_workers=1, columns=None, result_cache=None, join_memory_budget=None, spill_dir=None):
         """
         Constructor.
         :param t_name: Name for table.
         :param load: Load data from a CSV file. If load=False, this is a derived table and engine will
             add rows instead of loading from file.
+        :param storage: One of storage_modes. Only applies to tables loaded from a file.
+        :param snapshot: Load rows and indexes from a valid binary snapshot instead of parsing the CSV file,
+            and save a snapshot after parsing it.
+        :param load_workers: Number of processes that parse the CSV file. See __load_parallel__.
+        :param columns: Columns a query needs, e.g. from query_columns(). Only these catalogued columns are
+            parsed and held, and only indexes on them are built. Names that are not columns of this table are
+            ignored, so the same list can open every table of a join. All columns if None. Tables opened with
+            a column list do not use snapshots.
+        :param result_cache: A CSVResultCache.ResultCache that keeps the results of find_by_template() and join()
+            on this table. No caching if None.
+        :param join_memory_budget: Bytes the hash table of a join with this table on the left may hold before
+            it spills to disk. The module's join_memory_budget if None.
+        :param spill_dir: Directory the spill files of these joins go to. The module's spill_dir if None.
         """
+        if storage not in storage_modes:
+            raise ValueError("Invalid storage mode.")
 
         self.__table_name__ = t_name
+        self.__storage__ = storage
+        self.__statistics__ = None
+        self.__load_columns__ = None
+        # Distinct values of the text columns whose values are shared between the rows of a row storage table.
+        self.__shared_values__ = {}
+        self.result_cache = None
+        self.join_memory_budget = join_memory_budget
+        self.spill_dir = spill_dir
+        # What the rows were loaded from, see __result_signature__. Bump __data_version__ when rows are changed
+        # in place.
+        self.__load_signature__ = None
+        self.__data_version__ = 0
+        # Byte offset of the end of the parsed part of the CSV file and the bytes before it, see refresh.
+        self.__parsed_offset__ = None
+        self.__parsed_tail__ = None
+        # Row ids of the deleted rows, which stay in __rows__ but not in the indexes, of the rows that have no line
+        # in the CSV file, i.e. were inserted or were deleted when the file was last compacted, and of the rows
+        # updated since then. See compact().
+        self.__deleted__ = set()
+        self.__lineless__ = set()
+        self.__updated__ = set()
+        self.__log_size__ = 0
+        self.__write_lock__ = threading.RLock()
+        self.__compactor__ = None
 
         # Holds loaded metadata from the catalog. You have to implement  the called methods below.
         self.__description__ = None
         if load:
             self.__file_name__ = "../data/{}.csv".format(self.__table_name__)
-            self.__load_info__()  # Load metadata
-            self.__rows__ = []
-            self.__load__()  # Load rows from the CSV file.
-
-            # Build indexes defined in the metadata. We do not implement insert(), update() or delete().
-            # So we can build indexes on load.
-            self.__build_indexes__()
+            self.result_cache = result_cache
+            self.__load_options__ = (snapshot, load_workers, columns)
+            self.__load_table__()
         else:
             self.__file_name__ = "DERIVED"
-            if rows: self.__rows__ = rows; 
+            self.__storage__ = "row"
+            self.__rows__ = rows if rows is not None else []
             self.idxs = {}
             self.__description__ = description
             if self.__description__ is not None:
                 self.__build_indexes__
             #self.__build_indexes__()
 
+    def __load_table__(self):
+        """
+        Loads the metadata, rows and indexes of the table, with the options given to the constructor.
+        :return: None
+        """
+        snapshot, load_workers, columns = self.__load_options__
+        self.__load_info__()  # Load metadata
+        self.__load_columns__ = None
+        self.__deleted__, self.__lineless__, self.__updated__ = set(), set(), set()
+        # Writes in the log may read any column, so a table with a log loads all of them.
+        if columns is not None and not os.path.exists(self.__get_log_file_name__()):
+            self.__load_columns__ = [c for c in self.__get_column_names__() if c in columns]
+            snapshot = False
+        self.__load_signature__ = self.__get_load_signature__()
+        if not (snapshot and self.__load_snapshot__()):
+            # Take the snapshot header before parsing, so a file that changes during the load is not
+            # mistaken for the one that was parsed.
+            header = self.__snapshot_header__() if snapshot else None
+            self.__shared_values__ = {}
+            self.__rows__ = self.__new_row_store__()
+            self.__load__(load_workers)  # Load rows from the CSV file.
+            self.__encode_text_columns__()
+
+            # Build indexes defined in the metadata. Rows appended to the file later, see refresh(), and rows
+            # written by insert(), update() and delete() are added to them incrementally.
+            self.__build_indexes__()
+            if header is not None:
+                self.__save_snapshot__(header)
+        self.__record_parsed_offset__()
+        self.__replay_log__()
+
+    def __record_parsed_offset__(self):
+        """
+        Records how far the CSV file has been parsed after a load: the whole file, if it did not change while it
+        was loaded. Otherwise the offset is unknown and the next refresh() loads the table again.
+        :return: None
+        """
+        self.__parsed_offset__, self.__parsed_tail__ = None, None
+        if self.__load_signature__ is None or self.__get_load_signature__() != self.__load_signature__:
+            return
+        offset = self.__load_signature__[0]
+        try:
+            with open(self.__get_file_name__(), "rb") as f:
+                f.seek(max(offset - refresh_check_size, 0))
+                self.__parsed_tail__ = f.read(offset - f.tell())
+        except OSError:
+            return
+        self.__parsed_offset__ = offset
+
+    def refresh(self):
+        """
+        Brings the table up to date with its CSV file. If lines were appended to the file since it was loaded or
+        last refreshed, which is told by its size and modification time, only the new lines are parsed: their
+        rows are appended to the table and added to every index. If the file was rewritten instead, i.e. it did
+        not grow or the bytes before the parsed offset changed, or the table definition changed in the catalog,
+        the table is loaded again. A last line that is still being written, i.e. does not end with a newline, is
+        left for a later refresh.
+        :return: "unchanged", "appended" or "reloaded".
+        """
+        if self.__file_name__ == "DERIVED":
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_file,
+                message="Derived table " + self.__table_name__ + " has no file to refresh")
+        fn = self.__get_file_name__()
+        signature = self.__get_load_signature__()
+        if signature is None:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_file,
+                message="Could not read file = " + fn)
+        if signature == self.__load_signature__:
+            return "unchanged"
+
+        offset, tail = self.__parsed_offset__, self.__parsed_tail__
+        appended = self.__load_signature__ is not None and signature[2:] == self.__load_signature__[2:] and \
+            offset is not None and signature[0] > offset and tail.endswith(b"\n")
+        if appended:
+            try:
+                with open(fn, "rb") as f:
+                    header = next(csv.reader([f.readline().decode(locale.getpreferredencoding(False))],
+                                             delimiter=",", quotechar='"'))
+                    f.seek(offset - len(tail))
+                    appended = f.read(len(tail)) == tail
+                    data = f.read(signature[0] - offset)
+            except (IOError, StopIteration):
+                appended = False
+        if not appended:
+            self.__statistics__ = None
+            self.__load_table__()
+            return "reloaded"
+
+        # Parse the complete lines only, and take the new rows before changing anything.
+        end = data.rfind(b"\n") + 1
+        if end > 0:
+            column_definitions = self.__get_column_definitions__() if self.__is_columnar__() else None
+            rows = parse_csv_bytes(data[:end], self.__get_column_names__(),
+                                   self.__get_column_positions__(header, fn), column_definitions,
+                                   self.__get_number_columns__())
+            start = len(self.__rows__)
+            if self.__is_columnar__():
+                self.__rows__.extend(rows)
+            else:
+                CSVStorage.extend_shared_values(rows, self.__shared_values__)
+                self.__rows__ += rows
+            for idx_name, index in self.idxs.items():
+                self.__extend_index__(idx_name, index, start)
+            self.__parsed_offset__ = offset + end
+            self.__parsed_tail__ = (tail + data[:end])[-refresh_check_size:]
+        self.__load_signature__ = signature
+        return "appended" if end > 0 else "unchanged"
+
+    def __extend_index__(self, idx_name, index, start):
+        """
+        Adds the rows from row id start on to an index built on the rows before them.
+        :param idx_name: Index name.
+        :param index: The CSVIndex index.
+        :param start: Row id of the first new row.
+        :return: None
+        """
+        definition = self.__description__["indexes"][idx_name]
+        columns = definition["columns"]
+        if self.__is_columnar__():
+            rows = self.__rows__.get_rows(range(start, len(self.__rows__)), columns)
+        else:
+            rows = self.__rows__[start:]
+        # the column value for a single column index, the tuple of the column values otherwise
+        index.extend(list(map(operator.itemgetter(*columns), rows)), start)
+        if index.covered is not None:
+            for r in rows:
+                index.covered.append(r)
+
     def table_from_rows(self, t_name, rows):
         """
         construct table t_name from given rows 
@@ -53,9 +418,88 @@ class CSVTable:
         Loads metadata from catalog and sets __description__ to hold the information.
         :return:
         """
-        table = self.__catalog__.get_table(self.__table_name__)
+        table = self.__get_catalog__().get_table(self.__table_name__)
+        self.__table_definition__ = table
         self.__description__ = table.describe_table()
 
+    def __get_load_signature__(self):
+        """
+        :return: Size and modification time of the CSV file, version of the catalog definition and the loaded
+            columns, or None if the file cannot be read. Taken before loading, so a file that changes during the
+            load is not mistaken for the one that was loaded.
+        """
+        try:
+            st = os.stat(self.__get_file_name__())
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns, CSVCatalog.definition_versions.get(self.__table_name__, 0),
+                None if self.__load_columns__ is None else tuple(self.__load_columns__))
+
+    def __result_signature__(self):
+        """
+        :return: Signature of the data query results of this table are computed from. Results cached for one
+            signature are not served for another. None if the results cannot be cached, e.g. for derived tables.
+        """
+        if self.__load_signature__ is None:
+            return None
+        return self.__load_signature__, len(self.__rows__), self.__data_version__
+
+    def __new_row_store__(self):
+        """
+        :return: An empty container for the rows of this table, depending on the storage mode.
+        """
+        if self.__storage__ == "column":
+            return CSVStorage.ColumnStore(self.__get_column_definitions__())
+        return []
+
+    def __is_columnar__(self):
+        return isinstance(self.__rows__, CSVStorage.ColumnStore)
+
+    def __column_values__(self, c):
+        """
+        :param c: Column name.
+        :return: Iterator over the values of column c in row id order, without materializing rows.
+        """
+        if self.__is_columnar__():
+            return self.__rows__.values(c)
+        return (r[c] for r in self.__rows__)
+
+    def __live_ids__(self):
+        """
+        :return: Row ids of the rows that have not been deleted, in row id order.
+        """
+        if not self.__deleted__:
+            return range(len(self.__rows__))
+        deleted = self.__deleted__
+        return [i for i in range(len(self.__rows__)) if i not in deleted]
+
+    def __row_count__(self):
+        """
+        :return: Number of rows that have not been deleted.
+        """
+        return len(self.__rows__) - len(self.__deleted__)
+
+    def __get_value__(self, i, c):
+        """
+        :param i: Row id.
+        :param c: Column name.
+        :return: Value of column c in row i, without materializing the row.
+        """
+        if self.__is_columnar__():
+            return self.__rows__.get_value(i, c)
+        return self.__rows__[i][c]
+
+    def __get_row_fetcher__(self, fields):
+        """
+        :param fields: Columns the caller reads.
+        :return: Function from a row id to a dictionary holding at least these columns of the row. Row storage
+            returns the stored row itself, column storage only materializes the requested columns.
+        """
+        if self.__is_columnar__():
+            rows = self.__rows__
+            return lambda i: rows.get_row(i, fields)
+        return self.__rows__.__getitem__
+
     def get_description(self):
         return self.__description__
 
@@ -72,7 +516,10 @@ class CSVTable:
         return self.__file_name__
 
     # Load from a file and creates the table and data.
-    def __load__(self):
+    def __load__(self, workers=1):
+
+        if workers > 1:
+            return self.__load_parallel__(workers)
 
         try:
             fn = self.__get_file_name__()
@@ -80,29 +527,215 @@ class CSVTable:
                 # CSV files can be pretty complex. You can tell from all of the options on the various readers.
                 # The two params here indicate that "," separates columns and anything in between " ... " should parse
                 # as a single string, even if it has things like "," in it.
-                reader = csv.DictReader(csvfile, delimiter=",", quotechar='"')
+                reader = csv.reader(csvfile, delimiter=",", quotechar='"')
+                header = next(reader, None)
+                if header is None:
+                    return
 
-                # Get the names of the columns defined for this table from the metadata.
+                # Only add the loaded columns into the in-memory table. The CSV file may contain columns
+                # that are not relevant to the definition, so values are taken by position without building a
+                # dictionary of the whole line.
                 column_names = self.__get_column_names__()
+                positions = self.__get_column_positions__(header, fn)
+                number_columns = self.__get_number_columns__()
+                columnar = self.__is_columnar__()
 
-                # Loop through each line (well dictionary) in the input file.
                 for r in reader:
-                    # Only add the defined columns into the in-memory table. The CSV file may contain columns
-                    # that are not relevant to the definition.
-                    projected_r = self.project([r], column_names)[0]
-                    self.__add_row__(projected_r)
+                    if not r:
+                        continue
+                    values = [r[p] if p < len(r) else None for p in positions]
+                    if number_columns:
+                        parse_numbers(values, number_columns)
+                    if columnar:
+                        self.__rows__.append_values(values)
+                    else:
+                        self.__add_row__(dict(zip(column_names, values)))
 
         except IOError as e:
             raise DataTableExceptions.DataTableException(
                 code=DataTableExceptions.DataTableException.invalid_file,
                 message="Could not read file = " + fn)
 
+    def __get_snapshot_file_name__(self):
+        # One snapshot per storage mode, since their rows are pickled differently.
+        return self.__get_file_name__() + "." + self.__storage__ + snapshot_suffix
+
+    def __snapshot_header__(self):
+        """
+        Describes what a snapshot must have been built from to be valid: the size and modification time of the
+        CSV file, the table definition from the catalog and the storage mode.
+        :return: Header dictionary, or None if the CSV file cannot be read.
+        """
+        try:
+            st = os.stat(self.__get_file_name__())
+        except OSError:
+            return None
+        return {
+            "version": snapshot_version,
+            "csv_size": st.st_size,
+            "csv_mtime": st.st_mtime_ns,
+            "description": json.dumps(self.__description__, sort_keys=True),
+            "storage": self.__storage__
+        }
+
+    def __load_snapshot__(self):
+        """
+        Bulk loads rows and indexes from the snapshot file if it matches the current CSV file and definition.
+        :return: True if the snapshot was loaded.
+        """
+        header = self.__snapshot_header__()
+        if header is None:
+            return False
+        try:
+            with open(self.__get_snapshot_file_name__(), "rb") as f:
+                # The header is pickled separately so a stale snapshot is rejected without reading the data.
+                if pickle.load(f) != header:
+                    return False
+                rows, idxs, shared_values = pickle.load(f)
+        except Exception:
+            # Missing, truncated or unreadable snapshot. Parse the CSV file instead.
+            return False
+        self.__rows__ = rows
+        self.idxs = idxs
+        self.__shared_values__ = shared_values
+        return True
+
+    def __save_snapshot__(self, header):
+        """
+        Saves the loaded rows and built indexes. The snapshot is written to a temporary file and then moved into
+        place, so a reader never sees a partial snapshot. Failing to write a snapshot is not an error.
+        :param header: Snapshot header taken before the CSV file was parsed.
+        :return: None
+        """
+        fn = self.__get_snapshot_file_name__()
+        tmp_fn = fn + ".tmp"
+        try:
+            with open(tmp_fn, "wb") as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump((self.__rows__, self.idxs, self.__shared_values__), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_fn, fn)
+        except OSError:
+            try:
+                os.remove(tmp_fn)
+            except OSError:
+                pass
+
+    def __load_parallel__(self, workers):
+        """
+        Splits the CSV file into one chunk per worker at line boundaries and parses the chunks in a process pool.
+        Workers only keep the loaded columns. Chunks are appended in file order, so row ids are the same as
+        for a serial load. Quoted values must not contain line breaks, since chunks are split at any newline.
+        :param workers: Number of worker processes.
+        :return: None
+        """
+        fn = self.__get_file_name__()
+        column_names = self.__get_column_names__()
+        try:
+            with open(fn, "rb") as f:
+                header = next(csv.reader([f.readline().decode(locale.getpreferredencoding(False))],
+                                         delimiter=",", quotechar='"'))
+                data_start = f.tell()
+                size = os.fstat(f.fileno()).st_size
+
+                # Move each split point forward to the start of the next line.
+                bounds = [data_start]
+                for k in range(1, workers):
+                    f.seek(max(data_start + (size - data_start) * k // workers, bounds[-1]))
+                    f.readline()
+                    if f.tell() > bounds[-1] and f.tell() < size:
+                        bounds.append(f.tell())
+                bounds.append(size)
+        except (IOError, StopIteration) as e:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_file,
+                message="Could not read file = " + fn)
+
+        positions = self.__get_column_positions__(header, fn)
+
+        column_definitions = self.__get_column_definitions__() if self.__is_columnar__() else None
+        n = len(bounds) - 1
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, n)) as executor:
+            # map returns the results in the order of the chunks
+            chunks = executor.map(load_csv_chunk, [fn] * n, bounds[:-1], bounds[1:], [column_names] * n,
+                                  [positions] * n, [column_definitions] * n, [self.__get_number_columns__()] * n)
+            for chunk in chunks:
+                if self.__is_columnar__():
+                    self.__rows__.extend(chunk)
+                else:
+                    self.__rows__ += chunk
+
+    def __get_column_definitions__(self):
+        """
+        :return: Column JSON objects of the loaded columns, in catalog order.
+        """
+        columns = self.__description__["columns"]
+        if self.__load_columns__ is not None:
+            columns = [col for col in columns if col["column_name"] in self.__load_columns__]
+        return columns
+
     def __get_column_names__(self):
-        return [col["column_name"] for col in self.__description__["columns"]]
+        return [col["column_name"] for col in self.__get_column_definitions__()]
+
+    def __encode_text_columns__(self):
+        """
+        Dictionary encodes the loaded text columns with few distinct values, see CSVStorage.dictionary_max_ratio.
+        Column storage holds their values as codes into one list of distinct values, row storage shares one string
+        object per distinct value between the rows.
+        :return: None
+        """
+        if self.__is_columnar__():
+            self.__rows__.encode_dictionaries()
+            return
+        text_columns = [col["column_name"] for col in self.__get_column_definitions__()
+                        if col["column_type"] != "number"]
+        self.__shared_values__ = CSVStorage.share_row_values(self.__rows__, text_columns)
+
+    def __get_number_columns__(self):
+        """
+        :return: (position, column name, not_null) of each loaded "number" column, see parse_numbers.
+        """
+        return [(k, col["column_name"], bool(col["not_null"]))
+                for k, col in enumerate(self.__get_column_definitions__()) if col["column_type"] == "number"]
+
+    def __get_column_positions__(self, header, fn):
+        """
+        :param header: Column names from the first line of the CSV file.
+        :param fn: File name, for the error message.
+        :return: Position of each loaded column in a line of the file.
+        """
+        try:
+            return [header.index(c) for c in self.__get_column_names__()]
+        except ValueError as e:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.invalid_column_definition,
+                message="Column definition does not match the header of file = " + fn)
 
     def get_row_list(self):
+        if self.__deleted__:
+            return [self.__rows__[i] for i in self.__live_ids__()]
+        if self.__is_columnar__():
+            # API boundary, materialize the rows.
+            return list(self.__rows__)
         return self.__rows__
 
+    def memory_size(self):
+        """
+        :return: Estimated number of bytes held by the rows and indexes of the table, from a sample of them.
+        """
+        if self.__is_columnar__():
+            result = self.__rows__.memory_size()
+        else:
+            shared = self.__shared_values__
+            result = sys.getsizeof(self.__rows__) + CSVStorage.sampled_size(
+                self.__rows__, len(self.__rows__),
+                lambda r: sys.getsizeof(r) + sum(sys.getsizeof(v) for c, v in r.items() if c not in shared))
+            for values in shared.values():
+                result += CSVStorage.sampled_size(values, len(values))
+        for index in self.idxs.values():
+            result += index.memory_size()
+        return result
+
     def __str__(self):
         """
         You can do something simple here. The details of the string returned depend on what properties you
@@ -110,82 +743,355 @@ class CSVTable:
         :return:
         """
         s = "Name: " + self.__table_name__  + "\nFile: " + self.__get_file_name__() + \
-            "\nRow count: " + str(len(self.__rows__)) + "\n" + json.dumps(self.__description__, indent=2) + \
+            "\nRow count: " + str(self.__row_count__()) + "\n" + json.dumps(self.__description__, indent=2) + \
             "\nSample rows:" 
-        if len(self.__rows__) >= max_rows_to_print:
-            for i in range(int(max_rows_to_print/2)):
+        ids = self.__live_ids__()
+        if len(ids) >= max_rows_to_print:
+            for i in ids[:int(max_rows_to_print/2)]:
                 s += "\n" + str(self.__rows__[i])
             s += "\n..."
-            for i in range(-1*int(max_rows_to_print/2),0):
+            for i in ids[-1*int(max_rows_to_print/2):]:
                 s += "\n" + str(self.__rows__[i])
         else:
-            for i in range(len(self.__rows__)):
+            for i in ids:
                 s += "\n" + str(self.__rows__[i])
         return s + "\n"
 
-    def __build_index__(self, columns):
+    def __build_index__(self, columns, kind="INDEX", include=None):
         """
         build an index for a given set of coumns 
+        :param include: Columns the index carries besides its key columns, see CSVIndex.HashIndex.covered.
         """
-        idx_dict = {}
-        for i,row in enumerate(self.__rows__):
-            # generate index name
-            col_vals = [str(row[c]) for c in columns]
-            key = '_'.join(col_vals)
-            if key in idx_dict: idx_dict[key].append(i);
-            else: idx_dict[key] = [i]; 
+        if kind == "ORDERED":
+            idx_dict = CSVIndex.OrderedIndex(len(columns), numeric=self.__is_number_column__(columns[0]))
+            idx_dict.build_order(self.__column_values__(columns[0]))
+        elif kind == "BITMAP":
+            idx_dict = CSVIndex.BitmapIndex(len(columns))
+        else:
+            idx_dict = CSVIndex.HashIndex(len(columns))
+        # keys are the column values themselves, or tuples of them for a composite index
+        if len(columns) == 1 and self.__is_columnar__() and self.__rows__.is_dictionary_column(columns[0]):
+            idx_dict.build_groups(*self.__rows__.dictionary_groups(columns[0]))
+        elif len(columns) == 1:
+            idx_dict.build(self.__column_values__(columns[0]))
+        else:
+            idx_dict.build(zip(*[self.__column_values__(c) for c in columns]))
+        if include and not self.__is_columnar__():
+            # Column storage reads the columns a query needs from the table itself, see __index_only_source__.
+            covered = list(columns) + list(include)
+            idx_dict.covered = CSVStorage.ColumnStore([col for col in self.__get_column_definitions__()
+                                                      if col["column_name"] in covered])
+            for r in self.__rows__:
+                idx_dict.covered.append(r)
+            idx_dict.covered.encode_dictionaries()
         return idx_dict
 
     def __build_indexes__(self):
         indexes = self.__description__["indexes"]
         self.idxs = {} # dict mapping index name to the implemented indexes
+        loaded = self.__get_column_names__()
         for idx in list(indexes.keys()):
-            index = self.__build_index__(indexes[idx]["columns"])
+            # indexes on columns that were not loaded are skipped
+            if not all([c in loaded for c in indexes[idx]["columns"]]):
+                continue
+            # included columns that were not loaded are left out
+            include = [c for c in indexes[idx].get("include", []) if c in loaded]
+            index = self.__build_index__(indexes[idx]["columns"], indexes[idx]["kind"], include)
             self.idxs[idx] = index 
 
     def __get_access_path__(self, tmp):
         """
         Returns best index matching the set of keys in the template.
-        Best is defined as the most selective index, i.e. the one with the most distinct index entries.
-        An index name is of the form "colname1_colname2_coluname3" The index matches if the
-        template references the columns in the index name. The template may have additional columns, but must contain
-        all of the columns in the index definition.
+        Best is defined as the cheapest lookup, see __lookup_cost__, i.e. mostly the most selective index, the
+        one with the most distinct index entries and so the fewest rows per lookup.
+        The index matches if the template references a leftmost prefix of the columns in the index definition,
+        e.g. playerID for an index on (playerID, yearID). The template may have additional columns.
         :param tmp: list of query cols
-        :return: Index or None
+        :return: Index or None, and the expected number of rows per lookup (-1 if there is no index).
         """
         # check each index to see if it's compatible with the template
         most_selective = None
-        max_selectivity = -1
-        for idx_name in list(self.idxs.keys()):
+        min_rows_per_key = -1
+        min_cost = None
+        for idx_name in self.idxs:
             idx_cols = self.__description__["indexes"][idx_name]["columns"]
-            if all([ic in tmp for ic in idx_cols]):
+            k = self.__get_prefix_length__(idx_cols, tmp)
+            if k > 0:
                 # match
-                idx_selectivity = len(self.__rows__) / len(list(self.idxs[idx_name].keys()))
-                if idx_selectivity > max_selectivity:
-                    max_selectivity = idx_selectivity
+                rows_per_key = self.idxs[idx_name].rows_per_key(self.__row_count__(), k)
+                cost = self.__lookup_cost__(idx_name, rows_per_key)
+                if most_selective is None or cost < min_cost:
+                    min_rows_per_key = rows_per_key
                     most_selective = idx_name
-        return most_selective, max_selectivity
+                    min_cost = cost
+        return most_selective, min_rows_per_key
+
+    def __lookup_cost__(self, idx_name, rows):
+        """
+        :param idx_name: Index name.
+        :param rows: Expected number of row ids one lookup returns.
+        :return: Cost of one lookup.
+        """
+        cost = index_lookup_cost + rows * index_row_cost
+        if isinstance(self.idxs[idx_name], CSVIndex.BitmapIndex):
+            cost += len(self.__rows__) * bitmap_row_cost
+        return cost
+
+    def __get_prefix_length__(self, idx_cols, tmp):
+        """
+        :param idx_cols: Columns of an index.
+        :param tmp: Columns with a value.
+        :return: Length of the longest leftmost prefix of idx_cols that only holds columns in tmp.
+        """
+        k = 0
+        while k < len(idx_cols) and idx_cols[k] in tmp:
+            k += 1
+        return k
+
+    def __plan_access__(self, predicates):
+        """
+        Cost based choice between a scan, an index lookup on the equality predicates, an index lookup for a
+        range or "in" predicate (ORDERED index on its column, or single column index for "in"), and the
+        intersection of the row ids several indexes return for different predicates, see __plan_intersection__.
+        Rows an index returns are checked against the predicates it does not answer at the cost of scanning them.
+        :param predicates: List of CSVPredicate.Predicate.
+        :return: (index name, predicate, cost, estimated result rows). The index is None for a scan and the
+            predicate is None for an equality lookup. For an intersection, the index is a list of
+            (index name, column) pairs and the predicate is None.
+        """
+        stats = self.__get_statistics__()
+        n = self.__row_count__()
+        result_rows = stats.estimate_rows(predicates)
+        best = (None, None, n * scan_row_cost, result_rows)
+
+        equalities = [p.column for p in predicates if p.is_equality()]
+        access_index, rows_per_key = self.__get_access_path__(equalities)
+        if access_index is not None:
+            idx_cols = self.__description__["indexes"][access_index]["columns"]
+            k = self.__get_prefix_length__(idx_cols, equalities)
+            cost = self.__lookup_cost__(access_index, rows_per_key)
+            if len(predicates) > k:
+                cost += rows_per_key * scan_row_cost
+            if cost < best[2]:
+                best = (access_index, None, cost, result_rows)
+
+        for p in predicates:
+            if not (p.is_range() or p.is_in()):
+                continue
+            for idx_name in self.idxs:
+                cost = self.__range_lookup_cost__(idx_name, p, stats)
+                if cost is None:
+                    continue
+                if len(predicates) > 1:
+                    cost += stats.estimate_rows([p]) * scan_row_cost
+                if cost < best[2]:
+                    best = (idx_name, p, cost, result_rows)
+
+        paths, cost = self.__plan_intersection__(predicates, stats)
+        if paths is not None and cost < best[2]:
+            best = (paths, None, cost, result_rows)
+        return best
+
+    def __range_lookup_cost__(self, idx_name, p, stats):
+        """
+        :param idx_name: Index name.
+        :param p: Range or "in" predicate.
+        :param stats: CSVStatistics.TableStatistics.
+        :return: Cost of answering p with the index, or None if the index cannot answer p.
+        """
+        index = self.idxs[idx_name]
+        idx_cols = self.__description__["indexes"][idx_name]["columns"]
+        if idx_cols[0] != p.column:
+            return None
+        # A hash index answers "in" by one lookup per value, if its keys and the values have the same type.
+        if not ((isinstance(index, CSVIndex.OrderedIndex) and index.numeric == p.numeric) or
+                (p.is_in() and len(idx_cols) == 1 and p.numeric == self.__is_number_column__(p.column))):
+            return None
+        matched = stats.estimate_rows([p])
+        if isinstance(index, CSVIndex.BitmapIndex):
+            # one union of bitmaps, which yields the row ids in row order
+            return self.__lookup_cost__(idx_name, matched)
+        # row ids come back in index order and are sorted into row order
+        return index_lookup_cost + matched * (index_row_cost + sort_row_cost * math.log2(max(matched, 2)))
+
+    def __plan_intersection__(self, predicates, stats):
+        """
+        Plans answering a template with several indexes, each for a different predicate, and keeping the row ids
+        all of them return. Each predicate's cheapest single column lookup is a candidate. Starting with the most
+        selective one, lookups are added while the rows they remove, assuming independent columns, save more
+        than the lookup costs. Bitmaps are intersected one machine word at a time, so BITMAP indexes on columns
+        with few distinct values that are not selective on their own make good candidates.
+        :param predicates: List of CSVPredicate.Predicate.
+        :param stats: CSVStatistics.TableStatistics.
+        :return: (list of (index name, column) pairs, cost), or (None, None) if fewer than two lookups pay off.
+        """
+        n = self.__row_count__()
+        if n == 0:
+            return None, None
+        lookups = []
+        for p in predicates:
+            best = None
+            for idx_name in self.idxs:
+                idx_cols = self.__description__["indexes"][idx_name]["columns"]
+                if p.is_equality():
+                    if idx_cols[0] != p.column:
+                        continue
+                    matched = self.idxs[idx_name].rows_per_key(n, 1)
+                    cost = self.__lookup_cost__(idx_name, matched)
+                else:
+                    cost = self.__range_lookup_cost__(idx_name, p, stats) if p.is_range() or p.is_in() else None
+                    if cost is None:
+                        continue
+                    matched = stats.estimate_rows([p])
+                if isinstance(self.idxs[idx_name], CSVIndex.BitmapIndex):
+                    # the bitmap is intersected as it is, row ids are only extracted from the result
+                    cost -= matched * index_row_cost
+                if best is None or cost < best[0]:
+                    best = (cost, matched, idx_name, p.column)
+            if best is not None:
+                lookups.append(best)
+        if len(lookups) < 2:
+            return None, None
+
+        lookups.sort(key=lambda l: l[1])
+        cost, candidates, idx_name, column = lookups[0]
+        paths = [(idx_name, column)]
+        for l_cost, matched, idx_name, column in lookups[1:]:
+            new_candidates = candidates * matched / n
+            # every removed row would otherwise be returned and checked against the other predicates
+            if l_cost < (candidates - new_candidates) * (index_row_cost + scan_row_cost):
+                paths.append((idx_name, column))
+                cost += l_cost
+                candidates = new_candidates
+        if len(paths) < 2:
+            return None, None
+
+        if any([isinstance(self.idxs[idx_name], CSVIndex.BitmapIndex) for idx_name, _ in paths]):
+            # row ids are extracted from the intersected bitmap
+            cost += n * bitmap_row_cost
+        cost += candidates * index_row_cost
+        if len(paths) < len(predicates):
+            cost += candidates * scan_row_cost
+        return paths, cost
+
+    def __get_template_access_path__(self, predicates):
+        """
+        Chooses how to evaluate a compiled template, see __plan_access__.
+        :param predicates: List of CSVPredicate.Predicate.
+        :return: (index name, predicate). The predicate is None for an equality lookup. (None, None) means scan.
+            A list of (index name, column) pairs instead of an index name means an index intersection.
+        """
+        access_index, range_predicate, _, _ = self.__plan_access__(predicates)
+        return access_index, range_predicate
+
+    def analyze(self, save=True):
+        """
+        ANALYZE. Collects the row count, and for every column the number of distinct values, the fraction of empty
+        values and an equi-depth histogram, and for every index the number of distinct keys. The cost model uses
+        them to choose access paths and join methods.
+        :param save: Store the statistics in the catalog, so later loads of the table can use them.
+        :return: CSVStatistics.TableStatistics.
+        """
+        n = self.__row_count__()
+        columns = {}
+        for c in self.__get_row_columns__():
+            if self.__deleted__:
+                values = [self.__get_value__(i, c) for i in self.__live_ids__()]
+            else:
+                values = self.__column_values__(c)
+            columns[c] = CSVStatistics.ColumnStatistics.compute(c, values, n, self.__is_number_column__(c))
+        indexes = {idx_name: len(index) for idx_name, index in self.idxs.items()}
+        if self.__load_columns__ is not None and self.__file_name__ != "DERIVED":
+            # Keep the saved statistics of the columns and indexes that were not loaded.
+            saved = self.__table_definition__.load_statistics()
+            if saved is not None:
+                for c, column_statistics in saved.columns.items():
+                    columns.setdefault(c, column_statistics)
+                for idx_name, distinct_count in saved.indexes.items():
+                    indexes.setdefault(idx_name, distinct_count)
+        self.__statistics__ = CSVStatistics.TableStatistics(n, columns, indexes)
+        if save and self.__file_name__ != "DERIVED":
+            self.__table_definition__.save_statistics(self.__statistics__)
+        return self.__statistics__
+
+    def __get_statistics__(self):
+        """
+        :return: Statistics from the last ANALYZE of the table, read from the catalog on first use. If the table
+            has never been analyzed, only the row count and index sizes are known. Row and index key counts are
+            always taken from the loaded table.
+        """
+        if self.__statistics__ is None:
+            stats = None
+            if self.__file_name__ != "DERIVED":
+                stats = self.__table_definition__.load_statistics()
+            if stats is None:
+                stats = CSVStatistics.TableStatistics()
+            self.__statistics__ = stats
+        self.__statistics__.row_count = self.__row_count__()
+        for idx_name, index in self.idxs.items():
+            self.__statistics__.indexes[idx_name] = len(index)
+            # A single column index knows the distinct count of a column that has not been analyzed.
+            idx_cols = self.__description__["indexes"][idx_name]["columns"]
+            if len(idx_cols) == 1 and idx_cols[0] not in self.__statistics__.columns:
+                self.__statistics__.columns[idx_cols[0]] = CSVStatistics.ColumnStatistics(
+                    idx_cols[0], distinct_count=len(index), numeric=self.__is_number_column__(idx_cols[0]))
+        return self.__statistics__
+
+    def __get_column_type__(self, c):
+        """
+        :param c: Column name.
+        :return: The catalog column_type of the column, or None if the table has no such column definition.
+        """
+        if self.__description__ is None:
+            return None
+        for col in self.__description__["columns"]:
+            if col["column_name"] == c:
+                return col["column_type"]
+        return None
+
+    def __is_number_column__(self, c):
+        return self.__get_column_type__(c) == "number"
+
+    def __compile_template__(self, t):
+        """
+        :param t: A template.
+        :return: List of CSVPredicate.Predicate, one per template entry.
+        """
+        if t is None:
+            return []
+        columns = set(self.__get_row_columns__())
+        # A derived table without rows does not know its columns.
+        if columns or self.__description__ is not None:
+            for c in t:
+                if c in columns:
+                    continue
+                if self.__load_columns__ is not None and \
+                        c in [col["column_name"] for col in self.__description__["columns"]]:
+                    raise CSVPredicate.invalid_template(
+                        "Column {} was not loaded, see CSVTable(..., columns=...)".format(c))
+                raise CSVPredicate.invalid_template("Invalid column {} in template".format(c))
+        return [CSVPredicate.Predicate(c, v, self.__is_number_column__(c)) for c, v in t.items()]
+
+    def __matches_predicates__(self, row, predicates):
+        for p in predicates:
+            if not p.matches(row[p.column]):
+                return False
+        return True
 
     def matches_template(self, row, t):
         """
         :param row: A single dictionary representing a row in the table.
-        :param t: A template
-        :return: True if the row matches the template.
+        :param t: A template. Values are either plain values, which must be equal, or dictionaries
+            of CSVPredicate.operators, e.g. {"yearID": {"between": [1990, 2000]}, "H": {">": 200}}.
+        :return: True if the row matches the template. Values are compared like in find_by_template, e.g.
+            {"yearID": "1972"} matches a row whose "number" column yearID holds 1972.
         """
 
         # Basically, this means there is no where clause.
         if t is None:
             return True
 
-        try:
-            c_names = list(t.keys())
-            for n in c_names:
-                if row[n] != t[n]:
-                    return False
-            else:
-                return True
-        except Exception as e:
-            raise (e)
+        return self.__matches_predicates__(row, self.__compile_template__(t))
 
     def project(self, rows, fields):
         """
@@ -212,31 +1118,265 @@ class CSVTable:
             # happens if the requested field not in rows.
             raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
 
+    def __get_rows_by_id__(self, ids, fields=None):
+        """
+        Materializes the rows with the given row ids.
+        :param ids: Row ids.
+        :param fields: The list of fields (project fields)
+        :return: List of rows.
+        """
+        if self.__is_columnar__():
+            try:
+                return self.__rows__.get_rows(ids, fields)
+            except KeyError as ke:
+                raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
+        return self.project([self.__rows__[i] for i in ids], fields)
+
+    def __scan_ids__(self, predicates, ids=None):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param ids: Candidate row ids. All rows if None.
+        :return: List of the candidate row ids whose rows satisfy every predicate.
+        """
+        if self.__is_columnar__():
+            # Evaluate the predicates on the columns. Plain equalities on all rows take the fast path.
+            if ids is None:
+                equalities = {p.column: p.equality_value() for p in predicates if p.is_equality()}
+                ids = self.__rows__.find_ids(equalities)
+                predicates = [p for p in predicates if not p.is_equality()]
+                if self.__deleted__:
+                    ids = [i for i in ids if i not in self.__deleted__]
+            for p in predicates:
+                ids = self.__rows__.filter_ids(p, ids)
+            return list(ids)
+
+        if ids is None and not self.__deleted__:
+            return [i for i, r in enumerate(self.__rows__) if self.__matches_predicates__(r, predicates)]
+        if ids is None:
+            ids = self.__live_ids__()
+        return [i for i in ids if self.__matches_predicates__(self.__rows__[i], predicates)]
+
+    def __lookup_ids__(self, idx, values):
+        """
+        :param idx: Index name.
+        :param values: Dictionary holding a value for a leftmost prefix of the columns of the index.
+        :return: List of the row ids with these values, in row id order.
+        """
+        idx_cols = self.__description__["indexes"][idx]["columns"]
+        k = self.__get_prefix_length__(idx_cols, values)
+        return self.idxs[idx].find([values[c] for c in idx_cols[:k]])
+
+    def __index_candidates__(self, predicates, idx):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Name of an index whose leading columns have an equality predicate, or a list of
+            (index name, column) pairs for an index intersection.
+        :return: The row ids the index returns for the equality predicates, and the predicates the index does
+            not answer.
+        """
+        if isinstance(idx, list):
+            return self.__intersection_candidates__(predicates, idx)
+        idx_cols = self.__description__["indexes"][idx]["columns"]
+        values = {p.column: p.equality_value() for p in predicates if p.is_equality()}
+        idx_cols = idx_cols[:self.__get_prefix_length__(idx_cols, values)]
+        ids = self.__lookup_ids__(idx, values)
+        residual = [p for p in predicates if not (p.is_equality() and p.column in idx_cols)]
+        return ids, residual
+
+    def __range_candidates__(self, predicates, idx, range_predicate):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Name of an index chosen by __get_template_access_path__ for range_predicate.
+        :param range_predicate: Range or "in" predicate on the first column of the index.
+        :return: The row ids, in row id order, the index returns for range_predicate, and the other predicates.
+        """
+        index = self.idxs[idx]
+        if isinstance(index, CSVIndex.BitmapIndex):
+            ids = index.find_values(range_predicate.in_values())
+        elif isinstance(index, CSVIndex.OrderedIndex):
+            if range_predicate.is_in():
+                ids = index.find_values(range_predicate.in_values())
+            else:
+                ids = index.find_range(*range_predicate.bounds())
+        else:
+            # "in" on a single column hash index: one lookup per value
+            ids = []
+            for v in set(range_predicate.in_values()):
+                ids += index.find([v])
+            ids.sort()
+        residual = [p for p in predicates if p.column != range_predicate.column]
+        return ids, residual
+
+    def __intersection_candidates__(self, predicates, paths):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param paths: List of (index name, column) pairs, see __plan_intersection__.
+        :return: The row ids, in row id order, every index returns for the predicate on its column, and the
+            predicates on the other columns.
+        """
+        by_column = {p.column: p for p in predicates}
+        bitmaps = []
+        id_lists = []
+        for idx_name, column in paths:
+            index = self.idxs[idx_name]
+            p = by_column[column]
+            if isinstance(index, CSVIndex.BitmapIndex):
+                bitmaps.append(index.bitmap([p.equality_value()] if p.is_equality() else p.in_values()))
+            elif p.is_equality():
+                id_lists.append(index.find([p.equality_value()]))
+            else:
+                id_lists.append(self.__range_candidates__([p], idx_name, p)[0])
+
+        if bitmaps:
+            bitmap = bitmaps[0]
+            for b in bitmaps[1:]:
+                bitmap &= b
+            for ids in id_lists:
+                if not bitmap:
+                    break
+                bitmap &= CSVIndex.ids_to_bitmap(ids)
+            ids = CSVIndex.bitmap_to_ids(bitmap)
+        else:
+            id_lists.sort(key=len)
+            keep = set(id_lists[0])
+            for other in id_lists[1:]:
+                keep.intersection_update(other)
+            ids = sorted(keep)
+        columns = [column for _, column in paths]
+        residual = [p for p in predicates if p.column not in columns]
+        return ids, residual
+
+    def __index_ids__(self, predicates, idx):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Name of an index whose leading columns have an equality predicate.
+        :return: List of the row ids whose rows satisfy every predicate.
+        """
+        ids, residual = self.__index_candidates__(predicates, idx)
+        if residual:
+            return self.__scan_ids__(residual, ids)
+        return ids
+
+    def __range_ids__(self, predicates, idx, range_predicate):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Name of an index chosen by __get_template_access_path__ for range_predicate.
+        :param range_predicate: Range or "in" predicate on the first column of the index.
+        :return: List of the row ids whose rows satisfy every predicate.
+        """
+        ids, residual = self.__range_candidates__(predicates, idx, range_predicate)
+        if residual:
+            return self.__scan_ids__(residual, ids)
+        return ids
+
+    def __index_only_source__(self, predicates, idx, range_predicate):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Access path chosen by __get_template_access_path__, not a scan.
+        :param range_predicate: Range or "in" predicate the index answers, or None.
+        :return: (store, constants, answered). store is a CSVStorage.ColumnStore the columns can be read from
+            without reading rows: the covered columns of the index, the table's own columns with column storage,
+            or None. constants maps the text columns the lookup fixes with an equality to their value. answered
+            lists the columns whose predicates the index answers.
+        """
+        if isinstance(idx, list):
+            names = [idx_name for idx_name, _ in idx]
+            answered = [c for _, c in idx]
+        elif range_predicate is not None:
+            names = [idx]
+            answered = [range_predicate.column]
+        else:
+            names = [idx]
+            idx_cols = self.__description__["indexes"][idx]["columns"]
+            answered = idx_cols[:self.__get_prefix_length__(idx_cols, [p.column for p in predicates
+                                                                        if p.is_equality()])]
+        # A number column may hold 2004.0 for a template value of 2004, so only text values are taken from the
+        # template.
+        constants = {p.column: p.equality_value() for p in predicates
+                     if p.is_equality() and p.column in answered and not self.__is_number_column__(p.column)}
+        store = None
+        if self.__is_columnar__():
+            store = self.__rows__
+        else:
+            for idx_name in names:
+                if self.idxs[idx_name].covered is not None:
+                    store = self.idxs[idx_name].covered
+                    break
+        return store, constants, answered
+
+    def __index_lookup__(self, predicates, idx, range_predicate=None, fields=None):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Access path chosen by __get_template_access_path__, not a scan.
+        :param range_predicate: Range or "in" predicate the index answers, or None.
+        :param fields: Columns of the rows to yield. All columns if None.
+        :return: A CSVOperators.IndexOnlyLookup if the index covers every column the query reads and has
+            predicates to check besides those it answers, a CSVOperators.IndexLookup otherwise. Projecting a
+            stored row costs as much as building the row from the index, but the covered columns are checked a
+            column at a time instead of a row at a time. Column storage always reads a column at a time.
+        """
+        if not self.__is_columnar__():
+            store, constants, answered = self.__index_only_source__(predicates, idx, range_predicate)
+            if fields is None:
+                fields = self.__get_column_names__()
+            available = set(constants.keys()) | set(store.column_names if store is not None else [])
+            residual = [p.column for p in predicates if p.column not in answered]
+            if residual and all([c in available for c in list(fields) + residual]):
+                return CSVOperators.IndexOnlyLookup(self, predicates, idx, range_predicate, list(fields), store,
+                                                    constants)
+        return CSVOperators.IndexLookup(self, predicates, idx, range_predicate, fields)
+
+    def __count_ids__(self, predicates, idx, range_predicate):
+        """
+        :param predicates: List of CSVPredicate.Predicate.
+        :param idx: Access path chosen by __get_template_access_path__, not a scan.
+        :param range_predicate: Range or "in" predicate the index answers, or None.
+        :return: Number of rows satisfying every predicate.
+        """
+        store, _, answered = self.__index_only_source__(predicates, idx, range_predicate)
+        if range_predicate is None and not isinstance(idx, list) and len(answered) == len(predicates):
+            # every predicate is an equality on the index prefix: count the row ids without listing them
+            values = {p.column: p.equality_value() for p in predicates}
+            return self.idxs[idx].count([values[c] for c in answered])
+        if range_predicate is None:
+            ids, residual = self.__index_candidates__(predicates, idx)
+        else:
+            ids, residual = self.__range_candidates__(predicates, idx, range_predicate)
+        if residual and store is not None and all([p.column in store.column_names for p in residual]):
+            for p in residual:
+                ids = store.filter_ids(p, ids)
+        elif residual:
+            ids = self.__scan_ids__(residual, ids)
+        return len(ids)
+
+    def __find_ids_by_template__(self, t):
+        """
+        :param t: A template.
+        :return: List of the row ids of the rows matching the template, using the best access path.
+        """
+        predicates = self.__compile_template__(t)
+        access_index, range_predicate = self.__get_template_access_path__(predicates)
+        if access_index is None:
+            return self.__scan_ids__(predicates)
+        elif range_predicate is None:
+            return self.__index_ids__(predicates, access_index)
+        else:
+            return self.__range_ids__(predicates, access_index, range_predicate)
+
     def __find_by_template_scan__(self, t, fields=None, limit=None, offset=None):
         """
         Returns a new, derived table containing rows that match the template and the requested fields if any.
         Returns all row if template is None and all columns if fields is None.
         :param t: The template representing a select predicate.
         :param fields: The list of fields (project fields)
-        :param limit: Max to return. Not implemented
-        :param offset: Offset into the result. Not implemented.
+        :param limit: Max to return. The scan stops once offset + limit rows matched.
+        :param offset: Offset into the result.
         :return: New table containing the result of the select and project.
         """
-
-        if limit is not None or offset is not None:
-            raise DataTableExceptions.DataTableException(-101, "Limit/offset not supported for CSVTable")
-
         # If there are rows and the template is not None
         if self.__rows__ is not None:
-
-            result = []
-
-            # Add the rows that match the template to the newly created table.
-            for r in self.__rows__:
-                if self.matches_template(r, t):
-                    result.append(r)
-
-            result = self.project(result, fields)
+            scan = CSVOperators.TableScan(self, self.__compile_template__(t), fields)
+            result = CSVOperators.Limit(scan, *page_bounds(limit, offset)).rows()
         else:
             result = None
 
@@ -248,55 +1388,572 @@ class CSVTable:
         :param t: Template representing a where clause/
         :param idx: Name of index to use.
         :param fields: Fields to return.
-        :param limit: Not implemented. Ignore.
-        :param offset: Not implemented. Ignore
+        :param limit: Max to return. Rows are only materialized until offset + limit rows matched.
+        :param offset: Offset into the result.
         :return: Matching tuples.
         """
         if self.__rows__ is not None:
-            # extract values from template in correct order
-            t_idx_name = ""
-            for col in self.__description__["indexes"][idx]["columns"]:
-                t_idx_name += str(t[col]) + "_"
-            t_idx_name = t_idx_name[:-1]
-            # get row numbers using index
-            result_row_idxs = self.idxs[idx][t_idx_name]
-            result = [self.__rows__[i] for i in result_row_idxs]
-            result = self.project(result, fields)
+            # get row numbers using index, then check the template columns the index does not cover
+            lookup = self.__index_lookup__(self.__compile_template__(t), idx, fields=fields)
+            result = CSVOperators.Limit(lookup, *page_bounds(limit, offset)).rows()
         else:
             result = None
 
         return result 
 
+    def __find_by_template_range__(self, t, idx, range_predicate, fields=None, limit=None, offset=None):
+        """
+        Find using an ORDERED index for a range predicate, or any single column index for an "in" predicate.
+        :param t: Template representing a where clause.
+        :param idx: Name of index to use.
+        :param range_predicate: The predicate in the template that the index answers.
+        :param fields: Fields to return.
+        :param limit: Max to return. Rows are only materialized until offset + limit rows matched.
+        :param offset: Offset into the result.
+        :return: Matching tuples.
+        """
+        lookup = self.__index_lookup__(self.__compile_template__(t), idx, range_predicate, fields)
+        return CSVOperators.Limit(lookup, *page_bounds(limit, offset)).rows()
+
+    def find_by_template_iter(self, t, fields=None, limit=None, offset=None):
+        """
+        Streaming version of find_by_template.
+        :return: A CSVOperators.Operator that yields the matching rows when iterated over.
+        """
+        start, stop = page_bounds(limit, offset)
+        predicates = self.__compile_template__(t)
+        access_index, range_predicate = self.__get_template_access_path__(predicates)
+        if access_index is None:
+            source = CSVOperators.TableScan(self, predicates, fields)
+        else:
+            source = self.__index_lookup__(predicates, access_index, range_predicate, fields)
+        return CSVOperators.Limit(source, start, stop)
+
     def find_by_template(self, t, fields=None, limit=None, offset=None):
         # 1. Validate the template values relative to the defined columns.
         # 2. Determine if there is an applicable index, and call __find_by_template_index__ if one exists.
         # 3. Call __find_by_template_scan__ if not applicable index.
-        if t is not None: access_index, max_selectivity = self.__get_access_path__(list(t.keys()));
-        else: access_index = None; 
+        # Range and "in" predicates can use an ORDERED index, see __get_template_access_path__.
+        # Rows are returned in row order, so limit and offset page through the same result on every path.
+        key, signature = None, None
+        if self.result_cache is not None:
+            key, signature = self.__get_cache_key__("select", t, fields, limit, offset), self.__result_signature__()
+            if key is not None and signature is not None:
+                result = self.result_cache.get(key, signature)
+                if result is not None:
+                    return result
+
+        access_index, range_predicate = self.__get_template_access_path__(self.__compile_template__(t))
 
         if access_index is None: 
-            return self.__find_by_template_scan__(t, fields=fields, limit=None, offset=None)
-        else:
+            result = self.__find_by_template_scan__(t, fields=fields, limit=limit, offset=offset)
+        elif range_predicate is None:
             result = self.__find_by_template_index__(t, access_index, fields, limit, offset)
-            return result
+        else:
+            result = self.__find_by_template_range__(t, access_index, range_predicate, fields, limit, offset)
+
+        if key is not None and signature is not None:
+            self.result_cache.put(key, [self.__table_name__], signature, result)
+        return result
+
+    def count_by_template(self, t):
+        """
+        SELECT COUNT(*). When the chosen index answers every predicate, the count is read from the index, without
+        listing row ids or reading rows. Other predicates are checked on the columns the index covers if it can.
+        :param t: A template.
+        :return: Number of rows matching the template.
+        """
+        predicates = self.__compile_template__(t)
+        if not predicates:
+            return self.__row_count__()
+        access_index, range_predicate = self.__get_template_access_path__(predicates)
+        if access_index is None:
+            return len(self.__scan_ids__(predicates))
+        return self.__count_ids__(predicates, access_index, range_predicate)
+
+    def exists_by_template(self, t):
+        """
+        :param t: A template.
+        :return: True if a row matches the template. A scan stops at the first batch holding a match.
+        """
+        predicates = self.__compile_template__(t)
+        access_index, range_predicate = self.__get_template_access_path__(predicates)
+        if access_index is None:
+            return next(iter(CSVOperators.TableScan(self, predicates, [])), None) is not None
+        return self.__count_ids__(predicates, access_index, range_predicate) > 0
+
+    def find_distinct_by_template(self, t, fields=None):
+        """
+        SELECT DISTINCT. If fields are columns of an index and the template is empty or only has equalities on a
+        leftmost prefix of the index's columns, the result is read from the index keys, i.e. one step per
+        distinct key instead of one per row. Otherwise rows are found like in find_by_template, which reads the
+        columns from an index that covers them.
+        :param t: A template.
+        :param fields: List of column names. All columns if None.
+        :return: List of dictionaries, one per distinct combination of values, in no particular order.
+        """
+        predicates = self.__compile_template__(t)
+        key_index = self.__get_key_index__(predicates, fields) if fields else None
+        if key_index is not None:
+            idx_name, keys, positions = key_index
+            distinct = dict.fromkeys(tuple([key[j] for j in positions]) for key in keys)
+            return [dict(zip(fields, values)) for values in distinct]
+
+        rows = self.find_by_template_iter(t, fields)
+        distinct = dict.fromkeys(tuple(r.items()) for r in rows)
+        return [dict(items) for items in distinct]
+
+    def __get_key_index__(self, predicates, fields):
+        """
+        Finds an index whose keys answer a query on fields, i.e. fields are index columns and the predicates are
+        equalities on a leftmost prefix of the index's columns. The index with the fewest keys is chosen.
+        :param predicates: List of CSVPredicate.Predicate.
+        :param fields: List of column names.
+        :return: (index name, keys, positions) or None. keys lists the matching index keys as tuples of column
+            values, positions holds the position of each field in a key.
+        """
+        equalities = {p.column: p.equality_value() for p in predicates if p.is_equality()}
+        if len(equalities) != len(predicates):
+            return None
+        best = None
+        for idx_name, index in self.idxs.items():
+            idx_cols = self.__description__["indexes"][idx_name]["columns"]
+            k = self.__get_prefix_length__(idx_cols, equalities)
+            if k == len(predicates) and all([f in idx_cols for f in fields]):
+                if best is None or len(index) < len(self.idxs[best[0]]):
+                    best = (idx_name, idx_cols, k)
+        if best is None:
+            return None
+        idx_name, idx_cols, k = best
+        index = self.idxs[idx_name]
+        keys = index.distinct_keys([equalities[c] for c in idx_cols[:k]])
+        if index.n_columns == 1:
+            keys = [(key,) for key in keys]
+        return idx_name, keys, [idx_cols.index(f) for f in fields]
+
+    def __check_aggregates__(self, aggregates, column_type):
+        """
+        :param aggregates: List of (function, column) pairs, see CSVOperators.HashAggregate.
+        :param column_type: Function from a column name to its catalog column_type, or None if unknown.
+        :return: None
+        """
+        for function, column in aggregates:
+            if function not in CSVOperators.aggregate_functions or (column is None and function != "count"):
+                raise ValueError("Invalid aggregate.")
+            if function != "count" and column_type(column) not in ("number", None):
+                raise CSVPredicate.invalid_template(
+                    "{} needs a number column, {} is {}".format(function, column, column_type(column)))
+
+    def group_by(self, group_fields, aggregates, where_template=None):
+        """
+        SELECT group_fields, aggregates FROM this table WHERE where_template GROUP BY group_fields. Rows matching
+        the template are found like in find_by_template and streamed into a hash aggregation, see
+        CSVOperators.HashAggregate, with only the columns it reads. Counts grouped on columns of an index, with a
+        template that is empty or only fixes a leftmost prefix of the index, are read from the index keys
+        instead of the rows.
+        :param group_fields: List of grouping column names. May be empty for aggregates over all matching rows.
+        :param aggregates: List of (function, column) pairs, e.g. [("count", None), ("sum", "H")]. function is
+            one of CSVOperators.aggregate_functions and column is None for count(*). Functions other than count
+            need a "number" column.
+        :param where_template: Select template.
+        :return: List of dictionaries, one per group, holding the grouping columns and one column per aggregate
+            named like "sum(H)" or "count(*)", in no particular order.
+        """
+        self.__check_aggregates__(aggregates, self.__get_column_type__)
+        group_fields = list(group_fields)
+        if group_fields and all([function == "count" and column is None for function, column in aggregates]):
+            key_index = self.__get_key_index__(self.__compile_template__(where_template), group_fields)
+            if key_index is not None:
+                idx_name, keys, positions = key_index
+                index = self.idxs[idx_name]
+                counts = {}
+                for key in keys:
+                    group = tuple([key[j] for j in positions])
+                    counts[group] = counts.get(group, 0) + index.count(list(key))
+                names = [CSVOperators.aggregate_name(function, column) for function, column in aggregates]
+                return [dict(zip(group_fields + names, group + (n,) * len(names))) for group, n in counts.items()]
+
+        # Row storage yields its stored rows as they are, column storage only builds the columns read.
+        columns = group_fields + [column for _, column in aggregates if column is not None]
+        fields = list(dict.fromkeys(columns)) if self.__is_columnar__() else None
+        rows = self.find_by_template_iter(where_template, fields)
+        return list(CSVOperators.HashAggregate(rows, group_fields, aggregates))
+
+    def __get_cache_key__(self, kind, t, fields, *args, right_r=None):
+        """
+        :param kind: "select" or "join".
+        :param t: Select template.
+        :param fields: Project fields.
+        :param args: Other parameters that change the result, e.g. limit and offset.
+        :param right_r: Right table of a join.
+        :return: Key of the query in the result cache, or None if the query cannot be cached.
+        """
+        normalized = CSVResultCache.normalize_template(t)
+        if t is not None and normalized is None:
+            return None
+        names = (self.__table_name__,) if right_r is None else (self.__table_name__, right_r.name())
+        return (kind,) + names + (normalized, None if fields is None else tuple(fields)) + args
 
     def insert(self, r):
-        raise DataTableExceptions.DataTableException(
-            code=DataTableExceptions.DataTableException.not_implemented,
-            message="Insert not implemented"
-        )
+        """
+        Adds a row. The row is added to every index, and PRIMARY and UNIQUE indexes must not hold its key yet.
+        Like every write, it is appended to the log before it is applied, see compact().
+        :param r: Dictionary of column values. Missing columns are empty, and "number" values may be given as
+            strings, like in the CSV file.
+        :return: None
+        """
+        self.__write__({"op": "insert", "row": r})
 
     def delete(self, t):
-        raise DataTableExceptions.DataTableException(
-            code=DataTableExceptions.DataTableException.not_implemented,
-            message="Delete not implemented"
-        )
+        """
+        Deletes the rows matching a template and removes them from every index.
+        :param t: A template.
+        :return: Number of deleted rows.
+        """
+        return self.__write__({"op": "delete", "template": t})
 
     def update(self, t, change_values):
-        raise DataTableExceptions.DataTableException(
-            code=DataTableExceptions.DataTableException.not_implemented,
-            message="Updated not implemented"
-        )
+        """
+        Changes columns of the rows matching a template. The rows are moved to their new keys in the indexes on
+        the changed columns, and PRIMARY and UNIQUE indexes must not end up with two rows with the same key.
+        :param t: A template.
+        :param change_values: Dictionary of the new column values.
+        :return: Number of updated rows.
+        """
+        return self.__write__({"op": "update", "template": t, "values": change_values})
+
+    def __get_log_file_name__(self):
+        return self.__get_file_name__() + log_suffix
+
+    def __write__(self, entry, log=True):
+        """
+        Checks a write, logs it and applies it.
+        :param entry: Dictionary with the operation ("insert", "delete" or "update") and its parameters, as it is
+            logged.
+        :param log: False when replaying the log.
+        :return: Number of rows written.
+        """
+        if self.__file_name__ == "DERIVED":
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.not_implemented,
+                message="Derived tables cannot be written")
+        if self.__load_columns__ is not None:
+            raise DataTableExceptions.DataTableException(
+                code=DataTableExceptions.DataTableException.not_implemented,
+                message="Tables opened with a column list cannot be written")
+
+        with self.__log_lock__() if log else self.__write_lock__:
+            if log:
+                # Writes are checked against the writes of every table instance, not only this one.
+                self.__catch_up_log__()
+            op = entry["op"]
+            if op == "insert":
+                rows = [self.__make_row__(entry["row"])]
+                ids = [None]
+            else:
+                ids = list(self.__find_ids_by_template__(entry["template"]))
+                if op == "update":
+                    changes = self.__make_row__(entry["values"], partial=True)
+                    rows = [{**self.__rows__[i], **changes} for i in ids]
+            if op != "delete":
+                self.__check_unique_keys__(ids, rows)
+            if not ids:
+                return 0
+
+            if log:
+                self.__append_to_log__(entry)
+            if op == "insert":
+                self.__insert_row__(rows[0])
+            elif op == "delete":
+                self.__delete_ids__(ids)
+            else:
+                self.__update_ids__(ids, rows, changes)
+            self.__data_version__ += 1
+
+            if log and self.__log_size__ >= compact_log_size and \
+                    (self.__compactor__ is None or not self.__compactor__.is_alive()):
+                self.__compactor__ = threading.Thread(target=self.compact, daemon=True)
+                self.__compactor__.start()
+        return len(ids)
+
+    def __make_row__(self, values, partial=False):
+        """
+        :param values: Dictionary of column values given to insert or update.
+        :param partial: True for update, whose values only hold the changed columns.
+        :return: Dictionary of the values as the table holds them. "number" values are parsed, text values are
+            strings and empty text values are "", like values loaded from the CSV file.
+        """
+        definitions = {col["column_name"]: col for col in self.__get_column_definitions__()}
+        for c in values:
+            if c not in definitions:
+                raise DataTableExceptions.DataTableException(
+                    code=DataTableExceptions.DataTableException.invalid_column_definition,
+                    message="Unknown column " + c)
+        row = {}
+        for c, col in definitions.items():
+            if c not in values and partial:
+                continue
+            v = values.get(c)
+            if col["column_type"] == "number":
+                v = parse_numbers([v], [(0, c, bool(col["not_null"]))])[0]
+            elif v is None and col["not_null"]:
+                raise DataTableExceptions.DataTableException(
+                    code=DataTableExceptions.DataTableException.invalid_column_definition,
+                    message="Empty value in not null column " + c)
+            else:
+                v = "" if v is None else str(v)
+            row[c] = v
+        return row
+
+    def __check_unique_keys__(self, ids, rows):
+        """
+        :param ids: Row ids of the rows being written, None for a new row.
+        :param rows: The rows as they will be after the write.
+        :return: None
+        :raise DataTableException: If a PRIMARY or UNIQUE index would hold a key twice.
+        """
+        written = set(ids)
+        for idx_name, index in self.idxs.items():
+            definition = self.__description__["indexes"][idx_name]
+            if definition["kind"] not in ("PRIMARY", "UNIQUE"):
+                continue
+            columns = definition["columns"]
+            keys = set()
+            for r in rows:
+                values = [r[c] for c in columns]
+                if None in values:
+                    continue
+                key = index.make_key(values)
+                if key in keys or any([i not in written for i in index.find(values)]):
+                    raise DataTableExceptions.DataTableException(
+                        code=DataTableExceptions.DataTableException.duplicate_key,
+                        message="Duplicate key {} for index {}".format(list(values), idx_name))
+                keys.add(key)
+
+    @contextlib.contextmanager
+    def __log_lock__(self):
+        """
+        Holds the write lock of this table and the lock every table instance of the CSV file, in this process or
+        another one, takes before writing to the log or compacting it.
+        """
+        with self.__write_lock__:
+            with open(self.__get_log_file_name__() + lock_suffix, "ab") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                # closing the file releases the lock
+                yield
+
+    def __catch_up_log__(self):
+        """
+        Applies the writes that other table instances of the CSV file appended to the log since this table last
+        read or wrote it. If the CSV file was rewritten, e.g. compacted by another instance, the table is loaded
+        again, see refresh(). Called with the log lock held.
+        :return: None
+        """
+        if self.__get_load_signature__() != self.__load_signature__:
+            self.refresh()
+        try:
+            with open(self.__get_log_file_name__(), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == self.__log_size__:
+                    return
+                f.seek(self.__log_size__)
+                data = f.read() if size > self.__log_size__ else None
+        except OSError:
+            data = None if self.__log_size__ > 0 else b""
+        entries = None if data is None else parse_log(data)
+        if entries is None or any([entry["op"] == "compacted" for entry in entries]):
+            # The log is not the one this table read: load the table again.
+            self.__statistics__ = None
+            self.__load_table__()
+            return
+        for entry in entries:
+            self.__write__(entry, log=False)
+        # A line that was not fully written is skipped for good: its writer crashed before applying it.
+        self.__log_size__ += len(data)
+
+    def __append_to_log__(self, entry):
+        """
+        Appends a write to the log and waits until it is on disk. Called with the log lock held.
+        :return: None
+        """
+        line = (json.dumps(entry, default=log_value) + "\n").encode("utf-8")
+        with open(self.__get_log_file_name__(), "a+b") as f:
+            # A last line left incomplete by a crash is ended, so it does not swallow this one.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.__log_size__ += len(line)
+
+    def __replay_log__(self):
+        """
+        Applies the writes of the log to the rows loaded from the CSV file. A log whose writes have already been
+        compacted into the CSV file, see compact(), is removed. A last line that was not fully written is
+        ignored, since its write was never applied.
+        :return: None
+        """
+        fn = self.__get_log_file_name__()
+        self.__log_size__ = 0
+        try:
+            with open(fn, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        entries = parse_log(data)
+        if entries and entries[-1]["op"] == "compacted":
+            signature = self.__get_load_signature__()
+            if signature is not None and signature[:2] == (entries[-1]["csv_size"], entries[-1]["csv_mtime"]):
+                os.remove(fn)
+                return
+            entries = entries[:-1]
+        for entry in entries:
+            self.__write__(entry, log=False)
+        self.__log_size__ = len(data)
+
+    def __index_key__(self, idx_name, r):
+        """
+        :return: The key of row r in an index.
+        """
+        columns = self.__description__["indexes"][idx_name]["columns"]
+        return self.idxs[idx_name].make_key([r[c] for c in columns])
+
+    def __insert_row__(self, r):
+        start = len(self.__rows__)
+        if self.__is_columnar__():
+            self.__rows__.append(r)
+        else:
+            CSVStorage.extend_shared_values([r], self.__shared_values__)
+            self.__rows__.append(r)
+        for idx_name, index in self.idxs.items():
+            self.__extend_index__(idx_name, index, start)
+        self.__lineless__.add(start)
+
+    def __delete_ids__(self, ids):
+        for i in ids:
+            r = self.__rows__[i]
+            for idx_name, index in self.idxs.items():
+                index.remove(self.__index_key__(idx_name, r), i)
+            self.__deleted__.add(i)
+
+    def __update_ids__(self, ids, rows, changes):
+        """
+        :param ids: Row ids.
+        :param rows: The rows as they will be after the update.
+        :param changes: The changed values.
+        :return: None
+        """
+        changed = [(idx_name, index) for idx_name, index in self.idxs.items()
+                   if any([c in changes for c in self.__description__["indexes"][idx_name]["columns"]])]
+        covered = [index for index in self.idxs.values()
+                   if index.covered is not None and any([c in changes for c in index.covered.column_names])]
+        for i, r in zip(ids, rows):
+            old = self.__rows__[i]
+            for idx_name, index in changed:
+                old_key, new_key = self.__index_key__(idx_name, old), self.__index_key__(idx_name, r)
+                if old_key != new_key:
+                    index.remove(old_key, i)
+                    index.add(new_key, i)
+            for index in covered:
+                for c in index.covered.column_names:
+                    if c in changes:
+                        index.covered.set_value(i, c, changes[c])
+            if self.__is_columnar__():
+                for c, v in changes.items():
+                    self.__rows__.set_value(i, c, v)
+            else:
+                # Rows are replaced, not changed in place, since results returned earlier may hold them.
+                CSVStorage.extend_shared_values([r], self.__shared_values__)
+                self.__rows__[i] = r
+            self.__updated__.add(i)
+
+    def compact(self, background=False):
+        """
+        Writes the changes of insert(), update() and delete() into the CSV file and removes the log. The file is
+        written to a temporary file, a "compacted" entry naming it is appended to the log, and it is then moved
+        into place, so a table loaded after a crash at any point either replays the log on the old file or finds
+        it already compacted. Columns of the file that the table does not hold, and lines appended to the file
+        but not refreshed yet, are kept. Writes that other table instances of the file appended to the log are
+        applied first, so the file holds every logged write when the log is removed. Writes wait while compaction
+        runs, reads do not.
+        :param background: Compact in a background thread and return at once.
+        :return: None
+        """
+        if background:
+            with self.__write_lock__:
+                if self.__compactor__ is None or not self.__compactor__.is_alive():
+                    self.__compactor__ = threading.Thread(target=self.compact, daemon=True)
+                    self.__compactor__.start()
+            return
+        with self.__log_lock__():
+            # The log is only removed once it holds nothing this table has not applied.
+            self.__catch_up_log__()
+            log_fn = self.__get_log_file_name__()
+            if not os.path.exists(log_fn):
+                return
+            if self.__parsed_offset__ is None:
+                # The file changed while it was loaded: where its lines end up in the table is unknown.
+                self.refresh()
+                if self.__parsed_offset__ is None:
+                    return
+
+            fn = self.__get_file_name__()
+            encoding = locale.getpreferredencoding(False)
+            with open(fn, "rb") as f:
+                data = f.read(self.__parsed_offset__)
+                unparsed = f.read()
+            reader = csv.reader(io.StringIO(data.decode(encoding), newline=""), delimiter=",", quotechar='"')
+            header = next(reader)
+            positions = self.__get_column_positions__(header, fn)
+            columns = self.__get_column_names__()
+            text = io.StringIO(newline="")
+            writer = csv.writer(text, delimiter=",", quotechar='"', lineterminator="\n")
+            writer.writerow(header)
+
+            # The lines of the file belong to the rows that have one, in row id order.
+            lines = (r for r in reader if r)
+            deleted, lineless, updated = self.__deleted__, self.__lineless__, self.__updated__
+            for i in range(len(self.__rows__)):
+                if i in lineless:
+                    if i in deleted:
+                        continue
+                    line = [""] * len(header)
+                else:
+                    line = next(lines)
+                    if i in deleted:
+                        continue
+                    if i not in updated:
+                        writer.writerow(line)
+                        continue
+                    line += [""] * (len(header) - len(line))
+                r = self.__rows__[i]
+                for c, p in zip(columns, positions):
+                    line[p] = "" if r[c] is None else str(r[c])
+                writer.writerow(line)
+
+            compacted = text.getvalue().encode(encoding)
+            tmp_fn = fn + ".compact.tmp"
+            with open(tmp_fn, "wb") as f:
+                f.write(compacted)
+                f.write(unparsed)
+                f.flush()
+                os.fsync(f.fileno())
+            st = os.stat(tmp_fn)
+            self.__append_to_log__({"op": "compacted", "csv_size": st.st_size, "csv_mtime": st.st_mtime_ns})
+            os.replace(tmp_fn, fn)
+            os.remove(log_fn)
+
+            # Every row that is not deleted now has a line, in row id order.
+            self.__lineless__ = set(deleted)
+            self.__updated__ = set()
+            self.__log_size__ = 0
+            self.__parsed_offset__ = len(compacted)
+            self.__parsed_tail__ = compacted[-refresh_check_size:]
+            # A refresh parses the lines that were not parsed before.
+            self.__load_signature__ = (len(compacted), st.st_mtime_ns) + self.__load_signature__[2:]
 
     def get_on_template(self, row, on_fields):
         tmp = {}
@@ -304,7 +1961,63 @@ class CSVTable:
             tmp[f] = row[f]
         return tmp
 
-    def execute_slow_join(self, right_r, on_fields, where_template=None, project_fields=None):
+    def __report_progress__(self, rows, total, every):
+        """
+        Passes rows through and prints how many have been pulled every so many rows.
+        :param rows: Outer input row ids of a join.
+        :param total: Number of outer rows.
+        :param every: Print every this many rows.
+        :return: Generator over the row ids.
+        """
+        processed = 0
+        for r in rows:
+            yield r
+            processed += 1
+            if processed % every == 0:
+                print ("Processed {}/{} left rows...".format(processed, total))
+
+    def __compile_join_template__(self, right_r, t):
+        """
+        :param right_r: The other input of the join.
+        :param t: Where template of the join.
+        :return: List of CSVPredicate.Predicate to check on joined rows. A column is compared as a number if it is
+            a "number" column in either table.
+        """
+        if t is None:
+            return []
+        return [CSVPredicate.Predicate(c, v, self.__is_number_column__(c) or right_r.__is_number_column__(c))
+                for c, v in t.items()]
+
+    def __finish_join__(self, joined, project_fields, limit, offset):
+        """
+        Late materialization. Output rows are only built for the requested page of pairs, and only hold the
+        projected columns.
+        :param joined: Operator yielding (left row id, right row id) pairs that satisfy the where template,
+            the left table and the right table, as returned by the __*_join_iter__ methods.
+        :param project_fields: List of fields to return from the result.
+        :param limit: Max number of rows to return. The join stops once offset + limit rows matched.
+        :param offset: Offset into the result.
+        :return: Operator yielding the requested page of projected rows.
+        """
+        pairs, left_r, right_r = joined
+        page = CSVOperators.Limit(pairs, *page_bounds(limit, offset))
+        return CSVOperators.PairProject(page, left_r, right_r, project_fields)
+
+    def __slow_join_iter__(self, right_r, on_fields, where_template=None):
+        """
+        :return: Operator yielding the row id pairs of a nested loop join, see execute_slow_join, and the left
+            and right tables.
+        """
+        left_t, right_t, residual_t = self.__split_join_template__(right_r, on_fields, where_template)
+        left_ids = self.__select_ids_for_join__(left_t)
+        left_ids = self.__report_progress__(left_ids, len(left_ids), 10)
+        pairs = CSVOperators.NestedLoopJoin(self, left_ids, right_r, right_r.__select_ids_for_join__(right_t),
+                                            on_fields)
+        pairs = CSVOperators.PairSelect(pairs, self, right_r, self.__compile_join_template__(right_r, residual_t))
+        return pairs, self, right_r
+
+    def execute_slow_join(self, right_r, on_fields, where_template=None, project_fields=None, limit=None,
+                          offset=None):
         """
         Implements a JOIN on two CSV Tables. Support equi-join only on a list of common
         columns names.
@@ -313,30 +2026,36 @@ class CSVTable:
         :param on_fields: A list of common fields used for the equi-join.
         :param where_template: Select template to apply to the result to determine what to return.
         :param project_fields: List of fields to return from the result.
+        :param limit: Max number of rows to return. The join stops once offset + limit rows matched.
+        :param offset: Offset into the result.
         :return: List of dictionary elements, each representing a row.
         """
-        left_r = self
-        left_rows = self.__rows__
-        right_rows = right_r.get_row_list()
-        result_rows = []
-
-        left_rows_processed = 0
-        for lr in left_rows:
-            on_template = self.get_on_template(lr, on_fields)
-            for rr in right_rows:
-                if self.matches_template(rr, on_template):
-                    new_r = {**lr, **rr}
-                    result_rows.append(new_r)
-            left_rows_processed += 1
-            if left_rows_processed % 10 == 0 and left_rows_processed > 0:
-                print ("Processed {}/{} left rows...".format(left_rows_processed, len(left_rows)))
-
-        join_result = self.table_from_rows("JOIN(" + left_r.name()  + "," + right_r.name() + ")", result_rows)
-        result = join_result.find_by_template(where_template, fields=project_fields)
-        return result 
+        joined = self.__slow_join_iter__(right_r, on_fields, where_template)
+        return self.__finish_join__(joined, project_fields, limit, offset).rows()
+
+    def __smart_join_iter__(self, right_r, on_fields, where_template=None, swap=False):
+        """
+        :return: Operator yielding the row id pairs of an index nested loop join, see execute_smart_join, and
+            the left and right tables. The left table is the one that is scanned.
+        """
+        # the table whose index is probed is chosen by join()
+        if swap:
+            left_r = right_r
+            right_r = self
+        else:
+            left_r = self
+        left_t, right_t, residual_t = left_r.__split_join_template__(right_r, on_fields, where_template)
+        # optimization = select before join. The conjuncts on the probed table are checked on the row ids each
+        # probe returns.
+        left_ids = left_r.__select_ids_for_join__(left_t)
+        left_ids = self.__report_progress__(left_ids, len(left_ids), 10000)
+        pairs = CSVOperators.IndexJoin(left_r, left_ids, right_r, on_fields, right_r.__compile_template__(right_t))
+        pairs = CSVOperators.PairSelect(pairs, left_r, right_r,
+                                        left_r.__compile_join_template__(right_r, residual_t))
+        return pairs, left_r, right_r
 
     def execute_smart_join(self, right_r, on_fields, where_template=None, \
-        project_fields=None, idx_selectivities=(-1,-1)):
+        project_fields=None, swap=False, limit=None, offset=None):
         """
         Implements a JOIN on two CSV Tables. Support equi-join only on a list of common
         columns names.
@@ -345,66 +2064,591 @@ class CSVTable:
         :param on_fields: A list of common fields used for the equi-join.
         :param where_template: Select template to apply to the result to determine what to return.
         :param project_fields: List of fields to return from the result.
+        :param swap: If True, scan right_r and probe the index of this table instead of the other way around.
+        :param limit: Max number of rows to return. The join stops probing once offset + limit rows matched.
+        :param offset: Offset into the result.
         :return: List of dictionary elements, each representing a row.
         """
-        # set table with maximally selective index to probe table
-        # check left table for relevant indexes
-        s_max, r_max = idx_selectivities
-        if s_max > r_max:
-            left_r = right_r
-            right_r = self
-            selected_l = left_r.find_by_template(where_template) # optimization
-            selected_l = left_r.table_from_rows("LEFTSELECTED", selected_l)
-            left_rows = selected_l.get_row_list()
-            right_rows = self.get_row_list()
+        joined = self.__smart_join_iter__(right_r, on_fields, where_template, swap)
+        return self.__finish_join__(joined, project_fields, limit, offset).rows()
+
+    def __get_row_columns__(self):
+        """
+        :return: Column names of the table. Derived tables have no description and take them from their rows.
+        """
+        if self.__description__ is not None:
+            return self.__get_column_names__()
+        elif len(self.__rows__) > 0:
+            return list(self.__rows__[0].keys())
+        return []
+
+    def __has_columns__(self, columns):
+        """
+        :param columns: List of column names.
+        :return: True if every column is a column of this table.
+        """
+        names = self.__get_row_columns__()
+        return all([c in names for c in columns])
+
+    def __join_input_cost__(self, template):
+        """
+        :param template: The part of the where template pushed down to this table, see __split_join_template__.
+        :return: Estimated number of rows this table contributes to a join, and the cost of selecting them.
+        """
+        if template:
+            _, _, cost, rows = self.__plan_access__(self.__compile_template__(template))
+            return rows, cost
+        n = self.__row_count__()
+        return n, n * scan_row_cost
+
+    def __split_join_template__(self, right_r, on_fields, where_template):
+        """
+        Splits the where template of a join by table, using the column lists of both tables. A conjunct on a column
+        of only one table is pushed down to that table. A conjunct on a join column is pushed down to both, since
+        joined rows hold equal values for it. A conjunct on any other column the tables share references both
+        sides and is checked on the joined rows.
+        :param right_r: The other input of the join.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param where_template: Select template of the join.
+        :return: Templates for this table, for right_r and for the joined rows. Empty if they have no conjuncts.
+        :raise DataTableException: invalid_template if a conjunct is on a column of neither table.
+        """
+        for c in on_fields:
+            # Numbers never equal strings, so the join columns must have the same type on both sides.
+            left_type, right_type = self.__get_column_type__(c), right_r.__get_column_type__(c)
+            if left_type is not None and right_type is not None and left_type != right_type:
+                raise DataTableExceptions.DataTableException(
+                    code=DataTableExceptions.DataTableException.invalid_column_definition,
+                    message="Join column {} is {} in {} and {} in {}".format(c, left_type, self.name(), right_type,
+                                                                            right_r.name()))
+
+        left_t, right_t, residual_t = {}, {}, {}
+        if where_template is None:
+            return left_t, right_t, residual_t
+        left_columns = self.__get_row_columns__()
+        right_columns = right_r.__get_row_columns__()
+        for c, v in where_template.items():
+            in_left, in_right = c in left_columns, c in right_columns
+            if in_left and in_right and c not in on_fields:
+                residual_t[c] = v
+                continue
+            if in_left:
+                left_t[c] = v
+            if in_right:
+                right_t[c] = v
+            if not (in_left or in_right):
+                # A derived table without rows does not know its columns.
+                if left_columns and right_columns:
+                    raise CSVPredicate.invalid_template("Invalid column {} in join template".format(c))
+                residual_t[c] = v
+        return left_t, right_t, residual_t
+
+    def __plan_join__(self, right_r, on_fields, where_template=None, presorted=(False, False)):
+        """
+        Cost based choice of the join method. Compares a hash join, a merge join and an index nested loop join
+        probing the index of either input, using the statistics of both tables.
+        :return: (method, swap, cost). swap is True if the index nested loop join should probe this table.
+        """
+        left_t, right_t, _ = self.__split_join_template__(right_r, on_fields, where_template)
+        left_rows, left_cost = self.__join_input_cost__(left_t)
+        right_rows, right_cost = right_r.__join_input_cost__(right_t)
+
+        def sort_cost(n, is_sorted):
+            # Inputs the caller knows are sorted are merged as they are. Others take a pass to check their order,
+            # and a sort if needed.
+            if is_sorted:
+                return 0
+            return n * scan_row_cost + n * math.log2(max(n, 2)) * sort_row_cost
+
+        # A hash join whose hash table does not fit the memory budget spills both inputs to disk.
+        hash_cost = left_cost + right_cost + (left_rows + right_rows) * hash_row_cost
+        if min(left_rows, right_rows) * hash_entry_bytes > self.__get_join_memory_budget__():
+            hash_candidate = (hash_cost + (left_rows + right_rows) * spill_row_cost, "grace", False)
         else:
-            left_r = self
-            selected_l = self.find_by_template(where_template) # optimization = select before join
-            selected_l = self.table_from_rows("LEFTSELECTED", selected_l)
-            left_rows = selected_l.get_row_list()
-            right_rows = right_r.get_row_list()
-        result_rows = []
-
-        left_rows_processed = 0
-        for lr in left_rows:
-            on_template = self.get_on_template(lr, on_fields)
-            # use index to find matches
-            matching_rows = right_r.find_by_template(on_template)
-            result_rows += [{**lr, **rr} for rr in matching_rows]
-            left_rows_processed += 1
-            if left_rows_processed % 10000 == 0 and left_rows_processed > 0:
-                print ("Processed {}/{} left rows...".format(left_rows_processed, len(left_rows)))
-
-        join_result = self.table_from_rows("JOIN(" + left_r.name() + "," + \
-            right_r.name() + ")", result_rows)
-        result = join_result.find_by_template(where_template, fields=project_fields)
-        return result 
+            hash_candidate = (hash_cost, "hash", False)
+        candidates = [
+            hash_candidate,
+            (left_cost + right_cost + sort_cost(left_rows, presorted[0]) + sort_cost(right_rows, presorted[1]) +
+             left_rows + right_rows, "merge", False)
+        ]
+
+        # index nested loop join. The conjuncts on the probed table are checked on the rows each probe returns.
+        right_index, right_rows_per_key = right_r.__get_access_path__(on_fields)
+        if right_index is not None:
+            candidates.append((left_cost + left_rows * right_r.__lookup_cost__(right_index, right_rows_per_key),
+                               "index", False))
+        left_index, left_rows_per_key = self.__get_access_path__(on_fields)
+        if left_index is not None:
+            candidates.append((right_cost + right_rows * self.__lookup_cost__(left_index, left_rows_per_key),
+                               "index", True))
 
-    def join(self, right_r, on_fields, where_template=None, project_fields=None, optimize=True):
+        cost, method, swap = min(candidates, key=lambda c: c[0])
+        return method, swap, cost
+
+    def __select_ids_for_join__(self, template):
         """
-        Implements a JOIN on two CSV Tables. Support equi-join only on a list of common
-        columns names.
-        :param left_r: The left table, or first input table
+        Select pushdown for a join input. The conjuncts of the where template on this table are evaluated with
+        the best access path of the table, see __find_ids_by_template__.
+        :param template: The part of the where template pushed down to this table, see __split_join_template__.
+        :return: Row ids that go into the join.
+        """
+        if not template:
+            return self.__live_ids__()
+        return self.__find_ids_by_template__(template)
+
+    def __sort_ids_for_join__(self, ids, on_fields, presorted=False):
+        """
+        Orders row ids on the join columns. Rows are not copied, only their ids are sorted. If the input is
+        already clustered on the join columns, which is checked in one pass unless presorted is True,
+        the sort is skipped.
+        :param ids: Row ids.
+        :param on_fields: Join columns.
+        :param presorted: True if the caller knows the rows are ordered on on_fields.
+        :return: The ordered row ids and their join keys. Rows with an empty number in a join column are left
+            out, since they match no row.
+        """
+        if len(on_fields) == 1:
+            c = on_fields[0]
+            keys = [self.__get_value__(i, c) for i in ids]
+            has_nulls = None in keys
+        else:
+            keys = [tuple([self.__get_value__(i, c) for c in on_fields]) for i in ids]
+            has_nulls = any([None in key for key in keys])
+        if has_nulls:
+            kept = [j for j, key in enumerate(keys) if not (key is None or (type(key) is tuple and None in key))]
+            ids = [ids[j] for j in kept]
+            keys = [keys[j] for j in kept]
+
+        if not presorted and not all(map(operator.le, keys, itertools.islice(keys, 1, None))):
+            order = sorted(range(len(ids)), key=keys.__getitem__)
+            ids = [ids[j] for j in order]
+            keys = [keys[j] for j in order]
+        return ids, keys
+
+    def is_sorted_on(self, columns):
+        """
+        :param columns: List of column names.
+        :return: True if the rows of the table are ordered on the columns.
+        """
+        ids = list(self.__live_ids__())
+        ordered_ids, _ = self.__sort_ids_for_join__(ids, columns)
+        return ordered_ids is ids
+
+    def __merge_join_iter__(self, right_r, on_fields, where_template=None, presorted=(False, False)):
+        """
+        :return: Operator yielding the row id pairs of a sort-merge join, see execute_merge_join, and the left
+            and right tables.
+        """
+        left_t, right_t, residual_t = self.__split_join_template__(right_r, on_fields, where_template)
+        left_ids = self.__select_ids_for_join__(left_t)
+        right_ids = right_r.__select_ids_for_join__(right_t)
+        left_ids, left_keys = self.__sort_ids_for_join__(left_ids, on_fields, presorted[0])
+        right_ids, right_keys = right_r.__sort_ids_for_join__(right_ids, on_fields, presorted[1])
+        pairs = CSVOperators.MergeJoin(left_ids, left_keys, right_ids, right_keys)
+        pairs = CSVOperators.PairSelect(pairs, self, right_r, self.__compile_join_template__(right_r, residual_t))
+        return pairs, self, right_r
+
+    def execute_merge_join(self, right_r, on_fields, where_template=None, project_fields=None,
+                           presorted=(False, False), limit=None, offset=None):
+        """
+        Implements a JOIN on two CSV Tables as a sort-merge join. Support equi-join only on a list of common
+        columns names. Inputs that are already ordered on the join columns are not sorted.
         :param right_r: The right table, or second input table.
         :param on_fields: A list of common fields used for the equi-join.
         :param where_template: Select template to apply to the result to determine what to return.
         :param project_fields: List of fields to return from the result.
+        :param presorted: Pair of booleans, True if the left or right input is known to be ordered on on_fields.
+        :param limit: Max number of rows to return. The merge stops once offset + limit rows matched.
+        :param offset: Offset into the result.
         :return: List of dictionary elements, each representing a row.
         """
+        joined = self.__merge_join_iter__(right_r, on_fields, where_template, presorted)
+        return self.__finish_join__(joined, project_fields, limit, offset).rows()
+
+    def __hash_join_iter__(self, right_r, on_fields, where_template=None):
+        """
+        :return: Operator yielding the row id pairs of a build/probe hash join, see execute_hash_join, and the
+            left and right tables.
+        """
+        # select before join, then build the hash table on the smaller input and stream the other one
+        left_t, right_t, residual_t = self.__split_join_template__(right_r, on_fields, where_template)
+        left_ids = self.__select_ids_for_join__(left_t)
+        right_ids = right_r.__select_ids_for_join__(right_t)
+        if len(left_ids) <= len(right_ids):
+            pairs = CSVOperators.HashJoin(self, left_ids, right_r, right_ids, on_fields, build_left=True)
+        else:
+            pairs = CSVOperators.HashJoin(right_r, right_ids, self, left_ids, on_fields, build_left=False)
+        pairs = CSVOperators.PairSelect(pairs, self, right_r, self.__compile_join_template__(right_r, residual_t))
+        return pairs, self, right_r
+
+    def __get_join_memory_budget__(self):
+        return self.join_memory_budget if self.join_memory_budget is not None else join_memory_budget
+
+    def __grace_join_iter__(self, right_r, on_fields, where_template=None):
+        """
+        :return: Operator yielding the row id pairs of a hash join that partitions its inputs into spill files
+            when its hash table would exceed the memory budget, see CSVOperators.GraceHashJoin, and the left and
+            right tables.
+        """
+        left_t, right_t, residual_t = self.__split_join_template__(right_r, on_fields, where_template)
+        left_ids = self.__select_ids_for_join__(left_t)
+        right_ids = right_r.__select_ids_for_join__(right_t)
+        budget = self.__get_join_memory_budget__()
+        directory = self.spill_dir if self.spill_dir is not None else spill_dir
+        if len(left_ids) <= len(right_ids):
+            pairs = CSVOperators.GraceHashJoin(self, left_ids, right_r, right_ids, on_fields, True, budget,
+                                               directory)
+        else:
+            pairs = CSVOperators.GraceHashJoin(right_r, right_ids, self, left_ids, on_fields, False, budget,
+                                               directory)
+        pairs = CSVOperators.PairSelect(pairs, self, right_r, self.__compile_join_template__(right_r, residual_t))
+        return pairs, self, right_r
+
+    def execute_hash_join(self, right_r, on_fields, where_template=None, project_fields=None, limit=None,
+                          offset=None):
+        """
+        Implements a JOIN on two CSV Tables as a build/probe hash join. Support equi-join only on a list of common
+        columns names. Does not need an index on either table.
+        :param right_r: The right table, or second input table.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param where_template: Select template to apply to the result to determine what to return.
+        :param project_fields: List of fields to return from the result.
+        :param limit: Max number of rows to return. The probe phase stops once offset + limit rows matched.
+        :param offset: Offset into the result.
+        :return: List of dictionary elements, each representing a row.
+        """
+        joined = self.__hash_join_iter__(right_r, on_fields, where_template)
+        return self.__finish_join__(joined, project_fields, limit, offset).rows()
+
+    def join_iter(self, right_r, on_fields, where_template=None, project_fields=None, optimize=True,
+                  method=None, presorted=None, limit=None, offset=None):
+        """
+        Streaming version of join. Takes the same parameters.
+        :return: A CSVOperators.Operator that yields the rows of the join when iterated over.
+        """
+        joined = self.__join_pairs__(right_r, on_fields, where_template, optimize, method, presorted)
+        return self.__finish_join__(joined, project_fields, limit, offset)
+
+    def __join_pairs__(self, right_r, on_fields, where_template=None, optimize=True, method=None, presorted=None):
+        """
+        Chooses the join method, see join.
+        :return: Operator yielding the (left row id, right row id) pairs that satisfy the where template, the left
+            table and the right table, as returned by the __*_join_iter__ methods.
+        """
+        if method is not None and method not in join_methods:
+            raise ValueError("Invalid join method.")
+        if presorted is None:
+            presorted = (False, False)
+
         # If no optimizations are possible, do a simple nested loop join and then apply where_clause and
         # project clause to result.
         #
         # At least two vastly different optimizations are be possible. You should figure out two different optimizations
         # and implement them.
         #
-        # if either table has indexes or there is a 'where' condition, do optimized join
-        _, s_max = self.__get_access_path__(on_fields)
-        _, r_max = right_r.__get_access_path__(on_fields)
-        if optimize and ((s_max > 0 or rr_max > 0) or where_template is not None):
-            result = self.execute_smart_join(right_r, on_fields, where_template=where_template, \
-                project_fields=project_fields, idx_selectivities=(s_max,r_max))
+        # The cost model (see __plan_join__) chooses between a hash join, a merge join and an index nested
+        # loop join on either table's index, based on the statistics collected by analyze(). A hash join whose
+        # hash table would not fit in the join memory budget spills to disk.
+        if method is None and optimize:
+            method, swap, _ = self.__plan_join__(right_r, on_fields, where_template, presorted)
+        else:
+            # probe whichever table has an index on the join columns, preferring the right one
+            swap = right_r.__get_access_path__(on_fields)[0] is None and \
+                self.__get_access_path__(on_fields)[0] is not None
+
+        if method == "index":
+            joined = self.__smart_join_iter__(right_r, on_fields, where_template, swap)
+        elif method == "hash":
+            joined = self.__hash_join_iter__(right_r, on_fields, where_template)
+        elif method == "merge":
+            joined = self.__merge_join_iter__(right_r, on_fields, where_template, presorted)
+        elif method == "grace":
+            joined = self.__grace_join_iter__(right_r, on_fields, where_template)
         else:
-            result = self.execute_slow_join(right_r, on_fields, where_template=where_template, project_fields=project_fields)
+            joined = self.__slow_join_iter__(right_r, on_fields, where_template)
+        return joined
+
+    def join_group_by(self, right_r, on_fields, group_fields, aggregates, where_template=None, optimize=True,
+                      method=None, presorted=None):
+        """
+        Aggregates the result of a join, like group_by on join(right_r, on_fields, where_template, ...) but
+        without building the joined rows: the join's pairs of row ids are streamed into the hash aggregation,
+        which reads the grouping and aggregated columns from the two tables.
+        :param right_r: The right table.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param group_fields: See group_by. A column of both tables takes its value from the right table.
+        :param aggregates: See group_by.
+        :return: List of dictionaries, one per group, see group_by.
+        """
+        def column_type(c):
+            return right_r.__get_column_type__(c) if c in right_r.__get_row_columns__() else \
+                self.__get_column_type__(c)
+
+        self.__check_aggregates__(aggregates, column_type)
+        pairs, left_r, right_r = self.__join_pairs__(right_r, on_fields, where_template, optimize, method, presorted)
+        aggregate = CSVOperators.HashAggregate(pairs, group_fields, aggregates)
+        aggregate.read = CSVOperators.pair_reader(left_r, right_r, aggregate.columns())
+        return list(aggregate)
+
+    def join(self, right_r, on_fields, where_template=None, project_fields=None, optimize=True,
+             method=None, presorted=None, limit=None, offset=None):
+        """
+        Implements a JOIN on two CSV Tables. Support equi-join only on a list of common
+        columns names.
+        :param left_r: The left table, or first input table
+        :param right_r: The right table, or second input table.
+        :param on_fields: A list of common fields used for the equi-join.
+        :param where_template: Select template to apply to the result to determine what to return.
+        :param project_fields: List of fields to return from the result.
+        :param method: One of join_methods to force a join method. If None, the method is chosen automatically.
+        :param presorted: Pair of booleans, True if the left or right table is known to be ordered on on_fields.
+            If both are, join() uses a merge join.
+        :param limit: Max number of rows to return. Every join method stops once offset + limit rows matched.
+        :param offset: Offset into the result.
+        :return: List of dictionary elements, each representing a row.
+        """
+        key, signature = None, None
+        if self.result_cache is not None:
+            key = self.__get_cache_key__("join", where_template, project_fields, tuple(on_fields), optimize,
+                                         method, None if presorted is None else tuple(presorted), limit, offset,
+                                         right_r=right_r)
+            signature = (self.__result_signature__(), right_r.__result_signature__())
+            if None in signature:
+                key = None
+        result = self.result_cache.get(key, signature) if key is not None else None
+
+        if result is None:
+            result = self.join_iter(right_r, on_fields, where_template, project_fields, optimize, method,
+                                    presorted, limit, offset).rows()
+            if key is not None:
+                self.result_cache.put(key, [self.__table_name__, right_r.name()], signature, result)
         return self.table_from_rows("JOIN(" + self.name() + "," + right_r.name() + ")", result)
-        
-        
+
+    def __multi_join_inputs__(self, others, joins):
+        """
+        Checks the tables and join conditions of a multi-way join, see multi_join.
+        :return: List of the tables, this table first, and list of (table position, table position, on_fields)
+            join conditions.
+        """
+        tables = [self] + list(others)
+        positions = {}
+        for k, t in enumerate(tables):
+            if t.name() in positions:
+                raise ValueError("Tables of a join must have different names.")
+            positions[t.name()] = k
+        conditions = []
+        for a, b, on_fields in joins:
+            if a not in positions or b not in positions or a == b:
+                raise ValueError("Invalid join condition between {} and {}.".format(a, b))
+            if not on_fields:
+                raise ValueError("Join condition between {} and {} has no columns.".format(a, b))
+            left_r, right_r = tables[positions[a]], tables[positions[b]]
+            for c in on_fields:
+                if not (left_r.__has_columns__([c]) and right_r.__has_columns__([c])):
+                    raise ValueError("Join column {} is not a column of {} and {}.".format(c, a, b))
+            # checks the types of the join columns
+            left_r.__split_join_template__(right_r, on_fields, None)
+            conditions.append((positions[a], positions[b], list(on_fields)))
+        return tables, conditions
+
+    def __split_multi_join_template__(self, tables, conditions, where_template):
+        """
+        Splits the where template of a multi-way join by table. Like {**row of the first table, **row of the
+        second table, ...}, a joined row takes a column from the last table that has it, so a conjunct is pushed
+        down to that table, and to the tables joined with it on the column, directly or through other tables,
+        since joined rows hold equal values for it.
+        :param tables: Tables of the join.
+        :param conditions: Join conditions, see __multi_join_inputs__.
+        :param where_template: Select template of the join.
+        :return: List of templates, one per table. Empty if a table has no conjuncts.
+        """
+        templates = [{} for t in tables]
+        if where_template is None:
+            return templates
+        columns = [t.__get_row_columns__() for t in tables]
+        for c, v in where_template.items():
+            owners = [k for k in range(len(tables)) if c in columns[k]]
+            if not owners:
+                raise CSVPredicate.invalid_template("Invalid column {} in join template".format(c))
+            reached = {owners[-1]}
+            extended = True
+            while extended:
+                extended = False
+                for a, b, on_fields in conditions:
+                    if c in on_fields and (a in reached) != (b in reached):
+                        reached.update((a, b))
+                        extended = True
+            for k in reached:
+                templates[k][c] = v
+        return templates
+
+    def __multi_join_sources__(self, conditions, joined, k):
+        """
+        :param conditions: Join conditions, see __multi_join_inputs__.
+        :param joined: Positions of the tables joined so far.
+        :param k: Position of the table to join next.
+        :return: List of (table position, column name) the columns of table k must equal, from the conditions
+            between table k and the tables joined so far.
+        """
+        sources = []
+        for a, b, on_fields in conditions:
+            if a == k and b in joined:
+                sources.extend([(b, c) for c in on_fields])
+            elif b == k and a in joined:
+                sources.extend([(a, c) for c in on_fields])
+        return sources
+
+    def __distinct_count__(self, columns):
+        """
+        :param columns: List of column names.
+        :return: Estimated number of distinct combinations of values of the columns: the number of keys of an
+            index on these columns if there is one, else the product of their distinct counts, see
+            __get_statistics__, at most the number of rows. A column without statistics counts as unique.
+        """
+        n = max(self.__row_count__(), 1)
+        for idx_name, index in self.idxs.items():
+            if set(self.__description__["indexes"][idx_name]["columns"]) == set(columns):
+                return max(len(index), 1)
+        stats = self.__get_statistics__()
+        result = 1
+        for c in set(columns):
+            column_statistics = stats.columns.get(c)
+            if column_statistics is not None and column_statistics.distinct_count:
+                result *= column_statistics.distinct_count
+            else:
+                result *= n
+        return min(result, n)
+
+    def __plan_multi_join__(self, tables, conditions, templates):
+        """
+        Cost based choice of the join order of a multi-way join and of the method of each step. Dynamic
+        programming over the sets of joined tables finds the cheapest left-deep plan that only joins tables
+        connected by a join condition to the tables joined before them. Each step either builds a hash table on the
+        selected rows of the next table and probes it with the tuples joined so far, or probes an index of the next
+        table on the join columns once per tuple. The number of tuples a step produces is estimated from the
+        distinct counts of the join columns, see __distinct_count__.
+        :param tables: Tables of the join.
+        :param conditions: Join conditions, see __multi_join_inputs__.
+        :param templates: Templates pushed down to the tables, see __split_multi_join_template__.
+        :return: (order, methods, cost). order is the list of table positions in join order, and methods[j] is
+            "hash" or "index" for the step joining order[j], None for order[0].
+        """
+        inputs = [t.__join_input_cost__(templates[k]) for k, t in enumerate(tables)]
+        distinct_counts = {}
+
+        def distinct_count(k, columns):
+            key = (k, tuple(sorted(set(columns))))
+            if key not in distinct_counts:
+                distinct_counts[key] = min(tables[k].__distinct_count__(columns), max(inputs[k][0], 1))
+            return distinct_counts[key]
+
+        def steps(joined, rows, k):
+            # (method, cost, result rows) of joining table k to the tuples of the joined tables
+            sources = self.__multi_join_sources__(conditions, joined, k)
+            if not sources:
+                return []
+            selectivity = 1.0
+            by_table = {}
+            for a, c in sources:
+                by_table.setdefault(a, []).append(c)
+            for a, columns in by_table.items():
+                selectivity /= max(distinct_count(a, columns), distinct_count(k, columns))
+            k_rows, k_cost = inputs[k]
+            result_rows = rows * k_rows * selectivity
+
+            result = [("hash", k_cost + (k_rows + rows) * hash_row_cost, result_rows)]
+            columns = [c for _, c in sources]
+            index, rows_per_key = tables[k].__get_access_path__(columns)
+            if index is not None:
+                probe_cost = tables[k].__lookup_cost__(index, rows_per_key)
+                idx_cols = tables[k].get_description()["indexes"][index]["columns"]
+                if templates[k] or tables[k].__get_prefix_length__(idx_cols, columns) < len(columns):
+                    probe_cost += rows_per_key * scan_row_cost
+                result.append(("index", rows * probe_cost, result_rows))
+            return result
+
+        plans = {frozenset([k]): (inputs[k][1], inputs[k][0], [k], [None]) for k in range(len(tables))}
+        for _ in range(1, len(tables)):
+            extended = {}
+            for joined, (cost, rows, order, methods) in plans.items():
+                for k in range(len(tables)):
+                    if k in joined:
+                        continue
+                    for method, step_cost, result_rows in steps(joined, rows, k):
+                        key = joined | {k}
+                        if key not in extended or cost + step_cost < extended[key][0]:
+                            extended[key] = (cost + step_cost, result_rows, order + [k], methods + [method])
+            plans = extended
+
+        if not plans:
+            raise ValueError("Tables of a join must be connected by join conditions.")
+        cost, _, order, methods = plans[frozenset(range(len(tables)))]
+        return order, methods, cost
+
+    def plan_multi_join(self, others, joins, where_template=None):
+        """
+        :return: The plan multi_join chooses for these parameters, as a list of (table name, method) in join order
+            and the estimated cost, see __plan_multi_join__.
+        """
+        tables, conditions = self.__multi_join_inputs__(others, joins)
+        templates = self.__split_multi_join_template__(tables, conditions, where_template)
+        order, methods, cost = self.__plan_multi_join__(tables, conditions, templates)
+        return [(tables[k].name(), method) for k, method in zip(order, methods)], cost
+
+    def multi_join_iter(self, others, joins, where_template=None, project_fields=None, limit=None, offset=None):
+        """
+        Streaming version of multi_join. Takes the same parameters.
+        :return: A CSVOperators.Operator that yields the rows of the join when iterated over.
+        """
+        tables, conditions = self.__multi_join_inputs__(others, joins)
+        templates = self.__split_multi_join_template__(tables, conditions, where_template)
+        order, methods, _ = self.__plan_multi_join__(tables, conditions, templates)
+
+        # Steps pass tuples of row ids, one per table in join order, to the next step. No rows are built until
+        # the final projection.
+        first = order[0]
+        tuples = zip(tables[first].__select_ids_for_join__(templates[first]))
+        for j in range(1, len(order)):
+            k = order[j]
+            joined = order[:j]
+            sources = [(joined.index(a), c) for a, c in self.__multi_join_sources__(conditions, joined, k)]
+            joined_tables = [tables[a] for a in joined]
+            if methods[j] == "index":
+                tuples = CSVOperators.TupleIndexJoin(tuples, joined_tables, tables[k], sources,
+                                                     tables[k].__compile_template__(templates[k]))
+            else:
+                tuples = CSVOperators.TupleHashJoin(tuples, joined_tables, tables[k],
+                                                    tables[k].__select_ids_for_join__(templates[k]), sources)
+
+        columns = [t.__get_row_columns__() for t in tables]
+        if project_fields is None:
+            project_fields = list(dict.fromkeys([c for cs in columns for c in cs]))
+        project = []
+        for f in project_fields:
+            owners = [k for k in range(len(tables)) if f in columns[k]]
+            if not owners:
+                raise DataTableExceptions.DataTableException(-2, "Invalid field in project")
+            project.append((f, order.index(owners[-1])))
+        page = CSVOperators.Limit(tuples, *page_bounds(limit, offset))
+        return CSVOperators.TupleProject(page, [tables[k] for k in order], project)
+
+    def multi_join(self, others, joins, where_template=None, project_fields=None, limit=None, offset=None):
+        """
+        Implements a JOIN of several CSV Tables, e.g. people, batting and teams with
+        people.multi_join([batting, teams], [("people", "batting", ["playerID"]),
+        ("batting", "teams", ["teamID", "yearID"])]). Unlike chaining join() calls, no intermediate table is built:
+        the join order and the method of each step are chosen by the cost model, see __plan_multi_join__, and the
+        steps stream tuples of row ids into each other. Like {**row of this table, **row of others[0], ...}, a
+        joined row takes a column from the last table that has it.
+        :param others: List of the other tables. All tables must have different names.
+        :param joins: List of (table name, table name, on_fields) equi-join conditions. Every table must be
+            connected to the others by join conditions.
+        :param where_template: Select template to apply to the result to determine what to return.
+        :param project_fields: List of fields to return from the result.
+        :param limit: Max number of rows to return. The join stops once offset + limit rows matched.
+        :param offset: Offset into the result.
+        :return: Derived table holding the joined rows.
+        """
+        result = self.multi_join_iter(others, joins, where_template, project_fields, limit, offset).rows()
+        name = "JOIN(" + ",".join([self.name()] + [t.name() for t in others]) + ")"
+        return self.table_from_rows(name, result)
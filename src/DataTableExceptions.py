@@ -2,8 +2,10 @@ class DataTableException(Exception):
 
     invalid_column_definition   =   -100
     duplicate_table_name        =   -101
+    duplicate_key               =   -102
     not_implemented             =   -200
     invalid_file                =   -300
+    invalid_template            =   -400
 
     def __init__(self, code=None, message=None, ex=None):
         self.code = code
@@ -0,0 +1,130 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def csv_rows(fn):
+    with open(fn, newline="") as f:
+        return list(csv.DictReader(f))
+
+def test_analyze():
+    """
+    Collects statistics on the batting table and shows how the cost model uses them to choose access paths
+    and join methods.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_analyze")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("h_idx", "ORDERED", ['H'])
+
+    people_tbl = CSVTable.CSVTable("people")
+    batting_tbl = CSVTable.CSVTable("batting")
+
+    start_time = time.time()
+    people_tbl.analyze()
+    stats = batting_tbl.analyze()
+    end_time = time.time()
+    print("Elapsed time for analyze = ", end_time - start_time)
+    print("Batting row count = ", stats.row_count)
+    for c in stats.columns.values():
+        print("Column", c.column_name, ": distinct =", c.distinct_count, ", null fraction =", c.null_fraction,
+              ", histogram =", c.histogram)
+
+    batting = csv_rows(data_dir + "Batting.csv")
+    assert stats.row_count == len(batting)
+    for c in stats.columns.values():
+        values = [r[c.column_name] for r in batting]
+        assert c.distinct_count == len(set(values)), c.column_name
+        assert c.null_fraction == 0.0
+        assert c.histogram == sorted(c.histogram)
+
+    # Statistics are stored in the catalog, a new instance of the table finds them there.
+    batting_tbl = CSVTable.CSVTable("batting")
+    stored = batting_tbl.__get_statistics__()
+    assert stored.columns["H"].distinct_count == stats.columns["H"].distinct_count
+    assert stored.columns["H"].histogram == stats.columns["H"].histogram
+
+    h_over_10 = len([r for r in batting if int(r["H"]) > 10])
+    for tmp, expected_index, expected_rows in [({"H": {">": 250}}, "h_idx", 0),
+                                               ({"H": {">": 10}}, "h_idx", h_over_10),
+                                               ({"playerID": "willite01", "H": {">": 100}}, "pid_idx", None)]:
+        access_index, range_predicate, cost, rows = batting_tbl.__plan_access__(batting_tbl.__compile_template__(tmp))
+        print("Template", json.dumps(tmp), "uses index", access_index, ", estimated rows =", rows, ", cost =", cost)
+        assert access_index == expected_index
+        if expected_rows is not None:
+            # the histogram estimate is within 5% of the table
+            assert abs(rows - expected_rows) <= 0.05 * len(batting)
+
+    people_ids = set([r["playerID"] for r in csv_rows(data_dir + "People.csv")])
+
+    for tmp, expected_method in [(None, "hash"), ({"playerID": "willite01"}, "index")]:
+        method, swap, cost = people_tbl.__plan_join__(batting_tbl, ['playerID'], tmp)
+        start_time = time.time()
+        join_result = people_tbl.join(batting_tbl, ['playerID'], where_template=tmp, \
+            project_fields=["playerID", "nameLast", "yearID", "H"])
+        end_time = time.time()
+        print("Join with where template", json.dumps(tmp), "uses", method, "join, cost =", cost, \
+            ", rows =", len(join_result.get_row_list()), ", elapsed time = ", end_time - start_time)
+        assert method == expected_method
+        assert len(join_result.get_row_list()) == len([r for r in batting if r["playerID"] in people_ids and
+                                                       (tmp is None or r["playerID"] == tmp["playerID"])])
+
+    # Merging inputs known to be sorted needs neither a sort nor a hash table.
+    plan = people_tbl.__plan_join__(batting_tbl, ['playerID'], None, presorted=(True, True))
+    print("Join of presorted inputs uses", plan[0], "join, cost =", plan[2])
+    assert plan[0] == "merge"
+    assert people_tbl.__plan_join__(batting_tbl, ['playerID'], None)[0] != "merge"
+
+    print_test_separator("Complete test_analyze")
+
+
+test_analyze()
@@ -0,0 +1,111 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def run_lookups(tbl, templ, tries, scan=False):
+    fields = ['playerID', 'birthCountry', 'throws', 'bats']
+    start_time = time.time()
+    for i in range(0, tries):
+        if scan:
+            result = tbl.__find_by_template_scan__(templ, fields)
+        else:
+            result = tbl.find_by_template(templ, fields)
+    end_time = time.time()
+    if scan:
+        access_index = "scan"
+    else:
+        access_index, _ = tbl.__get_template_access_path__(tbl.__compile_template__(templ))
+    print("Template = ", json.dumps(templ), ", rows = ", len(result), ", access path = ", access_index)
+    print("Elapsed time for ", tries, "lookups = ", end_time - start_time)
+    return result, access_index
+
+def test_bitmap_index():
+    """
+    Answers templates on several low cardinality columns with an intersection of BITMAP indexes, and compares
+    the results and times with a scan.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_bitmap_index")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("bats", column_type="text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+
+    templates = [{"birthCountry": "USA", "throws": "L", "bats": "L"},
+                 {"birthCountry": {"in": ["CAN", "D.R."]}, "throws": "L"},
+                 {"throws": "L", "bats": "B", "birthYear": {">": 1980}},
+                 {"birthCountry": "Germany"}]
+    t.define_index("country_idx", "BITMAP", ['birthCountry'])
+    t.define_index("throws_idx", "BITMAP", ['throws'])
+    t.define_index("bats_idx", "BITMAP", ['bats'])
+    t.define_index("by_idx", "ORDERED", ['birthYear'])
+
+    with open(data_dir + "People.csv", newline="") as f:
+        people = list(csv.DictReader(f))
+    tests = [lambda r: r["birthCountry"] == "USA" and r["throws"] == "L" and r["bats"] == "L",
+             lambda r: r["birthCountry"] in ("CAN", "D.R.") and r["throws"] == "L",
+             lambda r: r["throws"] == "L" and r["bats"] == "B" and r["birthYear"] != "" and int(r["birthYear"]) > 1980,
+             lambda r: r["birthCountry"] == "Germany"]
+    # templates with two selective columns intersect their BITMAP indexes
+    access_paths = [None, [("country_idx", "birthCountry"), ("throws_idx", "throws")],
+                    [("throws_idx", "throws"), ("bats_idx", "bats")], "country_idx"]
+
+    results = {}
+    for storage in ("row", "column"):
+        tbl = CSVTable.CSVTable("people", storage=storage, snapshot=False)
+        for scan in (True, False):
+            print("\n" + ("Scan" if scan else "BITMAP indexes"), "with", storage, "storage:")
+            for templ, access_path in zip(templates, access_paths):
+                result, access_index = run_lookups(tbl, templ, 20, scan)
+                results.setdefault(str(templ), []).append(result)
+                if not scan and access_path is not None:
+                    assert access_index == access_path, access_index
+
+    print("\nResults are equal:", all([r == rs[0] for rs in results.values() for r in rs]))
+    assert all([r == rs[0] for rs in results.values() for r in rs])
+    for templ, test in zip(templates, tests):
+        expected = sorted([r["playerID"] for r in people if test(r)])
+        assert len(expected) > 0 and sorted([r["playerID"] for r in results[str(templ)][0]]) == expected
+
+    try:
+        t.define_index("bad_idx", "BITMAP", ['throws', 'bats'])
+        raise AssertionError("INCORRECT: multi-column BITMAP index should fail.")
+    except ValueError as e:
+        print("Multi-column BITMAP index failed with e = ", e)
+
+    print_test_separator("Complete test_bitmap_index")
+
+
+test_bitmap_index()
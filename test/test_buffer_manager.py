@@ -0,0 +1,105 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import CSVBufferManager
+
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def test_buffer_manager():
+    """
+    Gets tables from a table manager with a memory budget that only fits one of them, and checks that tables are
+    shared while they are held and loaded again after they have been dropped.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_buffer_manager")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("name", "text", True))
+    t = cat.create_table(
+        "teams",
+        data_dir + "Teams.csv",
+        cds)
+    t.define_index("team_year_idx", "INDEX", ['teamID', 'yearID'])
+
+    people = CSVTable.CSVTable("people")
+    teams = CSVTable.CSVTable("teams")
+    print("Estimated memory of people =", people.memory_size(), ", of teams =", teams.memory_size())
+
+    manager = CSVBufferManager.TableManager(memory_budget=people.memory_size() + teams.memory_size() // 2)
+
+    start_time = time.time()
+    first = manager.get_table("people")
+    end_time = time.time()
+    print("First get_table of people took", end_time - start_time, "seconds.")
+
+    start_time = time.time()
+    second = manager.get_table("people")
+    end_time = time.time()
+    print("Second get_table of people took", end_time - start_time, "seconds, same table:", first is second)
+    assert first is second
+
+    print("A column subset is served by the held table:", manager.get_table("people", ["playerID"]) is first)
+    assert manager.get_table("people", ["playerID"]) is first
+
+    manager.get_table("teams")
+    print("Held tables after getting teams:", manager.table_names(), ", memory used =", manager.memory_used(), \
+        ", budget =", manager.memory_budget)
+    # both tables do not fit in the budget, the least recently used one was dropped
+    assert manager.table_names() == ["teams"] and manager.memory_used() <= manager.memory_budget
+
+    third = manager.get_table("people")
+    print("people was loaded again:", third is not first, ", held tables:", manager.table_names())
+    print("Hits =", manager.hits, ", misses =", manager.misses, ", evictions =", manager.evictions)
+    print("Results are equal:", third.find_by_template({"nameLast": "Williams"}) == \
+        people.find_by_template({"nameLast": "Williams"}))
+    assert third is not first and manager.table_names() == ["people"]
+    assert (manager.hits, manager.misses, manager.evictions) == (3, 3, 2)
+    result = third.find_by_template({"nameLast": "Williams"})
+    assert len(result) > 0 and result == people.find_by_template({"nameLast": "Williams"})
+
+    cat.get_table("people").define_index("name_idx", "INDEX", ['nameLast'])
+    fourth = manager.get_table("people")
+    print("people was loaded again after an index was defined:", fourth is not third, ", indexes =",
+          list(fourth.idxs.keys()))
+    assert fourth is not third and "name_idx" in fourth.idxs
+    assert manager.get_table("people") is fourth
+
+    print_test_separator("Complete test_buffer_manager")
+
+
+test_buffer_manager()
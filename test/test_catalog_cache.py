@@ -0,0 +1,64 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("teams_cached", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def test_catalog_cache():
+    """
+    Drops and recreates a table through one catalog instance while another one has its definition cached. The
+    other instance must stop serving the old definition.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_catalog_cache")
+
+    first = CSVCatalog.CSVCatalog()
+    second = CSVCatalog.CSVCatalog()
+    first.create_table("teams_cached", data_dir + "Teams.csv",
+                       [CSVCatalog.ColumnDefinition("teamID", "text", True),
+                        CSVCatalog.ColumnDefinition("yearID", "number", True)])
+
+    t = second.get_table("teams_cached")
+    print("Columns seen by the second catalog =", t.column_names)
+    assert sorted(t.column_names) == ["teamID", "yearID"]
+    assert second.get_table("teams_cached") is t
+
+    first.drop_table("teams_cached")
+    try:
+        second.get_table("teams_cached")
+        raise AssertionError("INCORRECT: the dropped table is still served from the cache.")
+    except ValueError as e:
+        print("Getting the dropped table failed with e = ", e)
+
+    first.create_table("teams_cached", data_dir + "Teams.csv",
+                       [CSVCatalog.ColumnDefinition("teamID", "text", True),
+                        CSVCatalog.ColumnDefinition("W", "number")])
+    t = second.get_table("teams_cached")
+    print("Columns after the table was recreated =", t.column_names)
+    assert sorted(t.column_names) == ["W", "teamID"]
+
+    first.get_table("teams_cached").define_index("team_idx", "INDEX", ["teamID"])
+    t = second.get_table("teams_cached")
+    print("Indexes after one was added =", t.index_names)
+    assert t.index_names == ["team_idx"]
+
+    cleanup()
+    print_test_separator("Complete test_catalog_cache")
+
+
+test_catalog_cache()
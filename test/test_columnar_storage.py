@@ -0,0 +1,118 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+import tracemalloc
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def load_table(t_name, storage):
+    """
+    Loads a table and measures the memory it holds.
+    :return: Loaded table and number of bytes allocated while loading.
+    """
+    tracemalloc.start()
+    start_time = time.time()
+    tbl = CSVTable.CSVTable(t_name, storage=storage)
+    end_time = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Loaded", t_name, "with storage =", storage, "in", end_time - start_time, "seconds, memory =", current)
+    return tbl, current
+
+def csv_rows(fn):
+    with open(fn, newline="") as f:
+        return list(csv.DictReader(f))
+
+def time_scans(tbl, templ, tries):
+    start_time = time.time()
+    for i in range(0, tries):
+        result = tbl.find_by_template(templ, ['playerID', 'nameLast', 'nameFirst'])
+    end_time = time.time()
+    print("Elapsed time for", tries, "scans with storage =", tbl.__storage__, "=", end_time - start_time)
+    return result
+
+def test_columnar_storage():
+    """
+    Loads the people table with row and column storage and compares memory, scan time and results.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_columnar_storage")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("weight", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    print("People table metadata = \n", json.dumps(t.describe_table(), indent=2))
+
+    row_tbl, row_memory = load_table("people", "row")
+    col_tbl, col_memory = load_table("people", "column")
+    print("Column storage uses", round(100.0 * col_memory / row_memory, 1), "% of the memory of row storage.")
+    assert col_memory < row_memory
+    people = csv_rows(data_dir + "People.csv")
+
+    templ = {"nameFirst": "Ted"}
+    row_result = time_scans(row_tbl, templ, 100)
+    col_result = time_scans(col_tbl, templ, 100)
+    print("Sample result = ", json.dumps(col_result))
+    print("Scan results are equal:", row_result == col_result)
+    assert row_result == col_result
+    expected = [{"playerID": r["playerID"], "nameLast": r["nameLast"], "nameFirst": r["nameFirst"]}
+                for r in people if r["nameFirst"] == "Ted"]
+    assert sorted(col_result, key=lambda r: r["playerID"]) == sorted(expected, key=lambda r: r["playerID"])
+
+    templ = {"birthYear": "1918", "throws": "R"}
+    row_result = row_tbl.find_by_template(templ)
+    col_result = col_tbl.find_by_template(templ)
+    print("Scan results on number column are equal:", row_result == col_result)
+    assert row_result == col_result
+    assert sorted([r["playerID"] for r in col_result]) == \
+        sorted([r["playerID"] for r in people if r["birthYear"] == "1918" and r["throws"] == "R"])
+    assert len(col_result) > 0
+
+    templ = {"playerID": "willite01"}
+    row_result = row_tbl.find_by_template(templ)
+    col_result = col_tbl.find_by_template(templ)
+    print("Index results are equal:", row_result == col_result)
+    assert row_result == col_result
+    assert [r["nameLast"] for r in col_result] == ["Williams"]
+    print("Row lists are equal:", row_tbl.get_row_list() == col_tbl.get_row_list())
+    assert row_tbl.get_row_list() == col_tbl.get_row_list()
+    assert len(col_tbl.get_row_list()) == len(people)
+
+    print_test_separator("Complete test_columnar_storage")
+
+
+test_columnar_storage()
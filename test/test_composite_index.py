@@ -0,0 +1,84 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def test_composite_index_prefix():
+    """
+    Looks rows up through the leftmost columns of the (playerID, yearID, stint) primary key of batting,
+    and compares with a scan.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_composite_index_prefix")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("stint", "number", True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_primary_key(['playerID', 'yearID', 'stint'])
+    print("Batting table metadata = \n", json.dumps(t.describe_table(), indent=2))
+
+    batting_tbl = CSVTable.CSVTable("batting")
+    all_rows = batting_tbl.get_row_list()
+    print("Distinct keys per prefix of the primary key:", batting_tbl.idxs["PRIMARY"].prefix_counts)
+    with open(data_dir + "Batting.csv", newline="") as f:
+        batting = list(csv.DictReader(f))
+    # a player traded during a season has several stints in the same year
+    assert batting_tbl.idxs["PRIMARY"].prefix_counts == \
+        [1, len(set([r["playerID"] for r in batting])), len(set([(r["playerID"], r["yearID"]) for r in batting])),
+         len(set([(r["playerID"], r["yearID"], r["stint"]) for r in batting]))]
+
+    for tmp, expected_index in [({"playerID": "willite01"}, "PRIMARY"),
+                                ({"playerID": "willite01", "yearID": "1955"}, "PRIMARY"),
+                                ({"playerID": "willite01", "yearID": "1955", "stint": "1"}, "PRIMARY"),
+                                ({"yearID": "1955", "stint": "1"}, None)]:
+        access_index, _ = batting_tbl.__get_template_access_path__(batting_tbl.__compile_template__(tmp))
+        start_time = time.time()
+        for i in range(0, 100):
+            result = batting_tbl.find_by_template(tmp)
+        end_time = time.time()
+        scan_result = [r for r in all_rows if batting_tbl.matches_template(r, tmp)]
+        print("Template", json.dumps(tmp), "uses index", access_index, ", rows =", len(result), \
+            ", equal to scan:", result == scan_result, ", elapsed time for 100 lookups =", end_time - start_time)
+        # a prefix of the key can use the index, other columns cannot
+        assert access_index == expected_index
+        assert len(result) > 0 and result == scan_result
+        assert len(result) == len([r for r in batting if all([r[k] == v for k, v in tmp.items()])])
+
+    print_test_separator("Complete test_composite_index_prefix")
+
+
+test_composite_index_prefix()
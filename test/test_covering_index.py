@@ -0,0 +1,109 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def run_queries(label, f, tries):
+    start_time = time.time()
+    for i in range(0, tries):
+        result = f()
+    end_time = time.time()
+    print("    ", label, ": elapsed time for", tries, "queries =", end_time - start_time)
+    return result
+
+def test_covering_index():
+    """
+    Answers projections, counts and DISTINCT queries from indexes with included columns, and compares them with
+    the same queries answered from the rows.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_covering_index")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthState", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("country_idx", "INDEX", ['birthCountry', 'birthState'], include=['birthYear', 'nameLast'])
+    t.define_index("by_idx", "ORDERED", ['birthYear'], include=['playerID'])
+    print("Indexes = \n", json.dumps(t.describe_table()["indexes"], indent=2))
+
+    tbl = CSVTable.CSVTable("people", snapshot=False)
+    # Only a query with predicates left to check after the lookup reads the rows from the index.
+    queries = [({"birthCountry": "USA", "birthState": "CA"}, ['birthState', 'nameLast', 'birthYear'],
+                "country_idx", "IndexLookup"),
+               ({"birthCountry": "CAN", "birthYear": {">": 1970}}, ['nameLast'], "country_idx", "IndexOnlyLookup"),
+               ({"birthYear": {"between": [1950, 1955]}}, ['playerID', 'birthYear'], "by_idx", "IndexLookup"),
+               ({"birthCountry": "USA"}, ['birthState'], "country_idx", "IndexLookup")]
+    all_equal = True
+    for templ, fields, expected_index, expected_operator in queries:
+        print("Template = ", json.dumps(templ), ", fields = ", fields)
+        predicates = tbl.__compile_template__(templ)
+        access_index, range_predicate = tbl.__get_template_access_path__(predicates)
+        lookup = tbl.__index_lookup__(predicates, access_index, range_predicate, fields)
+        print("    Access path =", access_index, ", operator =", type(lookup).__name__)
+        assert access_index == expected_index and type(lookup).__name__ == expected_operator
+
+        scan = run_queries("Scan", lambda: tbl.__find_by_template_scan__(templ, fields), 20)
+        result = run_queries("Find by template", lambda: tbl.find_by_template(templ, fields), 20)
+        count = run_queries("Count from index", lambda: tbl.count_by_template(templ), 20)
+        distinct = run_queries("Distinct from index", lambda: tbl.find_distinct_by_template(templ, fields), 20)
+        exists = tbl.exists_by_template(templ)
+        distinct_scan = {tuple(r.items()) for r in scan}
+        equal = (result == scan and count == len(scan) and exists == (len(scan) > 0) and
+                 len(distinct) == len(distinct_scan) and all([tuple(r.items()) in distinct_scan for r in distinct]))
+        print("    Rows =", len(result), ", count =", count, ", distinct =", len(distinct), ", equal =", equal)
+        all_equal = all_equal and equal
+        assert equal and len(result) > 0
+
+    print("\nDistinct countries from the index keys:")
+    distinct = run_queries("Distinct from index", lambda: tbl.find_distinct_by_template(None, ['birthCountry']), 20)
+    scan = run_queries("Distinct from rows", lambda: {r["birthCountry"] for r in tbl.find_by_template(None)}, 20)
+    print("    Countries =", len(distinct), ", equal =", {r["birthCountry"] for r in distinct} == scan)
+    assert len(distinct) == len(scan) and {r["birthCountry"] for r in distinct} == scan
+    exists = tbl.exists_by_template({"nameLast": "Williams", "birthYear": 2030})
+    print("Exists returned", exists, "for a Williams born in 2030.")
+    assert exists is False and tbl.exists_by_template({"nameLast": "Williams"}) is True
+
+    print("\nAll results are equal:", all_equal)
+
+    try:
+        t.define_index("bad_idx", "INDEX", ['birthCountry'], include=['birthCountry'])
+        raise AssertionError("INCORRECT: including an index column should fail.")
+    except ValueError as e:
+        print("Including an index column failed with e = ", e)
+
+    print_test_separator("Complete test_covering_index")
+
+
+test_covering_index()
@@ -0,0 +1,103 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import CSVStorage
+
+import csv
+import time
+import json
+import tracemalloc
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def load_table(t_name, storage):
+    """
+    Loads a table and measures the memory it holds.
+    :return: Loaded table and number of bytes allocated while loading.
+    """
+    tracemalloc.start()
+    start_time = time.time()
+    tbl = CSVTable.CSVTable(t_name, storage=storage, snapshot=False)
+    end_time = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Loaded", t_name, "with", storage, "storage in", end_time - start_time, "seconds, memory =", current)
+    return tbl, current
+
+def test_dictionary_encoding():
+    """
+    Loads the people table with and without dictionary encoding of its text columns, and compares memory,
+    query times and results.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_dictionary_encoding")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthState", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("bats", column_type="text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("country_idx", "INDEX", ['birthCountry'])
+
+    templates = [{"throws": "L", "bats": "R"}, {"birthState": {"in": ["CA", "NY"]}}, {"nameFirst": {">": "Z"}},
+                 {"birthCountry": "CAN"}]
+    with open(data_dir + "People.csv", newline="") as f:
+        people = list(csv.DictReader(f))
+    tests = [lambda r: r["throws"] == "L" and r["bats"] == "R", lambda r: r["birthState"] in ("CA", "NY"),
+             lambda r: r["nameFirst"] > "Z", lambda r: r["birthCountry"] == "CAN"]
+    results = {}
+    memory = {}
+    for max_ratio in (0.0, CSVStorage.dictionary_max_ratio):
+        saved_ratio = CSVStorage.dictionary_max_ratio
+        CSVStorage.dictionary_max_ratio = max_ratio
+        print("Text columns are encoded if at most", max_ratio, "of their values are distinct.")
+        for storage in ("row", "column"):
+            tbl, memory[(max_ratio, storage)] = load_table("people", storage)
+            for templ in templates:
+                start_time = time.time()
+                for i in range(10):
+                    result = tbl.find_by_template(templ, ['playerID'])
+                end_time = time.time()
+                print("    ", templ, "found", len(result), "rows 10 times in", end_time - start_time, "seconds.")
+                results.setdefault(str(templ), []).append(result)
+        CSVStorage.dictionary_max_ratio = saved_ratio
+
+    print("Results are equal:", all([r == rs[0] for rs in results.values() for r in rs]))
+    assert all([r == rs[0] for rs in results.values() for r in rs])
+    for templ, test in zip(templates, tests):
+        expected = sorted([r["playerID"] for r in people if test(r)])
+        assert len(expected) > 0 and sorted([r["playerID"] for r in results[str(templ)][0]]) == expected
+    for storage in ("row", "column"):
+        assert memory[(CSVStorage.dictionary_max_ratio, storage)] < memory[(0.0, storage)]
+
+    print_test_separator("Complete test_dictionary_encoding")
+
+
+test_dictionary_encoding()
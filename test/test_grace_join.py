@@ -0,0 +1,114 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import os
+import tempfile
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def spill_files(directory):
+    return sum([len(files) for _, _, files in os.walk(directory)])
+
+def test_grace_join():
+    """
+    Joins people and batting with a join memory budget far below the size of the hash table, so the join
+    partitions both inputs into spill files, and compares the result with an in-memory hash join.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_grace_join")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number"))
+    cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+
+    spill_dir = tempfile.mkdtemp(prefix="test_grace_join-")
+    people_tbl = CSVTable.CSVTable("people", join_memory_budget=256 * 1024, spill_dir=spill_dir)
+    batting_tbl = CSVTable.CSVTable("batting")
+    fields = ["playerID", "nameLast", "yearID", "teamID", "H"]
+
+    for where_template in (None, {"birthCountry": "USA", "teamID": "BOS"}):
+        print("Where template =", json.dumps(where_template))
+        start_time = time.time()
+        expected = people_tbl.join_iter(batting_tbl, ['playerID'], where_template, fields, method="hash").rows()
+        end_time = time.time()
+        print("    In-memory hash join: rows =", len(expected), ", elapsed time =", end_time - start_time)
+
+        start_time = time.time()
+        rows = people_tbl.join_iter(batting_tbl, ['playerID'], where_template, fields, method="grace")
+        result = []
+        spilled = None
+        for r in rows:
+            if not result:
+                spilled = spill_files(spill_dir)
+                print("    Spill files while the first row streams out =", spilled)
+            result.append(r)
+        end_time = time.time()
+        print("    Grace hash join: rows =", len(result), ", elapsed time =", end_time - start_time)
+        print("    Spill files after the join =", spill_files(spill_dir))
+
+        key = lambda r: json.dumps(r, sort_keys=True)
+        print("    Results are equal:", sorted(result, key=key) == sorted(expected, key=key))
+        assert len(result) > 0 and sorted(result, key=key) == sorted(expected, key=key)
+        if where_template is None:
+            # the hash table of every people row exceeds the budget, so partitions are written
+            assert spilled > 0
+        assert spill_files(spill_dir) == 0
+
+    print("\nStopping after 5 rows:")
+    rows = iter(people_tbl.join_iter(batting_tbl, ['playerID'], None, fields, method="grace"))
+    first_rows = [next(rows) for _ in range(5)]
+    print("    First rows =", json.dumps(first_rows[:2]))
+    rows.close()
+    print("    Spill files after closing the join =", spill_files(spill_dir))
+    assert len(first_rows) == 5 and spill_files(spill_dir) == 0
+
+    small_budget_method = people_tbl.__plan_join__(batting_tbl, ['playerID'])[0]
+    print("\nPlanned method with the small budget =", small_budget_method)
+    people_tbl.join_memory_budget = None
+    default_budget_method = people_tbl.__plan_join__(batting_tbl, ['playerID'])[0]
+    print("Planned method with the default budget =", default_budget_method)
+    # a hash table over the budget is never planned in memory
+    assert small_budget_method in ("grace", "merge") and default_budget_method == "hash"
+    os.rmdir(spill_dir)
+
+    print_test_separator("Complete test_grace_join")
+
+
+test_grace_join()
@@ -0,0 +1,161 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def group_in_python(rows, group_fields, aggregates):
+    """
+    Aggregates rows the way callers did before group_by existed, to check its results.
+    :return: Dictionary from group to the list of aggregate values.
+    """
+    groups = {}
+    for r in rows:
+        groups.setdefault(tuple([r[f] for f in group_fields]), []).append(r)
+    result = {}
+    for group, group_rows in groups.items():
+        values = []
+        for function, column in aggregates:
+            if column is None:
+                values.append(len(group_rows))
+                continue
+            vs = [r[column] for r in group_rows if r[column] is not None]
+            if function == "count":
+                values.append(len(vs))
+            elif function == "sum":
+                values.append(sum(vs) if vs else None)
+            elif function == "min":
+                values.append(min(vs) if vs else None)
+            elif function == "max":
+                values.append(max(vs) if vs else None)
+            else:
+                values.append(sum(vs) / len(vs) if vs else None)
+        result[group] = values
+    return result
+
+def same_groups(result, expected, group_fields, aggregates):
+    names = [k for k in result[0].keys() if k not in group_fields] if result else []
+    got = {tuple([r[f] for f in group_fields]): [r[n] for n in names] for r in result}
+    return len(result) == len(expected) and all([
+        g in got and len(got[g]) == len(v) and
+        all([(a == b if not isinstance(a, float) else abs(a - b) < 1e-9) for a, b in zip(got[g], v)])
+        for g, v in expected.items()])
+
+def run_group_by(tbl, group_fields, aggregates, where_template=None, tries=5):
+    start_time = time.time()
+    for i in range(0, tries):
+        result = tbl.group_by(group_fields, aggregates, where_template)
+    end_time = time.time()
+    print("Group by", group_fields, "aggregates", aggregates, "where", json.dumps(where_template))
+    print("    ", len(result), "groups, elapsed time for", tries, "queries =", end_time - start_time)
+    print("    Sample result =", json.dumps(result[:2]))
+    start_time = time.time()
+    for i in range(0, tries):
+        expected = group_in_python(tbl.find_by_template(where_template), group_fields, aggregates)
+    end_time = time.time()
+    print("    Aggregating in Python: elapsed time for", tries, "queries =", end_time - start_time)
+    equal = same_groups(result, expected, group_fields, aggregates)
+    print("    Results are equal:", equal)
+    assert len(result) > 0 and equal
+    return result
+
+def test_group_by():
+    """
+    Groups and aggregates the batting table, on its own and joined with the people table.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_group_by")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("R", "number"))
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("team_idx", "INDEX", ['teamID', 'yearID'])
+
+    batting_tbl = CSVTable.CSVTable("batting")
+    with open(data_dir + "Batting.csv", newline="") as f:
+        batting = list(csv.DictReader(f))
+    teams = set([r["teamID"] for r in batting])
+    years = [int(r["yearID"]) for r in batting]
+
+    result = run_group_by(batting_tbl, ['teamID'], [("count", None), ("sum", "AB")])
+    assert len(result) == len(teams)
+    result = run_group_by(batting_tbl, ['yearID'], [("sum", "H"), ("max", "R"), ("avg", "H"), ("count", "H")],
+                          {"yearID": {">=": 1955}})
+    assert sorted([r["yearID"] for r in result]) == sorted(set([y for y in years if y >= 1955]))
+    result = run_group_by(batting_tbl, [], [("count", None), ("min", "yearID"), ("max", "yearID")])
+    assert len(result) == 1 and list(result[0].values()) == [len(batting), min(years), max(years)]
+
+    print("\nCounts grouped on index columns are read from the index:")
+    result = run_group_by(batting_tbl, ['teamID'], [("count", None)])
+    assert sum([r["count(*)"] for r in result]) == len(batting)
+    result = run_group_by(batting_tbl, ['yearID'], [("count", None)], {"teamID": "BOS"})
+    assert sum([r["count(*)"] for r in result]) == len([r for r in batting if r["teamID"] == "BOS"])
+
+    print("\nAggregates of a join, without building the joined rows:")
+    people_tbl = CSVTable.CSVTable("people")
+    start_time = time.time()
+    result = people_tbl.join_group_by(batting_tbl, ['playerID'], ['birthCountry'], [("sum", "R"), ("count", None)],
+                                      {"teamID": "BOS"})
+    end_time = time.time()
+    print("    ", len(result), "groups, elapsed time =", end_time - start_time)
+    print("    Sample result =", json.dumps(result[:2]))
+    joined = people_tbl.join(batting_tbl, ['playerID'], {"teamID": "BOS"}).get_row_list()
+    equal = same_groups(result, group_in_python(joined, ['birthCountry'], [("sum", "R"), ("count", None)]),
+                        ['birthCountry'], [("sum", "R"), ("count", None)])
+    print("    Results are equal:", equal)
+    assert len(result) > 0 and equal
+
+    try:
+        batting_tbl.group_by(['yearID'], [("sum", "teamID")])
+        raise AssertionError("INCORRECT: sum of a text column should fail.")
+    except DataTableExceptions.DataTableException as e:
+        assert e.code == DataTableExceptions.DataTableException.invalid_template
+        print("Sum of a text column failed with e = ", e)
+
+    print_test_separator("Complete test_group_by")
+
+
+test_group_by()
@@ -0,0 +1,111 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def csv_rows(fn):
+    with open(fn, newline="") as f:
+        return list(csv.DictReader(f))
+
+def expected_join(where_template):
+    """
+    :return: The projected join of People.csv and Batting.csv on playerID, computed directly from the files.
+    """
+    names = {r["playerID"]: r["nameLast"] for r in csv_rows(data_dir + "People.csv")}
+    result = []
+    for r in csv_rows(data_dir + "Batting.csv"):
+        if r["playerID"] not in names:
+            continue
+        if where_template is not None and any([r.get(k) != v for k, v in where_template.items()]):
+            continue
+        result.append((r["playerID"], names[r["playerID"]], r["yearID"], int(r["H"]), int(r["AB"])))
+    return sorted(result)
+
+def test_hash_join(where_template=None):
+    """
+    Join tables that have no index on the join column. join() falls back to a hash join, which builds its hash
+    table on the smaller input after the where template has been pushed down.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_hash_join, where_template = " + json.dumps(where_template))
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCity", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    print("People table metadata = \n", json.dumps(t.describe_table(), indent=2))
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("stint", column_type="number", not_null=True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    print("Batting table metadata = \n", json.dumps(t.describe_table(), indent=2))
+
+    people_tbl = CSVTable.CSVTable("people")
+    batting_tbl = CSVTable.CSVTable("batting")
+
+    method, swap, cost = people_tbl.__plan_join__(batting_tbl, ['playerID'], where_template)
+    print("Planned join method =", method)
+    assert method == "hash"
+
+    start_time = time.time()
+
+    join_result = people_tbl.join(batting_tbl, ['playerID'], where_template=where_template, \
+        project_fields=["playerID", "nameLast", "yearID", "H", "AB"])
+
+    end_time = time.time()
+
+    print("Result = \n", join_result)
+    elapsed_time = end_time - start_time
+    print("\n\nElapsed time = ", elapsed_time)
+
+    result = sorted([(r["playerID"], r["nameLast"], r["yearID"], r["H"], r["AB"]) for r in join_result.get_row_list()])
+    assert len(result) > 0
+    assert result == expected_join(where_template)
+
+    print_test_separator("Complete test_hash_join")
+
+
+test_hash_join()
+test_hash_join({"playerID": "willite01"})
@@ -0,0 +1,99 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def test_join_pushdown():
+    """
+    Joins people and batting with where templates that reference columns of one or both tables, and checks
+    that every join method returns the same rows.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_join_pushdown")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("h_idx", "ORDERED", ['H'])
+
+    people_tbl = CSVTable.CSVTable("people")
+    batting_tbl = CSVTable.CSVTable("batting")
+    fields = ["playerID", "nameLast", "birthCountry", "yearID", "teamID", "H"]
+
+    # A predicate on a join column is pushed down to both tables.
+    for tmp, split in [({"nameLast": "Williams", "H": {">": 150}}, [{"nameLast": "Williams"}, {"H": {">": 150}}, {}]),
+                       ({"birthCountry": "D.R.", "teamID": "BOS"}, [{"birthCountry": "D.R."}, {"teamID": "BOS"}, {}]),
+                       ({"playerID": "willite01", "yearID": "1955"},
+                        [{"playerID": "willite01"}, {"playerID": "willite01", "yearID": "1955"}, {}])]:
+        print("Where template", json.dumps(tmp), "is split into",
+              json.dumps(people_tbl.__split_join_template__(batting_tbl, ['playerID'], tmp)))
+        assert list(people_tbl.__split_join_template__(batting_tbl, ['playerID'], tmp)) == split
+        results = []
+        for method in CSVTable.join_methods[1:]:
+            start_time = time.time()
+            join_result = people_tbl.join(batting_tbl, ['playerID'], where_template=tmp, \
+                project_fields=fields, method=method).get_row_list()
+            end_time = time.time()
+            print("Join method", method, ": rows =", len(join_result), ", elapsed time =", end_time - start_time)
+            results.append(sorted([json.dumps(r, sort_keys=True) for r in join_result]))
+        print("All join methods return the same rows:", all([r == results[0] for r in results]))
+        assert len(results[0]) > 0 and all([r == results[0] for r in results])
+
+    try:
+        people_tbl.join(batting_tbl, ['playerID'], where_template={"bogus": "x"})
+        raise AssertionError("INCORRECT: a column of neither table should fail.")
+    except DataTableExceptions.DataTableException as e:
+        assert e.code == DataTableExceptions.DataTableException.invalid_template
+        print("A column of neither table failed with e = ", e)
+
+    print_test_separator("Complete test_join_pushdown")
+
+
+test_join_pushdown()
@@ -0,0 +1,118 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import CSVOperators
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def test_limit_offset():
+    """
+    Pages through the result of selects and joins with limit and offset, and compares each page with the
+    full result.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_limit_offset")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("team_idx", "INDEX", ['teamID'])
+    t.define_index("h_idx", "ORDERED", ['H'])
+
+    people_tbl = CSVTable.CSVTable("people")
+    batting_tbl = CSVTable.CSVTable("batting")
+
+    with open(data_dir + "Batting.csv", newline="") as f:
+        batting = list(csv.DictReader(f))
+    fields = ["playerID", "yearID", "teamID", "H"]
+    for tmp, test in [(None, lambda r: True), ({"yearID": "1955"}, lambda r: r["yearID"] == "1955"),
+                      ({"teamID": "BOS"}, lambda r: r["teamID"] == "BOS"),
+                      ({"H": {">": 150}}, lambda r: int(r["H"]) > 150)]:
+        start_time = time.time()
+        full_result = batting_tbl.find_by_template(tmp, fields)
+        full_time = time.time() - start_time
+
+        start_time = time.time()
+        page = batting_tbl.find_by_template(tmp, fields, limit=10, offset=20)
+        page_time = time.time() - start_time
+
+        print("Template", json.dumps(tmp), ": rows =", len(full_result), ", page equals full result slice:",
+              page == full_result[20:30], ", elapsed time for all rows =", full_time, ", for the page =", page_time)
+        assert len(full_result) == len([r for r in batting if test(r)])
+        assert len(page) == 10 and page == full_result[20:30]
+        assert batting_tbl.find_by_template(tmp, fields, limit=10, offset=len(full_result)) == []
+
+    results = []
+    for method in CSVTable.join_methods[1:]:
+        full_result = people_tbl.join(batting_tbl, ['playerID'], where_template={"yearID": "1955"}, \
+            project_fields=fields, method=method).get_row_list()
+        start_time = time.time()
+        page = people_tbl.join(batting_tbl, ['playerID'], where_template={"yearID": "1955"}, \
+            project_fields=fields, method=method, limit=10, offset=5).get_row_list()
+        end_time = time.time()
+        print("Join method", method, ": page equals full result slice:", page == full_result[5:15], \
+            ", elapsed time for the page =", end_time - start_time)
+        assert len(page) == 10 and page == full_result[5:15]
+        results.append(sorted([json.dumps(r, sort_keys=True) for r in full_result]))
+    assert all([r == results[0] for r in results])
+
+    # A limit stops the lookup after the first small batch of rows.
+    fetched = []
+    get_rows_by_id = batting_tbl.__get_rows_by_id__
+    batting_tbl.__get_rows_by_id__ = lambda ids, fields: fetched.append(len(ids)) or get_rows_by_id(ids, fields)
+    for tmp in [{"teamID": "BOS"}, None]:
+        fetched.clear()
+        page = batting_tbl.find_by_template(tmp, fields, limit=1)
+        print("Template", json.dumps(tmp), "with limit 1 read", sum(fetched), "rows")
+        assert len(page) == 1 and sum(fetched) <= CSVOperators.first_batch_size
+    del batting_tbl.__get_rows_by_id__
+
+    print_test_separator("Complete test_limit_offset")
+
+
+test_limit_offset()
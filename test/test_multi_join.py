@@ -0,0 +1,124 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def as_set(rows):
+    return sorted([json.dumps(r, sort_keys=True) for r in rows])
+
+def run_multi_join(people, batting, teams, where_template, fields, first_table, tries=5):
+    joins = [("people", "batting", ["playerID"]), ("batting", "teams", ["teamID", "yearID"])]
+    plan, cost = people.plan_multi_join([batting, teams], joins, where_template)
+    print("Where", json.dumps(where_template))
+    print("    Plan =", plan, ", estimated cost =", int(cost))
+    # the most selective template drives the join, every table is joined once
+    assert plan[0] == (first_table, None)
+    assert sorted([t for t, method in plan]) == ["batting", "people", "teams"]
+    start_time = time.time()
+    for i in range(0, tries):
+        result = people.multi_join([batting, teams], joins, where_template, fields).get_row_list()
+    end_time = time.time()
+    print("    Multi-way join:", len(result), "rows, elapsed time for", tries, "queries =", end_time - start_time)
+
+    start_time = time.time()
+    for i in range(0, tries):
+        chained = people.join(batting, ['playerID']).join(teams, ['teamID', 'yearID'], where_template, fields)
+        chained = chained.get_row_list()
+    end_time = time.time()
+    print("    Chained joins:", len(chained), "rows, elapsed time for", tries, "queries =", end_time - start_time)
+    print("    Sample result =", json.dumps(result[:2]))
+    equal = as_set(result) == as_set(chained)
+    print("    Results are equal:", equal)
+    assert len(result) > 0 and equal
+
+def test_multi_join():
+    """
+    Joins the people, batting and teams tables in the order the cost model chooses, and compares the results with
+    chained two table joins.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_multi_join")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number"))
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("name", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("W", "number"))
+    t = cat.create_table(
+        "teams",
+        data_dir + "Teams.csv",
+        cds)
+    t.define_index("team_year_idx", "INDEX", ['teamID', 'yearID'])
+
+    people = CSVTable.CSVTable("people")
+    batting = CSVTable.CSVTable("batting")
+    teams = CSVTable.CSVTable("teams")
+    run_multi_join(people, batting, teams, {"nameLast": "Williams"},
+                   ['playerID', 'nameFirst', 'yearID', 'name', 'H'], "people")
+    run_multi_join(people, batting, teams, {"teamID": "BOS", "W": {">": 85}},
+                   ['playerID', 'nameLast', 'name', 'W'], "teams")
+    run_multi_join(people, batting, teams, {"birthCountry": "CAN", "W": {">": 80}}, None, "people")
+
+    print("\nFirst rows of the join, without joining every row:")
+    start_time = time.time()
+    result = batting.multi_join([people, teams], [("batting", "people", ["playerID"]),
+                                                 ("teams", "batting", ["teamID", "yearID"])], limit=5)
+    end_time = time.time()
+    print("    ", len(result.get_row_list()), "rows, elapsed time =", end_time - start_time)
+    assert len(result.get_row_list()) == 5
+
+    try:
+        people.multi_join([batting, teams], [("people", "batting", ["playerID"])])
+        raise AssertionError("INCORRECT: a table without a join condition should fail.")
+    except ValueError as e:
+        print("A table without a join condition failed with e = ", e)
+
+    print_test_separator("Complete test_multi_join")
+
+
+test_multi_join()
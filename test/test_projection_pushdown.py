@@ -0,0 +1,103 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import time
+import json
+import tracemalloc
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def load_table(t_name, columns):
+    """
+    Loads a table and measures the memory it holds.
+    :return: Loaded table and number of bytes allocated while loading.
+    """
+    tracemalloc.start()
+    start_time = time.time()
+    tbl = CSVTable.CSVTable(t_name, columns=columns)
+    end_time = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Loaded", t_name, "with columns =", columns, "in", end_time - start_time, "seconds, memory =", current)
+    return tbl, current
+
+def test_projection_pushdown():
+    """
+    Loads the people table with all catalogued columns and with only the columns a query needs, and compares
+    memory and results.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_projection_pushdown")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("weight", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("country_idx", "INDEX", ['birthCountry'])
+
+    templ = {"nameLast": "Williams"}
+    fields = ['playerID', 'nameFirst']
+    columns = CSVTable.query_columns(templ, fields)
+    print("Columns needed by the query:", columns)
+    assert sorted(columns) == ["nameFirst", "nameLast", "playerID"]
+
+    full_tbl, full_memory = load_table("people", None)
+    narrow_tbl, narrow_memory = load_table("people", columns)
+    print("Loading only the needed columns uses", round(100.0 * narrow_memory / full_memory, 1), \
+        "% of the memory.")
+    print("Indexes built for the full table:", list(full_tbl.idxs.keys()), ", for the narrow table:", \
+        list(narrow_tbl.idxs.keys()))
+    print("Results are equal:", full_tbl.find_by_template(templ, fields) == narrow_tbl.find_by_template(templ, fields))
+    assert narrow_memory < full_memory
+    # only indexes on loaded columns are built
+    assert list(full_tbl.idxs.keys()) == ["pid_idx", "country_idx"] and list(narrow_tbl.idxs.keys()) == ["pid_idx"]
+    result = narrow_tbl.find_by_template(templ, fields)
+    assert len(result) > 0 and result == full_tbl.find_by_template(templ, fields)
+    assert sorted(narrow_tbl.get_row_list()[0].keys()) == sorted(columns)
+
+    for f, code in [(lambda: narrow_tbl.find_by_template({"birthCountry": "USA"}, fields),
+                     DataTableExceptions.DataTableException.invalid_template),
+                    (lambda: narrow_tbl.find_by_template(templ, ['playerID', 'throws']), -2)]:
+        try:
+            f()
+            print("INCORRECT: a column that was not loaded should fail.")
+            assert False
+        except DataTableExceptions.DataTableException as e:
+            assert e.code == code
+            print("A column that was not loaded failed with e = ", e)
+
+    print_test_separator("Complete test_projection_pushdown")
+
+
+test_projection_pushdown()
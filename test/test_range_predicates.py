@@ -0,0 +1,112 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import csv
+import time
+import json
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+
+def expected_ids(test):
+    """
+    :return: Sorted playerIDs of the rows of People.csv for which test(row) is true.
+    """
+    with open("../data/People.csv", newline="") as f:
+        return sorted([r["playerID"] for r in csv.DictReader(f) if test(r)])
+
+def birth_year(r):
+    return int(r["birthYear"]) if r["birthYear"] != "" else None
+
+def check_lookup(tbl, templ, index_name, test):
+    """
+    Runs a lookup and checks the index it uses and the rows it returns.
+    """
+    result = run_lookups(tbl, templ, 100)
+    access_index = tbl.__plan_access__(tbl.__compile_template__(templ))[0]
+    assert access_index == index_name, access_index
+    ids = expected_ids(test)
+    assert len(ids) > 0
+    assert sorted([r["playerID"] for r in result]) == ids
+    return result
+
+def run_lookups(tbl, templ, tries):
+    start_time = time.time()
+    for i in range(0, tries):
+        result = tbl.find_by_template(templ, ['playerID', 'nameLast', 'birthYear', 'birthCountry'])
+    end_time = time.time()
+    print("Template = ", json.dumps(templ), ", rows = ", len(result))
+    print("Elapsed time for ", tries, "lookups = ", end_time - start_time)
+    return result
+
+
+def test_range_predicates():
+
+    cleanup()
+    print_test_separator("Starting test_range_predicates")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        "../data/People.csv",
+        cds)
+    t.define_index("by_idx", "ORDERED", ['birthYear'])
+    t.define_index("country_idx", "INDEX", ['birthCountry'])
+    print("People table metadata = \n", json.dumps(t.describe_table(), indent=2))
+
+    people_tbl = CSVTable.CSVTable("people")
+
+    print("\n\nRange predicates on an ORDERED index:")
+    result = check_lookup(people_tbl, {"birthYear": {"between": [1950, 1955]}}, "by_idx",
+                          lambda r: birth_year(r) is not None and 1950 <= birth_year(r) <= 1955)
+    print("Sample result = ", json.dumps(result[:5]))
+    assert all([type(r["birthYear"]) == int for r in result])
+    check_lookup(people_tbl, {"birthYear": {">": 1990}, "throws": "L"}, "by_idx",
+                 lambda r: birth_year(r) is not None and birth_year(r) > 1990 and r["throws"] == "L")
+    check_lookup(people_tbl, {"birthYear": {"in": [1918, 1919]}}, "by_idx",
+                 lambda r: birth_year(r) in (1918, 1919))
+
+    print("\n\n\"in\" predicate on a hash index:")
+    check_lookup(people_tbl, {"birthCountry": {"in": ["CAN", "D.R."]}}, "country_idx",
+                 lambda r: r["birthCountry"] in ("CAN", "D.R."))
+
+    print("\n\nRange predicate on a column without an index (scan):")
+    check_lookup(people_tbl, {"nameLast": {">=": "Zi"}}, None, lambda r: r["nameLast"] >= "Zi")
+
+    try:
+        people_tbl.find_by_template({"birthYear": {"~": 1950}})
+        raise AssertionError("INCORRECT: invalid operator should fail.")
+    except DataTableExceptions.DataTableException as e:
+        assert e.code == DataTableExceptions.DataTableException.invalid_template
+        print("Invalid operator failed with e = ", e)
+
+    print_test_separator("Complete test_range_predicates")
+
+
+test_range_predicates()
@@ -0,0 +1,136 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import os
+import time
+import json
+
+data_dir = "../data/"
+feed_file = data_dir + "batting_feed.csv"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("batting_feed", force_drop=True)
+    for fn in [feed_file] + [feed_file + "." + storage + CSVTable.snapshot_suffix
+                             for storage in CSVTable.storage_modes]:
+        if os.path.exists(fn):
+            os.remove(fn)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def append_lines(lines):
+    with open(feed_file, "a", newline="") as f:
+        f.write("".join(lines))
+
+def same_answers(tbl, templates):
+    """
+    :return: True if tbl answers the templates like a table loaded from scratch.
+    """
+    fresh = CSVTable.CSVTable("batting_feed", storage=tbl.__storage__, snapshot=False)
+    return len(tbl.get_row_list()) == len(fresh.get_row_list()) and all([
+        tbl.find_by_template(t) == fresh.find_by_template(t) and tbl.count_by_template(t) == fresh.count_by_template(t)
+        for t in templates])
+
+def test_refresh():
+    """
+    Appends lines to a CSV file and refreshes tables loaded from it, with row and column storage, then rewrites
+    the file. Refreshed tables must answer lookups on every kind of index like tables loaded from scratch.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_refresh")
+
+    with open(data_dir + "Batting.csv", newline="") as f:
+        lines = f.readlines()
+    with open(feed_file, "w", newline="") as f:
+        f.write("".join(lines[:50001]))
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("stint", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number"))
+    t = cat.create_table(
+        "batting_feed",
+        feed_file,
+        cds)
+    t.define_index("pk", "PRIMARY", ['playerID', 'yearID', 'stint'])
+    t.define_index("year_idx", "ORDERED", ['yearID'])
+    t.define_index("team_idx", "BITMAP", ['teamID'], include=['H'])
+
+    templates = [{"playerID": lines[60000].split(",")[0]},
+                 {"yearID": {"between": [1955, 1956]}, "H": {">": 150}},
+                 {"teamID": "BOS", "yearID": 1957},
+                 {"teamID": "BOS"}]
+
+    tables = [CSVTable.CSVTable("batting_feed"), CSVTable.CSVTable("batting_feed", storage="column")]
+    print("Rows loaded =", len(tables[0].get_row_list()))
+    print("Refresh of an unchanged file =", [tbl.refresh() for tbl in tables])
+    assert len(tables[0].get_row_list()) == 50000
+    assert [tbl.refresh() for tbl in tables] == ["unchanged", "unchanged"]
+
+    append_lines(lines[50001:80001])
+    for tbl in tables:
+        start_time = time.time()
+        result = tbl.refresh()
+        end_time = time.time()
+        assert result == "appended" and len(tbl.get_row_list()) == 80000
+        print("Refresh after appending 30000 lines with", tbl.__storage__, "storage =", result,
+              ", rows =", len(tbl.get_row_list()), ", elapsed time =", end_time - start_time)
+    start_time = time.time()
+    CSVTable.CSVTable("batting_feed", snapshot=False)
+    end_time = time.time()
+    print("Loading the file from scratch, elapsed time =", end_time - start_time)
+    print("Same answers as a fresh load:", all([same_answers(tbl, templates) for tbl in tables]))
+    assert all([same_answers(tbl, templates) for tbl in tables])
+
+    # The last line is only half written.
+    line = lines[80001]
+    append_lines(lines[80002:90001] + [line[:10]])
+    results = [tbl.refresh() for tbl in tables]
+    print("\nRefresh with a partial last line =", results, ", rows =", len(tables[0].get_row_list()))
+    # the partial line is not parsed until it is complete
+    assert results == ["appended", "appended"] and all([len(tbl.get_row_list()) == 89999 for tbl in tables])
+    append_lines([line[10:]])
+    results = [tbl.refresh() for tbl in tables]
+    print("Refresh once the line is complete =", results, ", rows =", len(tables[0].get_row_list()))
+    assert results == ["appended", "appended"] and all([len(tbl.get_row_list()) == 90000 for tbl in tables])
+    print("Last row =", json.dumps(tables[0].get_row_list()[-1]))
+    assert tables[0].get_row_list()[-1]["playerID"] == line.split(",")[0]
+    assert tables[1].get_row_list()[-1] == tables[0].get_row_list()[-1]
+    print("Same answers as a fresh load:", all([same_answers(tbl, templates) for tbl in tables]))
+    assert all([same_answers(tbl, templates) for tbl in tables])
+
+    with open(feed_file, "w", newline="") as f:
+        f.write("".join(lines[:1] + lines[40001:60001]))
+    results = [tbl.refresh() for tbl in tables]
+    print("\nRefresh of a rewritten file =", results, ", rows =", len(tables[0].get_row_list()))
+    assert results == ["reloaded", "reloaded"] and all([len(tbl.get_row_list()) == 20000 for tbl in tables])
+    print("Same answers as a fresh load:", all([same_answers(tbl, templates) for tbl in tables]))
+    assert all([same_answers(tbl, templates) for tbl in tables])
+
+    try:
+        tables[0].table_from_rows("derived", []).refresh()
+        raise AssertionError("INCORRECT: refreshing a derived table should fail.")
+    except DataTableExceptions.DataTableException as e:
+        assert e.code == DataTableExceptions.DataTableException.invalid_file
+        print("Refreshing a derived table failed with e = ", e)
+
+    cleanup()
+    print_test_separator("Complete test_refresh")
+
+
+test_refresh()
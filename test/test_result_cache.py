@@ -0,0 +1,114 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import CSVResultCache
+
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def run_query(tbl, templ, fields, n):
+    """
+    Runs the same find_by_template n times.
+    :return: Result of the last run.
+    """
+    start_time = time.time()
+    for i in range(n):
+        result = tbl.find_by_template(templ, fields)
+    end_time = time.time()
+    print("Ran", n, "queries in", end_time - start_time, "seconds.")
+    return result
+
+def test_result_cache():
+    """
+    Runs the same queries with and without a result cache, and checks that cached results are not served after
+    the catalog definition or the rows have changed.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_result_cache")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("name", "text", True))
+    teams_def = cat.create_table(
+        "teams",
+        data_dir + "Teams.csv",
+        cds)
+
+    templ = {"nameLast": "Williams", "birthCountry": "USA"}
+    fields = ['playerID', 'nameFirst']
+
+    print("Without a result cache:")
+    people = CSVTable.CSVTable("people")
+    expected = run_query(people, templ, fields, 100)
+
+    print("With a result cache:")
+    cache = CSVResultCache.ResultCache(max_entries=100)
+    people = CSVTable.CSVTable("people", result_cache=cache)
+    result = run_query(people, templ, fields, 100)
+    print("Results are equal:", result == expected, ", hits =", cache.hits, ", misses =", cache.misses)
+    assert len(expected) > 0 and result == expected
+    assert (cache.hits, cache.misses) == (99, 1)
+
+    same = people.find_by_template({"birthCountry": "USA", "nameLast": "Williams"}, fields)
+    print("Template with entries in another order is a hit:", same == expected, ", hits =", cache.hits)
+    assert same == expected and cache.hits == 100
+
+    teams = CSVTable.CSVTable("teams", result_cache=cache)
+    bos_teams = teams.find_by_template({"teamID": "BOS"}, ['teamID', 'yearID', 'name'], limit=5)
+    print("Found", len(bos_teams), "teams, cached results =", len(cache), ", cached rows =", cache.row_count())
+    assert len(bos_teams) == 5 and len(cache) == 2
+    assert cache.row_count() == len(expected) + len(bos_teams)
+
+    teams_def.define_index("team_idx", "INDEX", ['teamID'])
+    teams = CSVTable.CSVTable("teams", result_cache=cache)
+    misses = cache.misses
+    result = teams.find_by_template({"teamID": "BOS"}, ['teamID', 'yearID', 'name'], limit=5)
+    print("Table loaded after the definition changed misses the cache:", cache.misses == misses + 1)
+    assert cache.misses == misses + 1 and result == bos_teams
+
+    people.__add_row__({"playerID": "newpl01", "nameLast": "Williams", "nameFirst": "New", "birthCountry": "USA"})
+    result = people.find_by_template(templ, fields)
+    print("Written row is found:", len(result) == len(expected) + 1)
+    assert len(result) == len(expected) + 1 and {"playerID": "newpl01", "nameFirst": "New"} in result
+
+    cache.invalidate("people")
+    print("Cached results after invalidating people =", len(cache))
+    assert len(cache) == 1
+
+    print_test_separator("Complete test_result_cache")
+
+
+test_result_cache()
@@ -0,0 +1,107 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import time
+import json
+import tracemalloc
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def peak_memory(f):
+    """
+    :param f: Function to run.
+    :return: Result of f and peak number of bytes allocated while it ran.
+    """
+    tracemalloc.start()
+    result = f()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+def count_rows(rows):
+    n = 0
+    for r in rows:
+        n += 1
+    return n
+
+def test_streaming_join():
+    """
+    Joins people and batting with join(), which builds the whole result, and with join_iter(), which streams it,
+    and compares the peak memory of both.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_streaming_join")
+
+    cat = CSVCatalog.CSVCatalog()
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("H", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("AB", column_type="number"))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "text", True))
+
+    t = cat.create_table(
+        "batting",
+        data_dir + "Batting.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+
+    people_tbl = CSVTable.CSVTable("people")
+    batting_tbl = CSVTable.CSVTable("batting")
+    fields = ["playerID", "nameLast", "yearID", "H"]
+
+    for method in CSVTable.join_methods[1:]:
+        n_rows, list_peak = peak_memory(lambda: len(people_tbl.join(batting_tbl, ['playerID'], \
+            project_fields=fields, method=method).get_row_list()))
+        n_streamed, stream_peak = peak_memory(lambda: count_rows(people_tbl.join_iter(batting_tbl, ['playerID'], \
+            project_fields=fields, method=method)))
+        print("Join method", method, ": rows =", n_rows, ", streamed rows =", n_streamed, \
+            ", peak memory for join() =", list_peak, ", for join_iter() =", stream_peak)
+        assert n_rows == len(batting_tbl.get_row_list()) and n_streamed == n_rows
+        assert stream_peak < list_peak / 2
+
+    tmp = {"teamID": "BOS"}
+    n_rows, list_peak = peak_memory(lambda: len(batting_tbl.find_by_template(tmp)))
+    n_streamed, stream_peak = peak_memory(lambda: count_rows(batting_tbl.find_by_template_iter(tmp)))
+    print("Select", json.dumps(tmp), ": rows =", n_rows, ", streamed rows =", n_streamed, \
+        ", peak memory for find_by_template() =", list_peak, ", for find_by_template_iter() =", stream_peak)
+    assert n_rows > 0 and n_streamed == n_rows
+    assert stream_peak < list_peak
+    assert list(batting_tbl.find_by_template_iter(tmp)) == batting_tbl.find_by_template(tmp)
+
+    print_test_separator("Complete test_streaming_join")
+
+
+test_streaming_join()
@@ -0,0 +1,122 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+
+import csv
+import time
+import json
+
+data_dir = "../data/"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people", force_drop=True)
+    cat.drop_table("batting", force_drop=True)
+    cat.drop_table("teams", force_drop=True)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+def csv_rows(fn):
+    with open(fn, newline="") as f:
+        return list(csv.DictReader(f))
+
+def number(v):
+    return int(v) if v != "" else None
+
+def test_typed_columns():
+    """
+    Loads "number" columns as numbers and checks that templates given as strings or numbers, index lookups,
+    range scans and both storage modes return the same rows.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_typed_columns")
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("weight", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    t = cat.create_table(
+        "people",
+        data_dir + "People.csv",
+        cds)
+    t.define_index("pid_idx", "INDEX", ['playerID'])
+    t.define_index("by_idx", "INDEX", ['birthYear'])
+    t.define_index("weight_idx", "ORDERED", ['weight'])
+    # birthYear is empty in some rows, so the keys of this index mix numbers and None
+    t.define_index("country_year_idx", "INDEX", ['birthCountry', 'birthYear'])
+
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("yearID", "number", True))
+    cds.append(CSVCatalog.ColumnDefinition("teamID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("name", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("ERA", "number"))
+    t = cat.create_table(
+        "teams",
+        data_dir + "Teams.csv",
+        cds)
+
+    people = CSVTable.CSVTable("people")
+    people_columns = CSVTable.CSVTable("people", storage="column")
+    teams = CSVTable.CSVTable("teams")
+
+    print("Row:", people.find_by_template({"playerID": "aardsda01"}))
+    print("Row:", teams.find_by_template({"teamID": "BOS", "yearID": "2004"}))
+    assert people.find_by_template({"playerID": "aardsda01"}) == [{"playerID": "aardsda01", "nameLast": "Aardsma",
+        "birthYear": 1981, "weight": 215, "birthCountry": "USA"}]
+    assert teams.find_by_template({"teamID": "BOS", "yearID": "2004"}) == \
+        [{"yearID": 2004, "teamID": "BOS", "name": "Boston Red Sox", "ERA": 4.18}]
+
+    people_csv = csv_rows(data_dir + "People.csv")
+    templates = [({"birthYear": "1980"}, lambda r: number(r["birthYear"]) == 1980),
+                 ({"birthYear": 1980}, lambda r: number(r["birthYear"]) == 1980),
+                 ({"birthYear": ""}, lambda r: r["birthYear"] == ""),
+                 ({"birthYear": {"in": ["1980", 1981]}}, lambda r: number(r["birthYear"]) in (1980, 1981)),
+                 ({"weight": {"between": [150, 160]}},
+                  lambda r: number(r["weight"]) is not None and 150 <= number(r["weight"]) <= 160),
+                 ({"weight": {">": "300"}}, lambda r: number(r["weight"]) is not None and number(r["weight"]) > 300)]
+    for templ, test in templates:
+        start_time = time.time()
+        result = people.find_by_template(templ)
+        end_time = time.time()
+        print(templ, "found", len(result), "rows in", end_time - start_time, "seconds, equal for column storage:", \
+            result == people_columns.find_by_template(templ))
+        assert len(result) > 0 and result == people_columns.find_by_template(templ)
+        assert sorted([r["playerID"] for r in result]) == sorted([r["playerID"] for r in people_csv if test(r)])
+
+    rows = people.find_by_template({"birthYear": "1980"})
+    print("matches_template agrees with find_by_template:",
+          all([people.matches_template(r, {"birthYear": "1980"}) for r in rows]))
+    assert len(rows) > 0 and all([people.matches_template(r, {"birthYear": "1980"}) for r in rows])
+    assert all([people.matches_template(r, {"birthYear": 1980, "playerID": r["playerID"]}) for r in rows])
+
+    print("\nComposite index on a number column with empty values:")
+    for templ in [{"birthCountry": "USA"}, {"birthCountry": "USA", "birthYear": ""},
+                  {"birthCountry": "CAN", "birthYear": 1980}]:
+        access_index, _ = people.__get_template_access_path__(people.__compile_template__(templ))
+        result = people.find_by_template(templ)
+        scan = people.__find_by_template_scan__(templ)
+        print(templ, "found", len(result), "rows with", access_index, ", equal to a scan:", result == scan)
+        assert access_index == "country_year_idx"
+        assert result == scan and len(result) > 0
+
+    print("Teams with ERA below 2:", len(teams.find_by_template({"ERA": {"<": 2}})))
+    assert len(teams.find_by_template({"ERA": {"<": 2}})) == \
+        len([r for r in csv_rows(data_dir + "Teams.csv") if r["ERA"] != "" and float(r["ERA"]) < 2])
+
+    print_test_separator("Complete test_typed_columns")
+
+
+test_typed_columns()
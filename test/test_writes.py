@@ -0,0 +1,205 @@
+import sys
+sys.path.append("../src/")
+import CSVCatalog
+import CSVTable
+import DataTableExceptions
+
+import csv
+import os
+import time
+import json
+
+data_dir = "../data/"
+table_file = data_dir + "people_writes.csv"
+
+def cleanup():
+    """
+    Deletes previously created information to enable re-running tests.
+    :return: None
+    """
+    cat = CSVCatalog.CSVCatalog()
+    cat.drop_table("people_writes", force_drop=True)
+    log_file = table_file + CSVTable.log_suffix
+    for fn in [table_file, log_file, log_file + CSVTable.lock_suffix] + \
+              [table_file + "." + storage + CSVTable.snapshot_suffix for storage in CSVTable.storage_modes]:
+        if os.path.exists(fn):
+            os.remove(fn)
+
+def print_test_separator(msg):
+    print("\n")
+    lot_of_stars = 20*'*'
+    print(lot_of_stars, '  ', msg, '  ', lot_of_stars)
+    print("\n")
+
+templates = [{"playerID": "willite01"},
+             {"birthCountry": "CAN"},
+             {"birthYear": {"between": [1990, 1992]}, "throws": "L"},
+             {"nameLast": "Williams"},
+             {"nameLast": "Smith", "nameFirst": "John"},
+             {"playerID": "zzznew01"}]
+
+def answers(tbl):
+    return [(tbl.find_by_template(t), tbl.count_by_template(t)) for t in templates]
+
+def check(label, tbl):
+    """
+    Compares the index lookups of tbl with scans of the same table and with a table loaded from scratch.
+    """
+    scans = [tbl.__find_by_template_scan__(t) for t in templates]
+    fresh = CSVTable.CSVTable("people_writes", storage="column", snapshot=False)
+    print(label, ": rows =", len(tbl.get_row_list()), ", lookups equal scans:",
+          all([a[0] == b and a[1] == len(b) for a, b in zip(answers(tbl), scans)]),
+          ", equal to a fresh load:", answers(tbl) == answers(fresh))
+    assert all([a[0] == b and a[1] == len(b) for a, b in zip(answers(tbl), scans)])
+    assert answers(tbl) == answers(fresh)
+    # Statistics only count the rows that have not been deleted.
+    rows = tbl.get_row_list()
+    stats = tbl.analyze(save=False)
+    assert stats.row_count == len(rows) == tbl.__get_statistics__().row_count
+    assert stats.columns["birthCountry"].distinct_count == \
+        len({r["birthCountry"] for r in rows if r["birthCountry"] != ""})
+    assert "Row count: " + str(len(rows)) + "\n" in str(tbl)
+
+def try_write(label, f, code):
+    try:
+        f()
+        raise AssertionError("INCORRECT: " + label + " should fail.")
+    except DataTableExceptions.DataTableException as e:
+        assert e.code == code
+        print(label, "failed with e = ", e)
+
+def test_writes():
+    """
+    Inserts, updates and deletes rows of a copy of People.csv, checks the indexes against scans and against
+    tables that replay the log, then compacts the log into the CSV file.
+    :return:
+    """
+    cleanup()
+    print_test_separator("Starting test_writes")
+
+    with open(data_dir + "People.csv", newline="") as f:
+        lines = f.readlines()
+    with open(table_file, "w", newline="") as f:
+        f.write("".join(lines))
+
+    cat = CSVCatalog.CSVCatalog()
+    cds = []
+    cds.append(CSVCatalog.ColumnDefinition("playerID", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameLast", "text", True))
+    cds.append(CSVCatalog.ColumnDefinition("nameFirst", column_type="text"))
+    cds.append(CSVCatalog.ColumnDefinition("birthYear", "number"))
+    cds.append(CSVCatalog.ColumnDefinition("birthCountry", "text"))
+    cds.append(CSVCatalog.ColumnDefinition("throws", column_type="text"))
+    t = cat.create_table(
+        "people_writes",
+        table_file,
+        cds)
+    t.define_index("pk", "PRIMARY", ['playerID'])
+    t.define_index("name_idx", "INDEX", ['nameLast', 'nameFirst'], include=['birthYear'])
+    t.define_index("by_idx", "ORDERED", ['birthYear'])
+    t.define_index("country_idx", "BITMAP", ['birthCountry'])
+
+    tbl = CSVTable.CSVTable("people_writes")
+    start_time = time.time()
+    tbl.insert({"playerID": "zzznew01", "nameLast": "Smith", "nameFirst": "John", "birthYear": "1991",
+                "birthCountry": "CAN", "throws": "L"})
+    n_updated = tbl.update({"playerID": "willite01"}, {"birthCountry": "CAN", "birthYear": 1991, "throws": "L"})
+    n_deleted = tbl.delete({"birthCountry": "CAN", "birthYear": {"<": 1900}})
+    n_renamed = tbl.update({"nameLast": "Williams", "throws": "L"}, {"nameFirst": "Lefty"})
+    end_time = time.time()
+    print("Inserted 1 row, updated", n_updated, "and", n_renamed, "rows, deleted", n_deleted,
+          "rows, elapsed time =", end_time - start_time)
+    print("Log size =", os.path.getsize(table_file + CSVTable.log_suffix))
+    original = list(csv.DictReader(lines))
+    assert n_updated == 1
+    assert n_deleted == len([r for r in original if r["birthCountry"] == "CAN" and r["birthYear"] != "" and
+                             int(r["birthYear"]) < 1900])
+    assert len(tbl.get_row_list()) == len(original) + 1 - n_deleted
+    assert tbl.find_by_template({"playerID": "willite01"}, ["birthCountry", "birthYear", "throws", "nameFirst"]) == \
+        [{"birthCountry": "CAN", "birthYear": 1991, "throws": "L", "nameFirst": "Lefty"}]
+    check("After the writes", tbl)
+
+    duplicate_key = DataTableExceptions.DataTableException.duplicate_key
+    invalid_column = DataTableExceptions.DataTableException.invalid_column_definition
+    try_write("Inserting an existing playerID",
+              lambda: tbl.insert({"playerID": "willite01", "nameLast": "Williams"}), duplicate_key)
+    try_write("Updating to an existing playerID",
+              lambda: tbl.update({"playerID": "zzznew01"}, {"playerID": "willite01"}), duplicate_key)
+    try_write("Inserting without a not null column", lambda: tbl.insert({"playerID": "zzznew02"}), invalid_column)
+    try_write("Inserting a text birthYear",
+              lambda: tbl.insert({"playerID": "zzznew03", "nameLast": "X", "birthYear": "abc"}), invalid_column)
+    try_write("Updating an unknown column", lambda: tbl.update({"playerID": "zzznew01"}, {"weight": 200}),
+              invalid_column)
+    # failed writes change nothing
+    assert tbl.find_by_template({"playerID": {"in": ["zzznew02", "zzznew03"]}}) == []
+    assert len(tbl.find_by_template({"playerID": "willite01"})) == 1
+
+    col_tbl = CSVTable.CSVTable("people_writes", storage="column")
+    col_tbl.update({"playerID": "zzznew01"}, {"birthYear": None})
+    check("After an update through a columnar table", col_tbl)
+
+    start_time = time.time()
+    col_tbl.compact()
+    end_time = time.time()
+    print("\nCompacted, elapsed time =", end_time - start_time, ", log exists =",
+          os.path.exists(table_file + CSVTable.log_suffix))
+    check("After compaction", col_tbl)
+    with open(table_file, newline="") as f:
+        people = {r["playerID"]: r for r in csv.DictReader(f)}
+    print("Columns the table does not hold are kept: birthCity of willite01 =", people["willite01"]["birthCity"],
+          ", debut of aaronha01 =", people["aaronha01"]["debut"])
+    assert not os.path.exists(table_file + CSVTable.log_suffix)
+    before = {r["playerID"]: r for r in original}
+    assert len(people) == len(col_tbl.get_row_list())
+    assert people["willite01"]["birthCity"] == before["willite01"]["birthCity"] != ""
+    assert people["aaronha01"]["debut"] == before["aaronha01"]["debut"] != ""
+    assert (people["willite01"]["birthCountry"], people["willite01"]["birthYear"], people["willite01"]["throws"],
+            people["willite01"]["nameFirst"]) == ("CAN", "1991", "L", "Lefty")
+    assert people["zzznew01"]["birthYear"] == "" and people["zzznew01"]["nameLast"] == "Smith"
+    assert all([p not in people for p, r in before.items() if r["birthCountry"] == "CAN" and
+                r["birthYear"] != "" and int(r["birthYear"]) < 1900])
+
+    print("\nWrites after compaction, compacted in the background:")
+    CSVTable.compact_log_size = 500
+    for k in range(10):
+        col_tbl.insert({"playerID": "zzzbg{:02d}".format(k), "nameLast": "Smith", "nameFirst": "John",
+                        "birthYear": 1990 + k, "birthCountry": "CAN"})
+    print("A background compaction started once the log passed", CSVTable.compact_log_size, "bytes:",
+          col_tbl.__compactor__ is not None)
+    assert col_tbl.__compactor__ is not None
+    col_tbl.delete({"playerID": "zzzbg03"})
+    col_tbl.compact(background=True)
+    col_tbl.__compactor__.join()
+    print("Log exists after the background compaction =", os.path.exists(table_file + CSVTable.log_suffix))
+    check("After the background compaction", col_tbl)
+    assert not os.path.exists(table_file + CSVTable.log_suffix)
+    with open(table_file, newline="") as f:
+        ids = [r["playerID"] for r in csv.DictReader(f)]
+    assert [p for p in ids if p.startswith("zzzbg")] == ["zzzbg{:02d}".format(k) for k in range(10) if k != 3]
+    print("Refresh after compaction =", col_tbl.refresh())
+    assert col_tbl.refresh() == "unchanged"
+
+    print("\nWrites through two table instances, compacted by one of them:")
+    CSVTable.compact_log_size = 1024 * 1024
+    first = CSVTable.CSVTable("people_writes", snapshot=False)
+    second = CSVTable.CSVTable("people_writes", storage="column", snapshot=False)
+    first.insert({"playerID": "zzztwo01", "nameLast": "First"})
+    second.insert({"playerID": "zzztwo02", "nameLast": "Second"})
+    try_write("Inserting a playerID another instance inserted",
+              lambda: first.insert({"playerID": "zzztwo02", "nameLast": "First"}), duplicate_key)
+    first.compact()
+    fresh = CSVTable.CSVTable("people_writes", snapshot=False)
+    found = [len(fresh.find_by_template({"playerID": p})) for p in ("zzztwo01", "zzztwo02")]
+    print("Rows found after the compaction =", found, ", log exists =",
+          os.path.exists(table_file + CSVTable.log_suffix))
+    assert found == [1, 1] and not os.path.exists(table_file + CSVTable.log_suffix)
+    second.delete({"playerID": {"in": {"zzztwo01"}}})
+    assert second.find_by_template({"playerID": "zzztwo02"}) != []
+    check("After a write through the other instance", second)
+    assert CSVTable.CSVTable("people_writes", snapshot=False).find_by_template({"playerID": "zzztwo01"}) == []
+
+    cleanup()
+    print_test_separator("Complete test_writes")
+
+
+test_writes()